@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2018, Exa Analytics Development Team
+# Distributed under the terms of the Apache License 2.0
+"""
+Structural Alignment
+########################
+Batched Kabsch alignment and root mean square deviations (RMSD) of atomic
+coordinates across frames. All frames are handled at once as a
+(frames x atoms x 3) array so that the 3x3 singular value decompositions
+are vectorized.
+
+.. math::
+
+    \\mathrm{RMSD} = \\min_{\\mathbf{R}}\\sqrt{\\frac{1}{N}\\sum_{i=1}^{N}
+        \\left|\\mathbf{R}\\mathbf{p}_{i} - \\mathbf{q}_{i}\\right|^{2}}
+"""
+import numpy as np
+import pandas as pd
+from numba import jit, prange
+from exatomic.base import nbpll
+from exatomic.core.atom import Atom
+
+
+def _atom_labels(atom):
+    """Atom labels, computed (without modifying the atom table) if missing."""
+    if 'label' in atom.columns:
+        return atom['label'].astype(np.int64)
+    return atom.get_atom_labels().astype(np.int64)
+
+
+def _ref_index(frames, ref_frame):
+    """Position of the reference frame among the frames of the coordinates."""
+    idx = np.where(frames == ref_frame)[0]
+    if len(idx) == 0:
+        raise ValueError("Reference frame {} not found.".format(ref_frame))
+    return idx[0]
+
+
+def frame_coordinates(atom, labels=None):
+    """
+    Reshape the atom table into a (frames x atoms x 3) array ordered by
+    atom label.
+
+    Args:
+        atom (:class:`~exatomic.core.atom.Atom`): Atom table (same atoms in every frame)
+        labels (list): Atom labels to select (default all)
+
+    Returns:
+        xyz (:class:`~numpy.ndarray`): Coordinates of the selected atoms
+        frames (:class:`~numpy.ndarray`): Frame index of each block of xyz
+    """
+    df = pd.DataFrame.from_dict({'frame': atom['frame'].astype(np.int64),
+                                 'label': _atom_labels(atom),
+                                 'x': atom['x'], 'y': atom['y'], 'z': atom['z']})
+    if labels is not None:
+        df = df[df['label'].isin(labels)]
+    df = df.sort_values(['frame', 'label'])
+    counts = df.groupby('frame').size()
+    if counts.nunique() != 1:
+        raise ValueError("Alignment requires the same atoms in every frame.")
+    nat = counts.values[0]
+    xyz = df[['x', 'y', 'z']].values.reshape(len(counts), nat, 3)
+    return xyz, counts.index.values
+
+
+def kabsch(ref, xyz):
+    """
+    Optimal rotations superimposing each frame of xyz onto ref.
+
+    .. code-block:: Python
+
+        rot, rmsd = kabsch(xyz[0], xyz)
+        aligned = np.einsum('fni,fji->fnj', xyz - xyz.mean(axis=1)[:, None], rot)
+
+    Args:
+        ref (:class:`~numpy.ndarray`): Reference coordinates (atoms x 3)
+        xyz (:class:`~numpy.ndarray`): Mobile coordinates (frames x atoms x 3)
+
+    Returns:
+        rot (:class:`~numpy.ndarray`): Rotation matrices (frames x 3 x 3)
+        rmsd (:class:`~numpy.ndarray`): RMSD of each frame after alignment
+    """
+    ref = ref - ref.mean(axis=0)
+    mob = xyz - xyz.mean(axis=1)[:, np.newaxis]
+    cov = np.einsum('fni,nj->fij', mob, ref)
+    u, s, vt = np.linalg.svd(cov)
+    # Reflections are removed by flipping the smallest singular vector
+    d = np.sign(np.linalg.det(u) * np.linalg.det(vt))
+    u[:, :, 2] *= d[:, np.newaxis]
+    s[:, 2] *= d
+    rot = np.einsum('fij,fjk->fki', u, vt)
+    nat = ref.shape[0]
+    dev = (mob ** 2).sum(axis=(1, 2)) + (ref ** 2).sum() - 2 * s.sum(axis=1)
+    return rot, np.sqrt(np.maximum(dev, 0) / nat)
+
+
+@jit(nopython=True, nogil=True, parallel=nbpll)
+def _pairwise_rmsd(xyz, block):
+    """Minimum RMSD between all pairs of (centered) frames, by rows of blocks."""
+    nfr, nat, _ = xyz.shape
+    rmsd = np.zeros((nfr, nfr), dtype=np.float64)
+    norms = np.empty(nfr, dtype=np.float64)
+    for f in range(nfr):
+        norms[f] = (xyz[f] ** 2).sum()
+    nblk = (nfr + block - 1) // block
+    for b in prange(nblk):
+        for i in range(b * block, min((b + 1) * block, nfr)):
+            for j in range(i + 1, nfr):
+                cov = np.dot(xyz[i].T, xyz[j])
+                s = np.linalg.svd(cov)[1]
+                if np.linalg.det(cov) < 0: s[2] = -s[2]
+                dev = (norms[i] + norms[j] - 2 * s.sum()) / nat
+                rmsd[i, j] = np.sqrt(max(dev, 0.))
+                rmsd[j, i] = rmsd[i, j]
+    return rmsd
+
+
+def pairwise_rmsd(xyz, block=16):
+    """
+    Frame by frame RMSD matrix (after optimal superposition of each pair).
+
+    Args:
+        xyz (:class:`~numpy.ndarray`): Coordinates (frames x atoms x 3)
+        block (int): Number of rows computed by each parallel task
+
+    Returns:
+        rmsd (:class:`~numpy.ndarray`): Symmetric (frames x frames) matrix
+    """
+    xyz = np.ascontiguousarray(xyz - xyz.mean(axis=1)[:, np.newaxis],
+                               dtype=np.float64)
+    return _pairwise_rmsd(xyz, np.int64(block))
+
+
+def align_frames(universe, ref_frame=0, labels=None):
+    """
+    Align every frame of a universe onto a reference frame.
+
+    The optimal rotation is determined from the selected atoms (labels)
+    and applied to all atoms of each frame.
+
+    .. code-block:: Python
+
+        atom, rmsd = align_frames(uni, labels=[0, 1, 2, 3])
+        uni.atom = atom
+
+    Args:
+        universe (:class:`~exatomic.core.universe.Universe`): Universe with an atom table
+        ref_frame (int): Frame to align onto
+        labels (list): Atom labels used to determine the alignment (default all)
+
+    Returns:
+        atom (:class:`~exatomic.core.atom.Atom`): New atom table with aligned coordinates
+        rmsd (:class:`~pandas.Series`): RMSD of each frame with respect to ref_frame
+    """
+    xyz, frames = frame_coordinates(universe.atom, labels=labels)
+    ref = xyz[_ref_index(frames, ref_frame)]
+    rot, dev = kabsch(ref, xyz)
+    allxyz, _ = frame_coordinates(universe.atom)
+    cens = xyz.mean(axis=1)[:, np.newaxis]
+    new = np.einsum('fni,fji->fnj', allxyz - cens, rot) + ref.mean(axis=0)
+    atom = universe.atom.copy()
+    atom['frame'] = atom['frame'].astype(np.int64)
+    order = pd.DataFrame.from_dict({'frame': atom['frame'],
+                                    'label': _atom_labels(universe.atom)}
+                                   ).sort_values(['frame', 'label']).index
+    atom.loc[order, ['x', 'y', 'z']] = new.reshape(-1, 3)
+    rmsd = pd.Series(dev, index=pd.Index(frames, name='frame'), name='rmsd')
+    return Atom(atom), rmsd
+
+
+def rmsd(universe, ref_frame=0, labels=None, pairwise=False, block=16):
+    """
+    RMSD of every frame with respect to a reference frame, or between
+    all pairs of frames.
+
+    Args:
+        universe (:class:`~exatomic.core.universe.Universe`): Universe with an atom table
+        ref_frame (int): Reference frame (if not pairwise)
+        labels (list): Atom labels to include (default all)
+        pairwise (bool): Compute the full frame by frame matrix (default False)
+        block (int): Rows per parallel task for the pairwise matrix
+
+    Returns:
+        rmsd (:class:`~pandas.Series` or :class:`~pandas.DataFrame`): RMSD values
+    """
+    xyz, frames = frame_coordinates(universe.atom, labels=labels)
+    idx = pd.Index(frames, name='frame')
+    if pairwise:
+        return pd.DataFrame(pairwise_rmsd(xyz, block=block), index=idx,
+                            columns=idx.rename('frame1'))
+    ref = xyz[_ref_index(frames, ref_frame)]
+    return pd.Series(kabsch(ref, xyz)[1], index=idx, name='rmsd')
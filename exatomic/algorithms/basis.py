@@ -10,8 +10,11 @@ generated programmatically with the right numerical function.
 This is preferred to an explicit parsing and storage of a given
 basis set ordering scheme.
 """
+import warnings
+from copy import copy
 from operator import mul
 from functools import reduce
+from threading import RLock
 from collections import OrderedDict, Counter, defaultdict
 from itertools import combinations_with_replacement as cwr
 import numpy as np
@@ -23,8 +26,13 @@ except ImportError:
     from sympy import symbols as var
     from sympy import exp, cos, sin, Mul, Integer, Float
 from exa import Series
-from exatomic.algorithms.overlap import _cartesian_shell_pairs, _iter_atom_shells
-from exatomic.algorithms.numerical import fac, _tri_indices, _triangle, _enum_spherical
+from exatomic.algorithms.overlap import (shell_pair_overlap, shell_pair_integrals,
+                                         _iter_atom_shells)
+from exatomic.algorithms.numerical import (fac, _tri_indices,
+                                           _enum_spherical, _evaluate_shells,
+                                           _evaluate_shells_sparse,
+                                           _evaluate_shells_deriv,
+                                           _screen_shell_points)
 
 
 _x, _y, _z = var("_x _y _z")
@@ -202,6 +210,11 @@ def car2sph(sh, cart, orderedp=True):
 def diff_expr(expr, cart='x', order=1):
     """Compute the nth order derivative symbolically with respect to cart.
 
+    Warning:
+        Deprecated; numerical derivatives of basis functions are computed by
+        :meth:`~exatomic.algorithms.basis.BasisFunctions.evaluate_diff` and
+        :meth:`~exatomic.algorithms.basis.BasisFunctions.evaluate_derivatives`.
+
     Args:
         expr (symbolic): sympy or symengine expression
         cart (str): 'x', 'y', or 'z'
@@ -210,6 +223,9 @@ def diff_expr(expr, cart='x', order=1):
     Returns:
         expr (symbolic): The symbolic derivative
     """
+    warnings.warn("diff_expr is deprecated, use BasisFunctions.evaluate_diff "
+                  "or BasisFunctions.evaluate_derivatives", DeprecationWarning,
+                  stacklevel=2)
     if cart not in ['x', 'y', 'z']:
         raise ValueError('cart must be in "xyz".')
     if not isinstance(order, int) or order < 0:
@@ -247,10 +263,145 @@ def evaluate_expr(expr, xs, ys, zs, arr=None, alpha=None):
     return evaluate(str(expr.subs(subs)))
 
 
+class SparseBasisValues(object):
+    """Screened basis function values on a numerical grid, stored in
+    compressed sparse row format (rows are basis functions, columns are
+    grid points). Returned by :meth:`~exatomic.algorithms.basis.BasisFunctions.evaluate`
+    when a screening tolerance is provided.
+
+    Args:
+        indptr (np.ndarray): row pointers (nbf + 1)
+        indices (np.ndarray): grid point index of each value
+        data (np.ndarray): basis function values
+        shape (tuple): (nbf, npts)
+    """
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    @property
+    def density(self):
+        """Fraction of (basis function, grid point) pairs stored."""
+        return self.nnz / max(self.shape[0] * self.shape[1], 1)
+
+    @property
+    def nbytes(self):
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+
+    def toarray(self):
+        """Return the dense (nbf, npts) array."""
+        arr = np.zeros(self.shape, dtype=np.float64)
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        arr[rows, self.indices] = self.data
+        return arr
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __repr__(self):
+        return 'SparseBasisValues({}x{},nnz={})'.format(
+            self.shape[0], self.shape[1], self.nnz)
+
+    def __init__(self, indptr, indices, data, shape):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = shape
+
+
+class BasisFunctionCache(object):
+    """Least recently used cache of evaluated basis functions, capped by
+    the total number of bytes held. Entries are evicted (least recently
+    used first) when adding a new entry would exceed max_bytes.
+
+    .. code-block:: python
+
+        uni.basis_functions.cache.stats        # hits, misses, evictions, bytes
+        uni.basis_functions.cache.max_bytes = 4 * 1024 ** 3
+        uni.basis_functions.cache.clear()
+
+    Args:
+        max_bytes (int): memory cap (default 1 GB)
+    """
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value):
+        with self._lock:
+            self._max_bytes = value
+            self._evict(0)
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'entries': len(self._data),
+                'nbytes': self.nbytes, 'max_bytes': self.max_bytes}
+
+    def get(self, key):
+        """Return cached values (marking them most recently used) or None."""
+        with self._lock:
+            if key in self._data:
+                self._data[key] = vals = self._data.pop(key)
+                self.hits += 1
+                return vals
+            self.misses += 1
+            return None
+
+    def put(self, key, vals):
+        """Store values, evicting least recently used entries as needed.
+        Values larger than max_bytes are not stored."""
+        size = vals.nbytes
+        if size > self.max_bytes: return
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= self._data.pop(key).nbytes
+            self._evict(size)
+            if isinstance(vals, np.ndarray): vals.flags.writeable = False
+            self._data[key] = vals
+            self.nbytes += size
+
+    def _evict(self, size):
+        """Drop least recently used entries until size more bytes fit."""
+        while self._data and self.nbytes + size > self._max_bytes:
+            _, old = self._data.popitem(last=False)
+            self.nbytes -= old.nbytes
+            self.evictions += 1
+
+    def clear(self):
+        """Remove all entries (statistics are kept)."""
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return 'BasisFunctionCache({} entries,{:.1f}/{:.1f} MB,{} hits,{} misses)'.format(
+            len(self._data), self.nbytes / 1024 ** 2, self.max_bytes / 1024 ** 2,
+            self.hits, self.misses)
+
+    def __init__(self, max_bytes=1024 ** 3):
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = RLock()
+        self.max_bytes = max_bytes
+
+
 class BasisFunctions(object):
-    """Composition wrapper class that leverages symbolic expressions using
-    symengine and numexpr, using values extracted from the numerical Shell
-    jitclasses, to evaluate basis functions on a numerical grid.
+    """Composition wrapper class that evaluates basis functions on a
+    numerical grid using values extracted from the numerical Shell
+    jitclasses. Numerical values are computed by numba-compiled kernels
+    (whole contracted shells at a time); symbolic expressions (symengine
+    or sympy) are returned when no grid is provided.
 
     Args:
         uni (:class:`exatomic.core.universe.Universe`): a universe with basis set
@@ -259,15 +410,83 @@ class BasisFunctions(object):
     """
 
 
-    def integrals(self):
-        """Compute the overlap matrix using primitive cartesian integrals."""
+    def integrals(self, tol=1e-14):
+        """Compute the overlap matrix using primitive cartesian integrals.
+
+        Shell pairs are screened by their gaussian product prefactor and
+        assembled in parallel directly into the packed lower triangle (see
+        :func:`~exatomic.algorithms.overlap.shell_pair_overlap`).
+
+        Args:
+            tol (float): skip shell pairs whose prefactor is below tol
+        """
         from exatomic.core.basis import Overlap
-        ovl = _cartesian_shell_pairs(len(self), self._ptrs.astype(np.int64),
-                                     self._xyzs, *self._shells)
-        ovl = _triangle(ovl)
+        ovl = shell_pair_overlap(self._ptrs, self._xyzs, self._shells, tol=tol,
+                                 soa=self._soa)
         chi0, chi1 = _tri_indices(ovl)
         return Overlap.from_dict({'chi0': chi0, 'chi1': chi1,
-                                  'frame': 0, 'coef': ovl})
+                                  'frame': self._frame, 'coef': ovl})
+
+
+    def one_electron_integrals(self, kinetic=True, order=2, origin=None,
+                               tol=1e-14):
+        """Compute overlap, kinetic energy and multipole integrals in a
+        single pass over screened shell pairs (see
+        :func:`~exatomic.algorithms.overlap.shell_pair_integrals`).
+
+        .. code-block:: python
+
+            ints = uni.basis_functions.one_electron_integrals()
+            dmat = uni.density.square().values
+            -(dmat * ints.square(column='dipole_z').values).sum()  # electronic dipole
+
+        Args:
+            kinetic (bool): compute kinetic energy integrals (default True)
+            order (int): highest multipole: 0, 1 (dipole) or 2 (quadrupole)
+            origin (array-like): origin of the multipole operators (default (0, 0, 0))
+            tol (float): skip shell pairs whose prefactor is below tol
+
+        Returns:
+            ints (:class:`~exatomic.core.matrices.Triangle`): one column per operator
+        """
+        from exatomic.core.matrices import Triangle
+        ints = shell_pair_integrals(self._ptrs, self._xyzs, self._shells,
+                                    kinetic=kinetic, order=order,
+                                    origin=origin, tol=tol, soa=self._soa)
+        chi0, chi1 = _tri_indices(ints['overlap'])
+        df = pd.DataFrame.from_dict(OrderedDict([('chi0', chi0), ('chi1', chi1)]
+                                                + list(ints.items())))
+        df['frame'] = self._frame
+        return Triangle(df)
+
+
+    def at_frame(self, uni, frame):
+        """Basis functions centered on the atoms of another frame.
+
+        Shells, solid harmonics, evaluation plans and the cache (whose keys
+        include the frame) are shared with this instance; only the centers
+        are updated, so this is cheap for every frame of an optimization.
+
+        .. code-block:: python
+
+            bfns = uni.basis_functions.at_frame(uni, 5)
+            bvs = bfns.evaluate(x, y, z)
+
+        Args:
+            uni (:class:`exatomic.core.universe.Universe`): the universe
+            frame (int): frame of the atom table (same atoms in every frame)
+        """
+        if frame == self._frame: return self
+        atom = uni.atom.groupby('frame').get_group(frame)
+        if len(atom.index) != len(self._xyzs):
+            raise ValueError("Frame {} does not have the same atoms as frame {}."
+                             .format(frame, self._frame))
+        new = copy(self)
+        new._frame = frame
+        new._xyzs = atom[['x', 'y', 'z']].values.astype(np.float64)
+        new._plans = {kind: (new._xyzs[self._plan_centers[kind]], ) + plan[1:]
+                      for kind, plan in self._plans.items()}
+        return new
 
 
     def enum_shell(self, shl):
@@ -279,18 +498,29 @@ class BasisFunctions(object):
         return shl.enum_spherical() if shl.spherical else shl.enum_cartesian()
 
 
-    def evaluate(self, xs=None, ys=None, zs=None, irrep=None, verbose=False):
+    def evaluate(self, xs=None, ys=None, zs=None, irrep=None, verbose=False,
+                 tol=None):
         """Evaluate basis functions on a numerical grid.
 
+        .. code-block:: python
+
+            bvs = uni.basis_functions.evaluate(x, y, z)            # dense array
+            bvs = uni.basis_functions.evaluate(x, y, z, tol=1e-8)  # screened
+
         Args:
             xs (np.ndarray): 1D-array of x values
             ys (np.ndarray): 1D-array of y values
             zs (np.ndarray): 1D-array of z values
             verbose (bool): print code pathway
             irrep (int,OrderedDict): irrep or {irrep: [vectors] for irrep in irreps}
+            tol (float): if provided, screen out values below tol and return
+                a :class:`~exatomic.algorithms.basis.SparseBasisValues`
 
         Note:
             Default behavior returns symbolic expressions if xs is None.
+            Numerical values are computed with compiled kernels (see
+            :func:`~exatomic.algorithms.numerical._evaluate_shells`) except
+            for symmetrized basis sets.
             See :meth:`exatomic.algorithms.orbital_util.numerical_grid_from_field_params`
             for grid construction details.
         """
@@ -303,7 +533,46 @@ class BasisFunctions(object):
                 func = self._evaluate_gau_bso
         else:
             func = self._evaluate_sto
-        return func(xs=xs, ys=ys, zs=zs, irrep=irrep)
+        return func(xs=xs, ys=ys, zs=zs, irrep=irrep, tol=tol)
+
+
+    def evaluate_cached(self, key, xs, ys, zs, irrep=None, tol=None, cart=None):
+        """Evaluate basis functions (or their derivatives with respect to
+        cart) through the least recently used cache.
+
+        .. code-block:: python
+
+            key = (grid_parameters, 0, npts)   # any hashable grid identifier
+            bvs = uni.basis_functions.evaluate_cached(key, x, y, z)
+
+        Args:
+            key (hashable): identifies the points (xs, ys, zs)
+            xs (np.ndarray): 1D-array of x values
+            ys (np.ndarray): 1D-array of y values
+            zs (np.ndarray): 1D-array of z values
+            irrep (int): irrep (see evaluate)
+            tol (float): screening tolerance (see evaluate)
+            cart (str): if provided, evaluate derivatives: 'x', 'y' or 'z'
+                (see evaluate_diff), 'grad' for values and gradients or 'lap'
+                for values, gradients and laplacians (see evaluate_derivatives)
+
+        Note:
+            Cached arrays are read-only. The key includes the frame, irrep,
+            tolerance and derivative but not MO coefficients, as basis
+            function values do not depend on them.
+        """
+        key = (key, self._frame, irrep, tol, cart)
+        vals = self.cache.get(key)
+        if vals is None:
+            if cart is None:
+                vals = self.evaluate(xs, ys, zs, irrep=irrep, tol=tol)
+            elif cart in ['grad', 'lap']:
+                vals = self.evaluate_derivatives(xs, ys, zs,
+                                                 laplacian=cart == 'lap')
+            else:
+                vals = self.evaluate_diff(xs, ys, zs, cart=cart)
+            self.cache.put(key, vals)
+        return vals
 
 
     def evaluate_diff(self, xs, ys, zs, cart='x', verbose=False):
@@ -317,18 +586,53 @@ class BasisFunctions(object):
             verbose (bool): print code pathway
 
         Note:
-            See :meth:`~exatomic.algorithms.orbital_util.numerical_grid_from_field_params`
-            for grid construction details.
+            All three derivatives are computed at once; prefer
+            :meth:`~exatomic.algorithms.basis.BasisFunctions.evaluate_derivatives`
+            when more than one is needed.
         """
-        if self._meta['program'] in ['nwchem']:
-            raise NotImplementedError("Code up _evaluate_diff_gau_bso.")
-        elif not self._meta['gaussian']:
-            raise NotImplementedError("Verify symbolic differentiation of STOs.")
-        if not self._meta['gaussian']:
-            return self._evaluate_diff_sto(xs, ys, zs, cart)
-        if not self._meta['program'] in ['molcas']:
-            print("Should you be using this functionality?")
-        return self._evaluate_diff_gau(xs, ys, zs, cart)
+        if cart not in ['x', 'y', 'z']:
+            raise ValueError('cart must be in "xyz".')
+        return self.evaluate_derivatives(xs, ys, zs)[1 + 'xyz'.index(cart)]
+
+
+    def evaluate_derivatives(self, xs, ys, zs, laplacian=False, block=256):
+        """Evaluate basis functions and their gradients (and laplacians)
+        in a single sweep over the grid with a compiled kernel (see
+        :func:`~exatomic.algorithms.numerical._evaluate_shells_deriv`).
+
+        .. code-block:: python
+
+            vals, dx, dy, dz = uni.basis_functions.evaluate_derivatives(x, y, z)
+            vals, dx, dy, dz, lap = uni.basis_functions.evaluate_derivatives(
+                x, y, z, laplacian=True)
+
+        Args:
+            xs (np.ndarray): 1D-array of x values
+            ys (np.ndarray): 1D-array of y values
+            zs (np.ndarray): 1D-array of z values
+            laplacian (bool): also compute laplacians (default False)
+            block (int): number of points per parallel task
+
+        Returns:
+            vals (np.ndarray): (4 or 5, nbf, npts) array
+        """
+        kind = self._numerical_kind()
+        if kind is None:
+            raise NotImplementedError("Derivatives of symmetrized basis "
+                                      "functions are not supported.")
+        xs, ys, zs = (np.ascontiguousarray(i, dtype=np.float64)
+                      for i in (xs, ys, zs))
+        plan = self._numerical_plan(kind)
+        return _evaluate_shells_deriv(xs, ys, zs, *(plan + (np.int64(block),
+                                                            bool(laplacian))))
+
+
+    def _numerical_kind(self):
+        """Numerical plan kind of this basis set (None if symmetrized)."""
+        if not self._meta['gaussian']: return 'sto'
+        if self._meta.get('symmetrized', False): return None
+        if self._meta['program'] in ['molcas']: return 'mag'
+        return 'bso'
 
 
     def _radial(self, x, y, z, alphas, cs, rs=None, pre=None):
@@ -351,11 +655,186 @@ class BasisFunctions(object):
         return sym.subs({_x: _x - x, _y: _y - y, _z: _z - z})
 
 
-    def _evaluate_gau_bso_sym(self, xs, ys, zs, irrep=None):
+    def _angular_coefficients(self, mag):
+        """Cartesian monomial coefficients of an angular function given
+        as (L, ml) (solid harmonic) or (l, m, n) (cartesian powers), in
+        the order of :data:`~exatomic.algorithms.basis.enum_cartesian`."""
+        if len(mag) == 3:
+            L = sum(mag)
+            coef = np.zeros(cart_lml_count[L])
+            pows = enum_cartesian[L]
+            coef[np.where((pows == np.array(mag)).all(axis=1))[0][0]] = 1.
+            return coef
+        L, ml = mag
+        if not L: return np.ones(1)
+        if not hasattr(self, '_c2s'):
+            self._c2s = car2sph(self._sh, enum_cartesian, orderedp=False)
+        return self._c2s[L][:, ml + L]
+
+
+    def _norms(self):
+        """Normalized (nprim, ncont) contraction coefficients of each
+        shell, as read only views into the cached shell arrays."""
+        sl, sprm, alphas, scof, coefs, scnt, sphr = self._soa
+        return [coefs[scof[i]:scof[i + 1]].reshape(sprm[i + 1] - sprm[i],
+                                                   scnt[i])
+                for i in range(len(sl))]
+
+
+    def _numerical_plan(self, kind):
+        """Struct of arrays description of the basis functions consumed by
+        :func:`~exatomic.algorithms.numerical._evaluate_shells`.
+
+        Args:
+            kind (str): 'bso', 'mag' or 'sto' (see evaluate)
+        """
+        if kind in self._plans: return self._plans[kind]
+        norms = self._norms()
+        # (shell instance, contraction, angular function, prefactor)
+        funcs = []
+        if kind == 'bso':
+            cache = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+            p = pd.DataFrame(self._ptrs, columns=('center', 'shelldx'))
+            p['L'] = [self._shells[i].L for i in p['shelldx']]
+            grps = p.groupby(['center', 'L'])
+            for cen, L, ml in zip(self._bso['center'],
+                                  self._bso['L'],
+                                  self._bso['ml']):
+                inst = grps.get_group((cen, L)).index[0]
+                funcs.append((inst, cache[cen][L][ml], (L, ml), 1.))
+                cache[cen][L][ml] += 1
+        else:
+            sphr = self._meta['spherical']
+            pres = None if kind == 'mag' or sphr else np.asarray(self._pre)
+            for inst, _, _, _, ishl in _iter_atom_shells(self._ptrs, self._xyzs,
+                                                         *self._shells):
+                mags = self.enum_shell(ishl) if kind == 'mag' else \
+                       ishl.enum_spherical() if sphr else ishl.enum_cartesian()
+                for mag in mags:
+                    for c in range(ishl.ncont):
+                        pre = 1. if pres is None else pres[len(funcs)]
+                        funcs.append((inst, c, tuple(mag), pre))
+        # Group functions by shell instance, remembering output rows
+        order = sorted(range(len(funcs)), key=lambda i: funcs[i][0])
+        insts = sorted(set(f[0] for f in funcs))
+        angmap = OrderedDict()
+        fang = []
+        for i in order:
+            mag = funcs[i][2]
+            if mag not in angmap: angmap[mag] = len(angmap)
+            fang.append(angmap[mag])
+        lmax = max([self._shells[self._ptrs[i][1]].L for i in insts] + [0])
+        nmono = cart_lml_count[lmax]
+        angs = np.zeros((max(len(angmap), 1), nmono))
+        for mag, i in angmap.items():
+            coef = self._angular_coefficients(mag)
+            angs[i, :len(coef)] = coef
+        pows = np.zeros((lmax + 1, nmono, 3), dtype=np.int64)
+        for L in range(lmax + 1):
+            pows[L, :cart_lml_count[L]] = enum_cartesian[L]
+        shls = [self._shells[self._ptrs[i][1]] for i in insts]
+        cnts = Counter(funcs[i][0] for i in order)
+        alphas = [shl.alphas for shl in shls]
+        rs = [np.zeros(shl.nprim, dtype=np.int64) if shl.rs is None
+              else shl.rs for shl in shls]
+        coefs = [norms[self._ptrs[i][1]].ravel() for i in insts]
+        self._plan_centers[kind] = np.array([self._ptrs[i][0] for i in insts],
+                                            dtype=np.int64)
+        plan = (self._xyzs[self._plan_centers[kind]].astype(np.float64),
+                np.array([shl.L for shl in shls], dtype=np.int64),
+                np.cumsum([0] + [shl.nprim for shl in shls]).astype(np.int64),
+                np.cumsum([0] + [len(c) for c in coefs]).astype(np.int64),
+                np.array([shl.ncont for shl in shls], dtype=np.int64),
+                np.concatenate(alphas + [np.empty(0)]).astype(np.float64),
+                np.concatenate(rs + [np.empty(0, dtype=np.int64)]).astype(np.int64),
+                np.concatenate(coefs + [np.empty(0)]).astype(np.float64),
+                np.cumsum([0] + [cnts[i] for i in insts]).astype(np.int64),
+                np.array(order, dtype=np.int64),
+                np.array([funcs[i][1] for i in order], dtype=np.int64),
+                np.array(fang, dtype=np.int64),
+                np.array([funcs[i][3] for i in order], dtype=np.float64),
+                angs, pows, np.int64(len(funcs)), kind != 'sto')
+        self._plans[kind] = plan
+        return plan
+
+
+    def shell_cutoffs(self, tol=1e-10, kind='bso', rmax=100., nr=4001):
+        """Radial extent of each shell instance: the largest distance from
+        its center at which any of its basis functions can exceed tol. The
+        bound sums over primitives, so it is dominated by the most diffuse
+        (smallest) exponent. Cutoffs do not depend on the centers, so they
+        are cached (read only) alongside the evaluation plans and shared
+        by :meth:`~exatomic.algorithms.basis.BasisFunctions.at_frame`.
+
+        Args:
+            tol (float): screening tolerance on basis function values
+            kind (str): 'bso', 'mag' or 'sto' (see evaluate)
+            rmax (float): largest radius considered
+            nr (int): number of radii on which the bound is tabulated
+
+        Returns:
+            cuts (np.ndarray): cutoff radius of each shell instance
+        """
+        key = (kind, tol, rmax, nr)
+        if key in self._cutoffs: return self._cutoffs[key]
+        (sxyz, sl, sprm, scof, scnt, alphas, rs, coefs, sfnc, fout, fcnt,
+         fang, fpre, angs, pows, nbf, gaussian) = self._numerical_plan(kind)
+        r = np.linspace(0, rmax, nr)
+        rk = r ** 2 if gaussian else r
+        # Largest angular coefficient sum (times prefactor) per function
+        amax = np.abs(angs[fang]).sum(axis=1) * np.abs(fpre)
+        cuts = np.empty(len(sl))
+        for s in range(len(sl)):
+            ncnt = scnt[s]
+            cmax = np.abs(coefs[scof[s]:scof[s + 1]]).reshape(-1, ncnt).max(axis=1)
+            a = alphas[sprm[s]:sprm[s + 1]]
+            pw = sl[s] + rs[sprm[s]:sprm[s + 1]]
+            bound = (cmax[:, np.newaxis] * r ** pw[:, np.newaxis]
+                     * np.exp(-a[:, np.newaxis] * rk)).sum(axis=0)
+            bound *= amax[sfnc[s]:sfnc[s + 1]].max()
+            idx = np.where(bound >= tol)[0]
+            cuts[s] = r[min(idx[-1] + 1, nr - 1)] if len(idx) else 0.
+        cuts.flags.writeable = False
+        self._cutoffs[key] = cuts
+        return cuts
+
+
+    def _evaluate_numerical(self, kind, xs, ys, zs, tol=None, block=256):
+        """Evaluate basis functions on a numerical grid with the compiled
+        shell kernel (see :meth:`~exatomic.algorithms.basis.BasisFunctions._numerical_plan`).
+        If tol is provided, only points within each shell's extent are
+        evaluated and a :class:`~exatomic.algorithms.basis.SparseBasisValues`
+        is returned."""
+        xs, ys, zs = (np.ascontiguousarray(i, dtype=np.float64)
+                      for i in (xs, ys, zs))
+        plan = self._numerical_plan(kind)
+        if tol is None:
+            return _evaluate_shells(xs, ys, zs, *(plan + (np.int64(block), )))
+        sxyz, sfnc, fout, nbf = plan[0], plan[8], plan[9], plan[15]
+        cuts = self.shell_cutoffs(tol, kind=kind)
+        # Cells of about half the typical shell extent, no smaller than
+        # the grid extent or largest shell extent allow (_bucket_points
+        # further caps the number of cells)
+        extent = max(np.ptp(i) for i in (xs, ys, zs)) if len(xs) else 0.
+        edge = max(np.median(cuts) / 2 if len(cuts) else 0.,
+                   cuts.max() / 16 if len(cuts) else 0., extent / 128, 1e-2)
+        sptr, spts = _screen_shell_points(xs, ys, zs, sxyz, cuts, edge)
+        # Each function has as many values as its shell instance has points
+        rows = np.zeros(nbf + 1, dtype=np.int64)
+        fshl = np.repeat(np.arange(len(cuts)), np.diff(sfnc))
+        rows[fout + 1] = np.diff(sptr)[fshl]
+        indptr = np.cumsum(rows)
+        indices, data = _evaluate_shells_sparse(xs, ys, zs,
+                                                *(plan + (sptr, spts, indptr)))
+        return SparseBasisValues(indptr, indices, data, (nbf, len(xs)))
+
+
+    def _evaluate_gau_bso_sym(self, xs, ys, zs, irrep=None, tol=None):
         """Evaluates a symmetrized Gaussian basis set and returns a numpy array.
         Currently the implementation only relies on the format most easily
         obtained from the Molcas basis set order format. It is possible that
-        for other codes a different method would be preferred."""
+        for other codes a different method would be preferred. Screening
+        (tol) is not supported and values are always dense."""
         print("Warning: symmetrized basis set evaluation is pre-alpha.")
         cnt = 0
         # Slice the basis set order if irrep is provided
@@ -373,7 +852,7 @@ class BasisFunctions(object):
         p = pd.DataFrame(self._ptrs, columns=('center', 'shldx'))
         p['L'] = [self._shells[i].L for i in p['shldx']]
         shls = p.groupby(['center', 'L'])
-        norms = [shl.norm_contract() for shl in self._shells]
+        norms = self._norms()
         ocens = [c for col in bso.columns if col.startswith('ocen')
                  for c in (col, col.replace('ocen', 'sign'))]
         for i, (cen, L, ml, irrep) in enumerate(zip(bso['center'],
@@ -408,13 +887,14 @@ class BasisFunctions(object):
         return flds
 
 
-    def _evaluate_gau_bso(self, xs, ys, zs, irrep=None):
+    def _evaluate_gau_bso(self, xs, ys, zs, irrep=None, tol=None):
         """Evaluates a Gaussian basis set according to the order specified
         by the :class:`~exatomic.core.basis.BasisSetOrder` and returns a
         numpy array of numerical basis function values."""
+        if xs is not None:
+            return self._evaluate_numerical('bso', xs, ys, zs, tol=tol)
         cnt = 0
-        if xs is not None: flds = np.empty((len(self), len(xs)))
-        else: flds = Series([None for _ in range(len(self))])
+        flds = Series([None for _ in range(len(self))])
         # cache remembers how many contracted functions are used
         # in each instance of Shell so we can access them out of order
         cache = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
@@ -422,7 +902,7 @@ class BasisFunctions(object):
         p['L'] = [self._shells[i].L for i in p['shelldx']]
         grps = p.groupby(['center', 'L'])
         # Just normalize each Shell once instead of on each access
-        norms = [shl.norm_contract() for shl in self._shells]
+        norms = self._norms()
         for cen, L, ml in zip(self._bso['center'],
                               self._bso['L'],
                               self._bso['ml']):
@@ -433,18 +913,18 @@ class BasisFunctions(object):
             a = self._angular(ishl, ax, ay, az, L, ml)
             r = self._radial(ax, ay, az, ishl.alphas,
                              norm[:,cache[cen][L][ml]])
-            if xs is None: flds[cnt] = a * r
-            else: flds[cnt] = evaluate_expr(a * r, xs, ys, zs)
+            flds[cnt] = a * r
             cache[cen][L][ml] += 1
             cnt += 1
         return flds
 
 
-    def _evaluate_sto(self, xs, ys, zs, irrep=None):
+    def _evaluate_sto(self, xs, ys, zs, irrep=None, tol=None):
         """Evaluates a STO basis set and returns a numpy array."""
+        if xs is not None:
+            return self._evaluate_numerical('sto', xs, ys, zs, tol=tol)
         cnt = 0
-        if xs is not None: flds = np.empty((len(self), len(xs)))
-        else: flds = Series([None for _ in range(len(self))])
+        flds = Series([None for _ in range(len(self))])
         sphr = self._meta['spherical']
         for _, ax, ay, az, ishl in _iter_atom_shells(self._ptrs, self._xyzs,
                                                      *self._shells):
@@ -452,53 +932,30 @@ class BasisFunctions(object):
             ang = ishl.enum_spherical() if sphr else ishl.enum_cartesian()
             for mag in ang:
                 a = self._angular(ishl, ax, ay, az, *mag)
-                if xs is not None: a = evaluate_expr(a, xs, ys, zs)
                 for c in range(ishl.ncont):
                     pre = 1 if self._meta['spherical'] else self._pre[cnt]
                     r = self._radial(ax, ay, az, ishl.alphas, norm[:, c],
                                      rs=ishl.rs, pre=pre)
-                    if xs is None: flds[cnt] = a * r
-                    else: flds[cnt] = evaluate_expr(r, xs, ys, zs, arr=a)
+                    flds[cnt] = a * r
                     cnt += 1
         return flds
 
 
-    def _evaluate_gau_mag(self, xs, ys, zs, irrep=None):
+    def _evaluate_gau_mag(self, xs, ys, zs, irrep=None, tol=None):
         """Evaluates a Gaussian basis set according to (apparently) only
         Molcas ordering and returns a numpy array."""
+        if xs is not None:
+            return self._evaluate_numerical('mag', xs, ys, zs, tol=tol)
         cnt = 0
-        if xs is not None: flds = np.empty((len(self), len(xs)))
-        else: flds = Series([None for _ in range(len(self))])
+        flds = Series([None for _ in range(len(self))])
         for _, ax, ay, az, ishl in _iter_atom_shells(self._ptrs, self._xyzs,
                                                      *self._shells):
             norm = ishl.norm_contract()
             for mag in self.enum_shell(ishl):
                 a = self._angular(ishl, ax, ay, az, *mag)
-                if xs is not None: a = evaluate_expr(a, xs, ys, zs)
                 for c in range(ishl.ncont):
                     r = self._radial(ax, ay, az, ishl.alphas, norm[:,c])
-                    if xs is None: flds[cnt] = a * r
-                    else: flds[cnt] = evaluate_expr(r, xs, ys, zs, arr=a)
-                    cnt += 1
-        return flds
-
-
-    def _evaluate_diff_gau(self, xs, ys, zs, cart):
-        """Evaluates the derivatives of a full Gaussian basis
-        set and returns a numpy array."""
-        cnt, flds = 0, np.empty((len(self), len(xs)))
-        for _, ax, ay, az, ishl in _iter_atom_shells(self._ptrs, self._xyzs,
-                                                     *self._shells):
-            norm = ishl.norm_contract()
-            for mag in self.enum_shell(ishl):
-                a = self._angular(ishl, ax, ay, az, *mag)
-                da = evaluate_expr(diff_expr(a, cart=cart), xs, ys, zs)
-                a = evaluate_expr(a, xs, ys, zs)
-                for c in range(ishl.ncont):
-                    r = self._radial(ax, ay, az, ishl.alphas, norm[:, c])
-                    dr = evaluate_expr(diff_expr(r, cart=cart), xs, ys, zs)
-                    r = evaluate_expr(r, xs, ys, zs)
-                    flds[cnt] = evaluate('da * r + a * dr')
+                    flds[cnt] = a * r
                     cnt += 1
         return flds
 
@@ -518,11 +975,16 @@ class BasisFunctions(object):
     def __init__(self, uni, frame=0, cartp=True):
         # Attach relevant uni attributes
         self._meta = uni.meta
+        self._frame = frame
         self._bso = uni.current_basis_set_order
-        ptrs, xyzs, shells = uni.enumerate_shells()
+        ptrs, xyzs, shells = uni.enumerate_shells(frame=frame)
         self._ptrs = ptrs
         self._xyzs = xyzs
         self._shells = shells
+        # Cached struct of arrays form of the shells
+        self._soa = uni.basis_set.shell_arrays(self._meta['program'],
+                                               self._meta['spherical'],
+                                               self._meta['gaussian'])
         self._ncc = uni.basis_dims['ncc']
         self._ncs = uni.basis_dims['ncs']
         # Scaled or unscaled solid harmonics
@@ -538,6 +1000,12 @@ class BasisFunctions(object):
             ptmp = sh[1].copy()
             sh[1] = OrderedDict((ml, ptmp[ml]) for ml in (1, -1, 0))
         self._sh = sh
+        # Numerical evaluation plans (see _numerical_plan)
+        self._plans = {}
+        self._plan_centers = {}
+        self._cutoffs = {}
+        # Evaluated basis functions (see evaluate_cached)
+        self.cache = BasisFunctionCache()
         # Exponential dependence
         self._expnt = _r ** 2
         if not self._meta['gaussian']:
@@ -545,32 +1013,93 @@ class BasisFunctions(object):
             self._pre = uni.current_basis_set_order['prefac']
 
 
+def _ranges(counts):
+    """Concatenated np.arange(n) for every n in counts."""
+    counts = np.asarray(counts, dtype=np.int64)
+    offs = np.cumsum(counts) - counts
+    return np.arange(counts.sum(), dtype=np.int64) - np.repeat(offs, counts)
+
+
+def _shell_counts(prims, sets, Ls=None):
+    """
+    Positions of the (set, L) shells in primitives_by_shell (sorted by
+    set and L). If Ls is None, returns the first position and number of
+    shells of each set instead.
+    """
+    pset = prims.index.get_level_values(0).values.astype(np.int64)
+    pL = prims.index.get_level_values(1).values.astype(np.int64)
+    if Ls is None:
+        usets, start, cnt = np.unique(pset, return_index=True,
+                                      return_counts=True)
+        pos = np.searchsorted(usets, sets).clip(0, max(len(usets) - 1, 0))
+        if len(sets) and not (len(usets) and np.array_equal(usets[pos], sets)):
+            raise ValueError('basis set order references unknown sets')
+        return start[pos], cnt[pos]
+    if not len(Ls): return np.empty(0, dtype=np.int64)
+    if not len(pL):
+        raise ValueError('basis set order references unknown shells')
+    base = max(pL.max(), np.max(Ls)) + 1
+    keys = pset * base + pL
+    want = sets * base + Ls
+    pos = np.searchsorted(keys, want).clip(0, len(keys) - 1)
+    if not np.array_equal(keys[pos], want):
+        raise ValueError('basis set order references unknown shells')
+    return pos
+
+
 def compute_uncontracted_basis_set_order(uni):
+    """
+    Uncontracted basis set order, one basis function per primitive of
+    each (center, L, ml), built with index arithmetic on the
+    primitives_by_shell counts of the basis set. For molcas, primitives
+    follow the (center, L, ml) runs of the basis_set_order; for nwchem,
+    functions are ordered by center, L, primitive and ml.
+
+    Args:
+        uni (:class:`~exatomic.core.universe.Universe`): a universe
+
+    Returns:
+        bso (pd.DataFrame): center, L, ml, shell (primitive) and frame
+    """
     bso = uni.basis_set_order
     prims = uni.basis_set.primitives_by_shell()
-    df = []
-    pcen, pL, pml = -1, -1, -1
-    if uni.meta['program'] == 'molcas':
-        for cen, L, ml in zip(bso['center'], bso['L'], bso['ml']):
-            if not all(p == c for p, c in zip((pcen, pL, pml), (cen, L, ml))):
-                seht = uni.atom.loc[cen]['set']
-                nprim = prims.loc[(seht, L)]
-                for i in range(nprim):
-                    df.append((cen, L, ml, i, 0))
-            pcen = cen
-            pL = L
-            pml = ml
-    elif uni.meta['program'] == 'nwchem':
+    nprims = prims.values.astype(np.int64)
+    program = uni.meta['program']
+    cols = ('center', 'L', 'ml', 'shell', 'frame')
+    if program == 'molcas':
+        keys = bso[['center', 'L', 'ml']].values.astype(np.int64)
+        new = np.ones(len(keys), dtype=np.bool_)
+        new[1:] = (keys[1:] != keys[:-1]).any(axis=1)
+        cen, L, ml = keys[new].T
+        sets = uni.atom['set'].loc[cen].values.astype(np.int64)
+        cnt = nprims[_shell_counts(prims, sets, L)]
+        center, L, ml = np.repeat(cen, cnt), np.repeat(L, cnt), np.repeat(ml, cnt)
+        shell = _ranges(cnt)
+    elif program == 'nwchem':
         if not uni.meta['spherical']:
             raise NotImplementedError('Sorry.')
         from exatomic.nwchem.basis import spherical_ordering_function as func
-        prims = prims.groupby('set')
-        for i, seht in enumerate(uni.atom['set']):
-            shls = prims.get_group(seht)
-            for (seht, L), nprim in shls.items():
-                for j in range(nprim):
-                    for ml in func(L):
-                        df.append([i, L, ml, j, 0])
-    cols = ('center', 'L', 'ml', 'shell', 'frame')
+        sets = uni.atom['set'].values.astype(np.int64)
+        first, nshl = _shell_counts(prims, sets)
+        # Shell instances (atom, position in prims)
+        inst = np.repeat(first - (np.cumsum(nshl) - nshl), nshl) + \
+               np.arange(nshl.sum())
+        atom = np.repeat(np.arange(len(sets)), nshl)
+        iL = prims.index.get_level_values(1).values.astype(np.int64)[inst]
+        nml = 2 * iL + 1
+        cnt = nprims[inst] * nml
+        pos = _ranges(cnt)
+        nml = np.repeat(nml, cnt)
+        lmax = iL.max() if len(iL) else 0
+        mls = np.zeros((lmax + 1, 2 * lmax + 1), dtype=np.int64)
+        for l in range(lmax + 1): mls[l, :2 * l + 1] = func(l)
+        center, L = np.repeat(atom, cnt), np.repeat(iL, cnt)
+        ml, shell = mls[L, pos % nml], pos // nml
+    else:
+        center = L = ml = shell = np.empty(0, dtype=np.int64)
     uni.meta['uncontracted'] = True
-    return pd.DataFrame(df, columns=cols)
+    return pd.DataFrame(OrderedDict([('center', center), ('L', L), ('ml', ml),
+                                     ('shell', shell),
+                                     ('frame', np.zeros(len(center),
+                                                        dtype=np.int64))]),
+                        columns=list(cols))
@@ -24,8 +24,12 @@ Generated using the following code.
         return f
 
 """
+from collections import OrderedDict
 import numpy as np
+import pandas as pd
+from scipy import sparse
 from numba import jit
+from .numerical import _enum_cartesian, dfac21, fac2
 
 @jit(nopython=True, cache=True)
 def car2sph_scaled(L):
@@ -44,6 +48,197 @@ def _car2sph_2d(L):
             sq[c, s] = flat[c * sdim + s]
     return sq
 
+def _sphr_cart_ratio(L):
+    """Ratio of the spherical to cartesian contraction normalization (see
+    :meth:`~exatomic.algorithms.numerical.Shell.norm_contract`); s
+    functions are the same in both (car2sph_scaled(0) is not scaled)."""
+    if not L: return 1.
+    return 0.893243841738002 / np.sqrt(dfac21(L)) / 0.251979435538381
+
+
+def _angular_metric(L):
+    """Overlap of the cartesian monomials of degree L on the unit sphere
+    (up to a constant); components of one shell share the radial part."""
+    pows = np.array(list(_enum_cartesian(L)), dtype=np.int64)
+    tot = pows[:, np.newaxis] + pows[np.newaxis]
+    met = np.ones(tot.shape[:2])
+    for i in range(3):
+        met *= np.vectorize(lambda n: fac2(n - 1) if not n % 2 else 0.)(tot[..., i])
+    return met
+
+
+def _shell_transforms(lmax):
+    """Per-L dense transforms: T (ncart, nsphr) with spherical functions
+    as linear combinations of cartesian functions and its left inverse P
+    (nsphr, ncart), the orthogonal projection in the metric of the shell."""
+    ncart = (lmax + 1) * (lmax + 2) // 2
+    tmat = np.zeros((lmax + 1, ncart, 2 * lmax + 1))
+    pmat = np.zeros((lmax + 1, 2 * lmax + 1, ncart))
+    for L in range(lmax + 1):
+        nc, ns = (L + 1) * (L + 2) // 2, 2 * L + 1
+        t = _sphr_cart_ratio(L) * car2sph_scaled(L).reshape(nc, ns)
+        met = _angular_metric(L)
+        tm = t.T.dot(met)
+        tmat[L, :nc, :ns] = t
+        pmat[L, :ns, :nc] = np.linalg.solve(tm.dot(t), tm)
+    return tmat, pmat
+
+
+_transforms = OrderedDict()
+# Columns of the p transform (x, y, z) of ml = -1, 0, 1, as ordered by the
+# parsers and basis functions (see exatomic.nwchem.basis.spherical_ordering_function)
+_pcols = np.array([1, 2, 0], dtype=np.int64)
+
+
+def car2sph_transform(cart_order, sphr_order):
+    """
+    Block diagonal sparse transformation between a cartesian and a
+    spherical basis set order. Spherical function j is the combination
+    sum_i T[i, j] of cartesian functions i of the same (center, L, shell),
+    with the solid harmonics of
+    :func:`~exatomic.algorithms.car2sph.car2sph_scaled` (column ml + L;
+    p functions are x, y, z for ml = 1, -1, 0).
+    The left inverse P (P T = 1) projects cartesian coefficients onto the
+    spherical functions, discarding lower angular momentum contaminants.
+    Transforms are cached per pair of basis set orders.
+
+    Args:
+        cart_order (pd.DataFrame): columns center, L, shell, l, m, n
+            (and optionally prefac)
+        sphr_order (pd.DataFrame): columns center, L, shell, ml
+
+    Returns:
+        tmat, pmat (scipy.sparse.csr_matrix): (ncart, nsphr) and (nsphr, ncart)
+    """
+    cols = ['center', 'L', 'shell']
+    cart = cart_order[cols + ['l', 'm', 'n']].values.astype(np.int64)
+    sphr = sphr_order[cols + ['ml']].values.astype(np.int64)
+    key = (cart.tobytes(), sphr.tobytes())
+    if 'prefac' in cart_order.columns:
+        key += (cart_order['prefac'].values.astype(np.float64).tobytes(), )
+    if key in _transforms: return _transforms[key]
+    lmax = max(cart[:, 1].max(), sphr[:, 1].max())
+    tmat, pmat = _shell_transforms(lmax)
+    # Position of each cartesian function within its shell
+    rows = {}
+    for L in range(lmax + 1):
+        for i, pw in enumerate(_enum_cartesian(L)):
+            rows[pw] = i
+    cpos = np.array([rows[tuple(pw)] for pw in cart[:, 3:]], dtype=np.int64)
+    # Shell of every function, cartesian functions grouped by shell
+    grp, inv = np.unique(np.vstack((cart[:, :3], sphr[:, :3])), axis=0,
+                         return_inverse=True)
+    inv = inv.ravel()
+    cgrp, sgrp = inv[:len(cart)], inv[len(cart):]
+    corder = np.lexsort((cpos, cgrp))
+    cstart = np.searchsorted(cgrp[corder], np.arange(len(grp)))
+    ncart = (grp[:, 1] + 1) * (grp[:, 1] + 2) // 2
+    if not np.array_equal(np.bincount(cgrp, minlength=len(grp)), ncart):
+        raise ValueError('cartesian basis set order has incomplete shells')
+    # Every spherical function couples to all cartesians of its shell
+    sL = sphr[:, 1]
+    scol = sphr[:, 3] + sL
+    isp = sL == 1
+    scol[isp] = _pcols[scol[isp]]
+    cnt = ncart[sgrp]
+    j = np.repeat(np.arange(len(sphr)), cnt)
+    off = np.arange(cnt.sum()) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+    i = corder[cstart[sgrp][j] + off]
+    L, ml = sL[j], scol[j]
+    shape = (len(cart), len(sphr))
+    tval, pval = tmat[L, cpos[i], ml], pmat[L, ml, cpos[i]]
+    if 'prefac' in cart_order.columns:
+        # Cartesian functions carry an additional prefactor
+        pre = cart_order['prefac'].values.astype(np.float64)[i]
+        tval, pval = tval / pre, pval * pre
+    tsp = sparse.csr_matrix((tval, (i, j)), shape=shape)
+    psp = sparse.csr_matrix((pval, (j, i)), shape=shape[::-1])
+    tsp.eliminate_zeros()
+    psp.eliminate_zeros()
+    if len(_transforms) > 15: _transforms.popitem(last=False)
+    _transforms[key] = (tsp, psp)
+    return tsp, psp
+
+
+def _sphr_order(cart_order):
+    """Spherical basis set order with the shells of a cartesian one and
+    increasing ml (p functions ordered as ml = 1, -1, 0, i.e. x, y, z)."""
+    cols = ['center', 'L', 'shell']
+    shls = cart_order[cols].drop_duplicates()
+    L = shls['L'].values.astype(np.int64)
+    order = shls.loc[shls.index.repeat(2 * L + 1)].reset_index(drop=True)
+    order['ml'] = np.concatenate([np.array([1, -1, 0]) if l == 1 else
+                                  np.arange(-l, l + 1) for l in L])
+    order.index.name = 'chi'
+    return order
+
+
+def car2sph_matrices(uni, frame=None):
+    """
+    Transform the cartesian MO coefficients (all coefficient columns),
+    overlap and density matrices of a universe to the spherical basis
+    with one sparse-dense product each (the transform is built once per
+    basis set, see :func:`~exatomic.algorithms.car2sph.car2sph_transform`).
+
+    .. code-block:: python
+
+        sph = car2sph_matrices(uni)
+        uni.sphr_momatrix = sph['momatrix']
+        uni.sphr_basis_set_order = sph['basis_set_order']
+
+    Args:
+        uni (:class:`~exatomic.core.universe.Universe`): universe with a
+            cartesian basis set order and any of momatrix, overlap, density
+        frame (int): only transform this frame (default all)
+
+    Returns:
+        tables (OrderedDict): spherical basis_set_order, momatrix, overlap
+            and density (those present)
+    """
+    from exatomic.core.basis import BasisSetOrder, Overlap
+    from exatomic.core.orbital import DenseMOMatrix, DensityMatrix
+    cart = getattr(uni, '_cart_basis_set_order', None)
+    if cart is None: cart = uni.basis_set_order
+    sphr = getattr(uni, '_sphr_basis_set_order', None)
+    if sphr is None: sphr = BasisSetOrder(_sphr_order(cart))
+    tmat, pmat = car2sph_transform(cart, sphr)
+    tables = OrderedDict([('basis_set_order', sphr)])
+    mo = getattr(uni, '_cart_momatrix', None)
+    if mo is None: mo = getattr(uni, '_momatrix', None)
+    if mo is not None:
+        dense = DenseMOMatrix.from_momatrix(mo)
+        if dense.irreps != [None]:
+            raise ValueError('cannot transform symmetry blocked momatrix')
+        sph = DenseMOMatrix()
+        for (col, frm, _), arr in dense._blocks.items():
+            if frame is None or frm == frame:
+                sph.add(pmat.dot(arr), column=col, frame=frm)
+        tables['momatrix'] = sph.to_momatrix()
+    for attr in ('overlap', 'density'):
+        tbl = getattr(uni, '_' + attr, None)
+        if tbl is None: continue
+        if 'irrep' in tbl.columns:
+            raise ValueError('cannot transform symmetry blocked {}'.format(attr))
+        frames = (tbl['frame'].astype(np.int64).unique() if 'frame' in tbl.columns
+                  else [0])
+        mat = tmat if attr == 'overlap' else pmat.T.tocsr()
+        cols = [col for col in tbl.columns
+                if col not in ('chi0', 'chi1', 'frame')]
+        chi0, chi1 = np.tril_indices(mat.shape[1])
+        dfs = []
+        for frm in frames:
+            if frame is not None and frm != frame: continue
+            df = pd.DataFrame({'chi0': chi0, 'chi1': chi1, 'frame': frm})
+            for col in cols:
+                sq = tbl.square(frame=frm, column=col).values
+                sq = mat.T.dot(mat.T.dot(sq).T)
+                df[col] = sq[chi0, chi1]
+            dfs.append(df)
+        tables[attr] = (Overlap if attr == 'overlap' else DensityMatrix)(
+            pd.concat(dfs, ignore_index=True))
+    return tables
+
+
 @jit(nopython=True, cache=True)
 def _car2sph_raw(L):
     """Dump of numerical coefficients from symbolic solid harmonics
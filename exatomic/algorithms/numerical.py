@@ -6,11 +6,14 @@ Numerical methods and classes
 ###############################
 Everything in this module is implemented in numba.
 """
+from operator import mul
+from functools import reduce
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
-from numba import (jit, jitclass, deferred_type,
+from numba import (jit, jitclass, deferred_type, prange,
                    optional, int64, float64, boolean)
-from exatomic.base import nbche
+from exatomic.base import nbche, nbpll
 
 #################
 # Miscellaneous #
@@ -117,22 +120,24 @@ def _square_indices(n):
     return x, y
 
 
-@jit(nopython=True, nogil=True, cache=nbche)
+def _packed_density(cmat, occvec):
+    """
+    Row major packed lower triangle of the density matrix
+    D = C diag(n) C^T, formed with a single matrix product.
+    """
+    occvec = np.asarray(occvec, dtype=np.float64)
+    if cmat.shape[1] != len(occvec):
+        raise ValueError('{} occupations for {} orbitals'.format(
+            len(occvec), cmat.shape[1]))
+    dens = (cmat * occvec).dot(cmat.T)
+    return dens[np.tril_indices(cmat.shape[0])]
+
+
 def density_from_momatrix(cmat, occvec):
-    nbas = len(occvec)
-    arlen = nbas * (nbas + 1) // 2
-    dens = np.empty(arlen, dtype=np.float64)
-    chi0 = np.empty(arlen, dtype=np.int64)
-    chi1 = np.empty(arlen, dtype=np.int64)
-    frame = np.zeros(arlen, dtype=np.int64)
-    cnt = 0
-    for i in range(nbas):
-        for j in range(i + 1):
-            dens[cnt] = (cmat[i,:] * cmat[j,:] * occvec).sum()
-            chi0[cnt] = i
-            chi1[cnt] = j
-            cnt += 1
-    return chi0, chi1, dens, frame
+    nbas = cmat.shape[0]
+    chi0, chi1 = np.tril_indices(nbas)
+    frame = np.zeros(len(chi0), dtype=np.int64)
+    return chi0, chi1, _packed_density(cmat, occvec), frame
 
 
 @jit(nopython=True, nogil=True, cache=nbche)
@@ -164,7 +169,6 @@ def momatrix_as_square(movec):
 # Reordering matrix elements can be useful #
 ############################################
 
-@jit(nopython=True, nogil=True, cache=nbche)
 def _index_map(old, new):
     """
     Basis functions are uniquely defined by 4 indices;
@@ -174,6 +178,12 @@ def _index_map(old, new):
     simply finds the mapping between the `old` basis set ordering scheme
     and the new one.
 
+    Each row is packed into a single integer key (mixed radix over the
+    ranges of the indices) and the new keys are looked up in the sorted
+    old keys, which is O(n log n) rather than comparing all pairs of rows.
+    If the index ranges are too large for an int64 key, rows are ranked
+    with a lexicographic unique instead.
+
     Args:
         old (np.ndarray): order [center, L, ml, shell]
         new (np.ndarray): order [center, L, ml, shell]
@@ -181,38 +191,87 @@ def _index_map(old, new):
     Returns:
         mappr (np.ndarray): old -> new indices
     """
-    mappr = np.empty(len(new), dtype=np.int64)
-    for ni in range(len(new)):
-        for oi in range(len(old)):
-            if (new[ni] == old[oi]).all():
-                mappr[ni] = oi
-                break
+    old = np.asarray(old, dtype=np.int64)
+    new = np.asarray(new, dtype=np.int64)
+    both = np.vstack((old, new))
+    lo = both.min(axis=0)
+    rad = both.max(axis=0) - lo + 1
+    if reduce(mul, (int(r) for r in rad), 1) > np.iinfo(np.int64).max:
+        _, keys = np.unique(both, axis=0, return_inverse=True)
+        keys = keys.ravel().astype(np.int64)
+        okey, nkey = keys[:len(old)], keys[len(old):]
+    else:
+        okey = np.zeros(len(old), dtype=np.int64)
+        nkey = np.zeros(len(new), dtype=np.int64)
+        for i in range(both.shape[1]):
+            okey = okey * rad[i] + old[:, i] - lo[i]
+            nkey = nkey * rad[i] + new[:, i] - lo[i]
+    srt = np.argsort(okey, kind='mergesort')
+    pos = np.searchsorted(okey, nkey, sorter=srt)
+    mappr = srt[np.minimum(pos, len(old) - 1)]
+    if (okey[mappr] != nkey).any():
+        raise ValueError('basis functions of the new order are not '
+                         'in the old order')
     return mappr
 
-@jit(nopython=True, nogil=True, cache=nbche)
-def _reorder_matrix(old, new, values):
+def _reorder_matrix(old, new, values, both=True):
     """
     Reorders matrix elements according to an old and new basis set order.
 
     Args:
         old (np.ndarray): order [center, L, ml, shell]
         new (np.ndarray): order [center, L, ml, shell]
+        values (np.ndarray): square matrix in the old order
+        both (bool): reorder columns as well as rows (default True)
 
     Returns:
         nvals (np.ndarray): reordered matrix
     """
-    nvals = np.empty(values.shape)
     mappr = _index_map(old, new)
-    for ni, oi in enumerate(mappr):
-        for nj, oj in enumerate(mappr):
-            nvals[ni, nj] = values[oi, oj]
-    return nvals
+    if both: return values[np.ix_(mappr, mappr)]
+    return values[mappr]
+
+def _basis_orders(uni_to_reorder, ordered_uni):
+    cols = ['center', 'L', 'ml', 'shell']
+    old = uni_to_reorder.current_basis_set_order[cols].values.astype(np.int64)
+    new = ordered_uni.current_basis_set_order[cols].values.astype(np.int64)
+    return old, new
+
+
+def _reorder_table(tbl, remap):
+    """
+    Relabel the basis function indices of a matrix table (chi for
+    coefficient matrices, chi0 and chi1 for packed symmetric matrices)
+    and restore its canonical row order with a single integer sort.
+    Rows of basis functions missing from the new order are dropped.
+    """
+    cols = OrderedDict((col, tbl[col].values) for col in tbl.columns)
+    frame = (tbl['frame'].astype(np.int64).values if 'frame' in cols
+             else np.zeros(len(tbl), dtype=np.int64))
+    if 'chi' in cols:
+        chi = remap[cols['chi']]
+        keep = chi > -1
+        orb = cols['orbital'].astype(np.int64)
+        cols['chi'] = chi
+        key = (frame * (orb.max() + 1) + orb) * len(remap) + chi
+    else:
+        chi0, chi1 = remap[cols['chi0']], remap[cols['chi1']]
+        keep = (chi0 > -1) & (chi1 > -1)
+        cols['chi0'] = np.maximum(chi0, chi1)
+        cols['chi1'] = np.minimum(chi0, chi1)
+        key = (frame * (len(remap) * (len(remap) + 1) // 2)
+               + cols['chi0'] * (cols['chi0'] + 1) // 2 + cols['chi1'])
+    order = np.where(keep)[0]
+    order = order[np.argsort(key[order])]
+    return type(tbl)(pd.DataFrame(OrderedDict(
+        (col, vals[order]) for col, vals in cols.items())))
 
 
 def reorder_matrix(uni_to_reorder, ordered_uni, attr='momatrix', mocoefs='coef'):
     """
     Reorders matrix elements in a uni_to_reorder by the basis set order
-    defined in ordered_uni.
+    defined in ordered_uni. The square matrix is reordered along both
+    axes.
 
     Args:
         uni_to_reorder (:class:`~exatomic.core.universe.Universe`): uni to reorder
@@ -222,16 +281,72 @@ def reorder_matrix(uni_to_reorder, ordered_uni, attr='momatrix', mocoefs='coef')
 
     Returns:
         reordered (pd.DataFrame): reordered matrix with labeled columns and indices
+
+    See Also:
+        :func:`~exatomic.algorithms.numerical.reorder_matrices` reorders
+        every matrix table of a universe at once (only the basis
+        function axis of coefficient matrices).
     """
-    cols = ['center', 'L', 'ml', 'shell']
-    old = uni_to_reorder.current_basis_set_order[cols].values.astype(np.int64)
-    new = ordered_uni.current_basis_set_order[cols].values.astype(np.int64)
-    val = getattr(uni_to_reorder, attr).square(column=mocoefs).values
-    cmat = _reorder_matrix(old, new, val)
-    idxs = pd.Index(range(val.shape[0]), name='chi')
-    cols = pd.Index(range(val.shape[0]), name='orbital')
+    old, new = _basis_orders(uni_to_reorder, ordered_uni)
+    mat = getattr(uni_to_reorder, '_dense_' + attr, None)
+    if mat is None: mat = getattr(uni_to_reorder, attr)
+    sq = mat.square(column=mocoefs)
+    cmat = _reorder_matrix(old, new, sq.values)
+    idxs = pd.Index(range(cmat.shape[0]), name=sq.index.name)
+    cols = pd.Index(range(cmat.shape[1]), name=sq.columns.name)
     return pd.DataFrame(cmat, columns=cols, index=idxs)
 
+
+def reorder_matrices(uni_to_reorder, ordered_uni, attrs=None, inplace=False):
+    """
+    Reorders every matrix table (all coefficient columns of momatrix,
+    overlap, density, etc.) of uni_to_reorder by the basis set order
+    defined in ordered_uni. The basis function mapping is computed once
+    and applied by relabeling the basis function indices of the tables,
+    so no square matrices are formed.
+
+    .. code-block:: python
+
+        tables = reorder_matrices(uni, ref)     # {'momatrix': ..., 'overlap': ...}
+        reorder_matrices(uni, ref, inplace=True)
+
+    Args:
+        uni_to_reorder (:class:`~exatomic.core.universe.Universe`): uni to reorder
+        ordered_uni (:class:`~exatomic.core.universe.Universe`): ordered uni
+        attrs (list): matrix attributes (default all of momatrix,
+            cart_momatrix, sphr_momatrix, dense_momatrix, overlap, density
+            that are present)
+        inplace (bool): replace the tables of uni_to_reorder
+
+    Returns:
+        tables (OrderedDict): reordered tables by attribute (if not inplace)
+    """
+    old, new = _basis_orders(uni_to_reorder, ordered_uni)
+    mappr = _index_map(old, new)
+    remap = np.full(len(old), -1, dtype=np.int64)
+    remap[mappr] = np.arange(len(mappr))
+    if attrs is None:
+        attrs = [attr for attr in ('momatrix', 'cart_momatrix', 'sphr_momatrix',
+                                   'dense_momatrix', 'overlap', 'density')
+                 if '_' + attr in vars(uni_to_reorder)]
+    tables = OrderedDict()
+    for attr in attrs:
+        tbl = getattr(uni_to_reorder, attr)
+        if hasattr(tbl, 'to_momatrix'):
+            if tbl.irreps != [None]:
+                raise ValueError('cannot reorder symmetry blocked {}'.format(attr))
+            dense = type(tbl)()
+            for (col, frame, irrep), arr in tbl._blocks.items():
+                dense.add(arr[mappr], column=col, frame=frame, irrep=irrep)
+            tables[attr] = dense
+            continue
+        if 'irrep' in tbl.columns:
+            raise ValueError('cannot reorder symmetry blocked {}'.format(attr))
+        tables[attr] = _reorder_table(tbl, remap)
+    if not inplace: return tables
+    for attr, tbl in tables.items():
+        setattr(uni_to_reorder, attr, tbl)
+
 #######################
 # Basis set expansion #
 #######################
@@ -262,6 +377,383 @@ def _enum_spherical(L, increasing=True):
 
 
 
+@jit(nopython=True, nogil=True, cache=nbche)
+def _shell_point(dx, dy, dz, s, sl, sprm, scof, scnt, alphas, rs, coefs,
+                 pows, gaussian, rad, mono, xp, yp, zp):
+    """Radial parts (per contraction) and cartesian monomials of a shell
+    instance at a point displaced by (dx, dy, dz) from its center. Fills
+    rad and mono in place and returns the number of monomials."""
+    r2 = dx * dx + dy * dy + dz * dz
+    r = r2 if gaussian else np.sqrt(r2)
+    ncnt = scnt[s]
+    for c in range(ncnt):
+        rad[c] = 0.
+    for k in range(sprm[s], sprm[s + 1]):
+        ex = np.exp(-alphas[k] * r)
+        if rs[k]: ex *= r ** rs[k]
+        off = scof[s] + (k - sprm[s]) * ncnt
+        for c in range(ncnt):
+            rad[c] += coefs[off + c] * ex
+    L = sl[s]
+    xp[0] = 1.
+    yp[0] = 1.
+    zp[0] = 1.
+    for l in range(1, L + 1):
+        xp[l] = xp[l - 1] * dx
+        yp[l] = yp[l - 1] * dy
+        zp[l] = zp[l - 1] * dz
+    nm = (L + 1) * (L + 2) // 2
+    for m in range(nm):
+        mono[m] = xp[pows[L, m, 0]] * yp[pows[L, m, 1]] * zp[pows[L, m, 2]]
+    return nm
+
+
+@jit(nopython=True, nogil=True, parallel=nbpll)
+def _evaluate_shells(xs, ys, zs, sxyz, sl, sprm, scof, scnt, alphas, rs,
+                     coefs, sfnc, fout, fcnt, fang, fpre, angs, pows,
+                     nbf, gaussian, block):
+    """Evaluate contracted basis functions on a set of points.
+
+    Shell instances (a shell placed on a center) are stored as a struct of
+    arrays; functions belonging to the same shell instance are contiguous
+    (sfnc pointers) so that the radial part of each contraction and the
+    cartesian monomials of degree L are computed once per point and shell.
+    Angular parts are rows of cartesian monomial coefficients (angs) in the
+    order given by pows[L].
+
+    Args:
+        xs (np.ndarray): 1D-array of x values
+        ys (np.ndarray): 1D-array of y values
+        zs (np.ndarray): 1D-array of z values
+        sxyz (np.ndarray): shell instance centers (nshl, 3)
+        sl (np.ndarray): shell instance angular momenta
+        sprm (np.ndarray): pointers into alphas and rs (nshl + 1)
+        scof (np.ndarray): pointers into coefs (nshl + 1)
+        scnt (np.ndarray): number of contracted functions per shell instance
+        alphas (np.ndarray): primitive exponents
+        rs (np.ndarray): primitive radial powers (zero for gaussians)
+        coefs (np.ndarray): normalized (nprim, ncont) coefficients, flattened
+        sfnc (np.ndarray): pointers into the function arrays (nshl + 1)
+        fout (np.ndarray): output row of each function
+        fcnt (np.ndarray): contraction column of each function
+        fang (np.ndarray): angular row of each function
+        fpre (np.ndarray): prefactor of each function
+        angs (np.ndarray): cartesian monomial coefficients (nang, nmono)
+        pows (np.ndarray): cartesian powers (lmax + 1, nmono, 3)
+        nbf (int): number of basis functions
+        gaussian (bool): exp(-a r ** 2) if True else exp(-a r)
+        block (int): number of points per parallel task
+
+    Returns:
+        vals (np.ndarray): basis function values (nbf, npts)
+    """
+    npts = len(xs)
+    nshl = len(sl)
+    lmax = pows.shape[0] - 1
+    nmono = pows.shape[1]
+    mcnt = scnt.max() if nshl else 1
+    vals = np.zeros((nbf, npts), dtype=np.float64)
+    nblk = (npts + block - 1) // block
+    for b in prange(nblk):
+        rad = np.empty(mcnt, dtype=np.float64)
+        mono = np.empty(nmono, dtype=np.float64)
+        xp = np.empty(lmax + 1, dtype=np.float64)
+        yp = np.empty(lmax + 1, dtype=np.float64)
+        zp = np.empty(lmax + 1, dtype=np.float64)
+        for p in range(b * block, min((b + 1) * block, npts)):
+            for s in range(nshl):
+                nm = _shell_point(xs[p] - sxyz[s, 0], ys[p] - sxyz[s, 1],
+                                  zs[p] - sxyz[s, 2], s, sl, sprm, scof,
+                                  scnt, alphas, rs, coefs, pows, gaussian,
+                                  rad, mono, xp, yp, zp)
+                for f in range(sfnc[s], sfnc[s + 1]):
+                    ang = 0.
+                    for m in range(nm):
+                        ang += angs[fang[f], m] * mono[m]
+                    vals[fout[f], p] = fpre[f] * ang * rad[fcnt[f]]
+    return vals
+
+
+@jit(nopython=True, nogil=True, cache=nbche)
+def _shell_point_deriv(dx, dy, dz, s, sl, sprm, scof, scnt, alphas, rs, coefs,
+                       pows, gaussian, rad, drad, lrad, mono, dmono, lmono,
+                       xp, yp, zp):
+    """As :func:`~exatomic.algorithms.numerical._shell_point`, also filling
+    the radial derivative divided by r (drad), the radial laplacian (lrad)
+    and the gradients (dmono) and laplacians (lmono) of the monomials.
+    The exponential of each primitive is computed once for all of them."""
+    r2 = dx * dx + dy * dy + dz * dz
+    r = np.sqrt(r2)
+    ncnt = scnt[s]
+    for c in range(ncnt):
+        rad[c] = 0.
+        drad[c] = 0.
+        lrad[c] = 0.
+    for k in range(sprm[s], sprm[s + 1]):
+        a = alphas[k]
+        off = scof[s] + (k - sprm[s]) * ncnt
+        if gaussian and not rs[k]:
+            g = np.exp(-a * r2)
+            dg = -2. * a * g
+            lg = (4. * a * a * r2 - 6. * a) * g
+        else:
+            # r ** n exp(-a r ** q) with t = d ln(g) / dr
+            n = 2 * rs[k] if gaussian else rs[k]
+            q = 2. if gaussian else 1.
+            g = np.exp(-a * r ** q) * r ** n
+            if r > 1e-12:
+                t = n / r - q * a * r ** (q - 1.)
+                dt = -n / r2 - q * (q - 1.) * a * r ** (q - 2.)
+                dg = t * g / r
+                lg = (t * t + dt) * g + 2. * dg
+            else:
+                # Nuclear cusp: the derivative is undefined at the center
+                dg = 0.
+                lg = 0.
+        for c in range(ncnt):
+            rad[c] += coefs[off + c] * g
+            drad[c] += coefs[off + c] * dg
+            lrad[c] += coefs[off + c] * lg
+    L = sl[s]
+    xp[0] = 1.
+    yp[0] = 1.
+    zp[0] = 1.
+    for l in range(1, L + 1):
+        xp[l] = xp[l - 1] * dx
+        yp[l] = yp[l - 1] * dy
+        zp[l] = zp[l - 1] * dz
+    nm = (L + 1) * (L + 2) // 2
+    for m in range(nm):
+        i, j, k = pows[L, m, 0], pows[L, m, 1], pows[L, m, 2]
+        mono[m] = xp[i] * yp[j] * zp[k]
+        dmono[0, m] = i * xp[i - 1] * yp[j] * zp[k] if i else 0.
+        dmono[1, m] = j * xp[i] * yp[j - 1] * zp[k] if j else 0.
+        dmono[2, m] = k * xp[i] * yp[j] * zp[k - 1] if k else 0.
+        lap = 0.
+        if i > 1: lap += i * (i - 1) * xp[i - 2] * yp[j] * zp[k]
+        if j > 1: lap += j * (j - 1) * xp[i] * yp[j - 2] * zp[k]
+        if k > 1: lap += k * (k - 1) * xp[i] * yp[j] * zp[k - 2]
+        lmono[m] = lap
+    return nm
+
+
+@jit(nopython=True, nogil=True, parallel=nbpll)
+def _evaluate_shells_deriv(xs, ys, zs, sxyz, sl, sprm, scof, scnt, alphas, rs,
+                           coefs, sfnc, fout, fcnt, fang, fpre, angs, pows,
+                           nbf, gaussian, block, laplacian):
+    """Evaluate contracted basis functions and their gradients (and
+    laplacians) on a set of points in a single sweep. Arguments are those
+    of :func:`~exatomic.algorithms.numerical._evaluate_shells`.
+
+    With the angular part A (a homogeneous polynomial of degree L) and the
+    radial part R(r) of a basis function,
+
+    .. math::
+
+        \\nabla\\phi = R\\nabla A + A\\frac{R'}{r}\\mathbf{r}
+
+        \\nabla^{2}\\phi = R\\nabla^{2}A + A\\left(2L\\frac{R'}{r}
+                            + \\nabla^{2}R\\right)
+
+    since :math:`\\mathbf{r}\\cdot\\nabla A = LA`.
+
+    Returns:
+        vals (np.ndarray): values, x, y, z derivatives (and laplacians)
+            of the basis functions (4 or 5, nbf, npts)
+    """
+    npts = len(xs)
+    nshl = len(sl)
+    lmax = pows.shape[0] - 1
+    nmono = pows.shape[1]
+    mcnt = scnt.max() if nshl else 1
+    nout = 5 if laplacian else 4
+    vals = np.zeros((nout, nbf, npts), dtype=np.float64)
+    nblk = (npts + block - 1) // block
+    for b in prange(nblk):
+        rad = np.empty(mcnt, dtype=np.float64)
+        drad = np.empty(mcnt, dtype=np.float64)
+        lrad = np.empty(mcnt, dtype=np.float64)
+        mono = np.empty(nmono, dtype=np.float64)
+        dmono = np.empty((3, nmono), dtype=np.float64)
+        lmono = np.empty(nmono, dtype=np.float64)
+        xp = np.empty(lmax + 1, dtype=np.float64)
+        yp = np.empty(lmax + 1, dtype=np.float64)
+        zp = np.empty(lmax + 1, dtype=np.float64)
+        for p in range(b * block, min((b + 1) * block, npts)):
+            for s in range(nshl):
+                dx = xs[p] - sxyz[s, 0]
+                dy = ys[p] - sxyz[s, 1]
+                dz = zs[p] - sxyz[s, 2]
+                nm = _shell_point_deriv(dx, dy, dz, s, sl, sprm, scof, scnt,
+                                        alphas, rs, coefs, pows, gaussian,
+                                        rad, drad, lrad, mono, dmono, lmono,
+                                        xp, yp, zp)
+                for f in range(sfnc[s], sfnc[s + 1]):
+                    a, ax, ay, az, al = 0., 0., 0., 0., 0.
+                    for m in range(nm):
+                        w = angs[fang[f], m]
+                        if w == 0.: continue
+                        a += w * mono[m]
+                        ax += w * dmono[0, m]
+                        ay += w * dmono[1, m]
+                        az += w * dmono[2, m]
+                        al += w * lmono[m]
+                    c = fcnt[f]
+                    o = fout[f]
+                    pre = fpre[f]
+                    vals[0, o, p] = pre * a * rad[c]
+                    vals[1, o, p] = pre * (ax * rad[c] + a * dx * drad[c])
+                    vals[2, o, p] = pre * (ay * rad[c] + a * dy * drad[c])
+                    vals[3, o, p] = pre * (az * rad[c] + a * dz * drad[c])
+                    if laplacian:
+                        vals[4, o, p] = pre * (al * rad[c] + a * (
+                            2 * sl[s] * drad[c] + lrad[c]))
+    return vals
+
+
+@jit(nopython=True, nogil=True, cache=nbche)
+def _bucket_points(xs, ys, zs, edge):
+    """Sort points into cubic cells of (at least) a given edge length. The
+    edge is doubled until there are at most a few cells per point, so that
+    sparse grids or small edges do not allocate an enormous cell grid.
+
+    Returns:
+        order (np.ndarray): point indices sorted by cell
+        cellptr (np.ndarray): pointers into order for each cell (ncell + 1)
+        origin (np.ndarray): lower corner of the cell grid
+        dims (np.ndarray): number of cells along each axis
+        edge (float): edge length of the cells
+    """
+    npts = len(xs)
+    origin = np.zeros(3)
+    dims = np.ones(3, dtype=np.int64)
+    if npts == 0:
+        return (np.empty(0, dtype=np.int64), np.zeros(2, dtype=np.int64),
+                origin, dims, edge)
+    origin[0] = xs.min()
+    origin[1] = ys.min()
+    origin[2] = zs.min()
+    span = np.array([xs.max() - origin[0], ys.max() - origin[1],
+                     zs.max() - origin[2]])
+    maxcells = max(8 * npts, 64)
+    while ((span[0] // edge + 1) * (span[1] // edge + 1)
+           * (span[2] // edge + 1) > maxcells):
+        edge *= 2
+    for a in range(3):
+        dims[a] = int64(span[a] // edge) + 1
+    cells = np.empty(npts, dtype=np.int64)
+    for p in range(npts):
+        i = int64((xs[p] - origin[0]) // edge)
+        j = int64((ys[p] - origin[1]) // edge)
+        k = int64((zs[p] - origin[2]) // edge)
+        cells[p] = (i * dims[1] + j) * dims[2] + k
+    order = np.argsort(cells, kind='mergesort')
+    cellptr = np.zeros(dims[0] * dims[1] * dims[2] + 1, dtype=np.int64)
+    for p in range(npts):
+        cellptr[cells[p] + 1] += 1
+    return order, np.cumsum(cellptr), origin, dims, edge
+
+
+@jit(nopython=True, nogil=True, cache=nbche)
+def _shell_cell_points(xs, ys, zs, order, cellptr, origin, dims, edge,
+                       cx, cy, cz, cut, out, off, fill):
+    """Count (or store in out[off:] if fill) the points within a distance
+    cut of (cx, cy, cz), visiting only the cells overlapping that sphere."""
+    lo = np.empty(3, dtype=np.int64)
+    hi = np.empty(3, dtype=np.int64)
+    cen = (cx, cy, cz)
+    for a in range(3):
+        lo[a] = max(0, int64(np.floor((cen[a] - cut - origin[a]) / edge)))
+        hi[a] = min(dims[a] - 1, int64(np.floor((cen[a] + cut - origin[a]) / edge)))
+    cut2 = cut * cut
+    n = 0
+    for i in range(lo[0], hi[0] + 1):
+        for j in range(lo[1], hi[1] + 1):
+            for k in range(lo[2], hi[2] + 1):
+                c = (i * dims[1] + j) * dims[2] + k
+                for q in range(cellptr[c], cellptr[c + 1]):
+                    p = order[q]
+                    dx = xs[p] - cx
+                    dy = ys[p] - cy
+                    dz = zs[p] - cz
+                    if dx * dx + dy * dy + dz * dz <= cut2:
+                        if fill: out[off + n] = p
+                        n += 1
+    return n
+
+
+@jit(nopython=True, nogil=True, parallel=nbpll)
+def _screen_shell_points(xs, ys, zs, sxyz, cuts, edge):
+    """Points within the radial extent (cuts) of each shell instance.
+
+    Returns:
+        sptr (np.ndarray): pointers into spts for each shell instance (nshl + 1)
+        spts (np.ndarray): point indices, grouped by shell instance
+    """
+    nshl = len(cuts)
+    order, cellptr, origin, dims, edge = _bucket_points(xs, ys, zs, edge)
+    cnts = np.zeros(nshl + 1, dtype=np.int64)
+    dummy = np.empty(0, dtype=np.int64)
+    for s in prange(nshl):
+        cnts[s + 1] = _shell_cell_points(xs, ys, zs, order, cellptr, origin,
+                                         dims, edge, sxyz[s, 0], sxyz[s, 1],
+                                         sxyz[s, 2], cuts[s], dummy, 0, False)
+    sptr = np.cumsum(cnts)
+    spts = np.empty(sptr[-1], dtype=np.int64)
+    for s in prange(nshl):
+        _shell_cell_points(xs, ys, zs, order, cellptr, origin, dims, edge,
+                           sxyz[s, 0], sxyz[s, 1], sxyz[s, 2], cuts[s],
+                           spts, sptr[s], True)
+    return sptr, spts
+
+
+@jit(nopython=True, nogil=True, parallel=nbpll)
+def _evaluate_shells_sparse(xs, ys, zs, sxyz, sl, sprm, scof, scnt, alphas,
+                            rs, coefs, sfnc, fout, fcnt, fang, fpre, angs,
+                            pows, nbf, gaussian, sptr, spts, indptr):
+    """Evaluate contracted basis functions only at the points within the
+    extent of their shell instance (see
+    :func:`~exatomic.algorithms.numerical._screen_shell_points`). Other
+    arguments are as in :func:`~exatomic.algorithms.numerical._evaluate_shells`.
+
+    Args:
+        sptr (np.ndarray): pointers into spts for each shell instance
+        spts (np.ndarray): point indices grouped by shell instance
+        indptr (np.ndarray): CSR row pointers (nbf + 1)
+
+    Returns:
+        indices (np.ndarray): point index of each value (CSR column indices)
+        data (np.ndarray): basis function values (CSR data, rows per indptr)
+    """
+    nshl = len(sl)
+    lmax = pows.shape[0] - 1
+    nmono = pows.shape[1]
+    mcnt = scnt.max() if nshl else 1
+    nnz = indptr[-1]
+    data = np.empty(nnz, dtype=np.float64)
+    indices = np.empty(nnz, dtype=np.int64)
+    for s in prange(nshl):
+        rad = np.empty(mcnt, dtype=np.float64)
+        mono = np.empty(nmono, dtype=np.float64)
+        xp = np.empty(lmax + 1, dtype=np.float64)
+        yp = np.empty(lmax + 1, dtype=np.float64)
+        zp = np.empty(lmax + 1, dtype=np.float64)
+        for q in range(sptr[s], sptr[s + 1]):
+            p = spts[q]
+            nm = _shell_point(xs[p] - sxyz[s, 0], ys[p] - sxyz[s, 1],
+                              zs[p] - sxyz[s, 2], s, sl, sprm, scof, scnt,
+                              alphas, rs, coefs, pows, gaussian, rad, mono,
+                              xp, yp, zp)
+            for f in range(sfnc[s], sfnc[s + 1]):
+                ang = 0.
+                for m in range(nm):
+                    ang += angs[fang[f], m] * mono[m]
+                i = indptr[fout[f]] + q - sptr[s]
+                data[i] = fpre[f] * ang * rad[fcnt[f]]
+                indices[i] = p
+    return indices, data
+
+
 #####################
 # Basis set classes #
 #####################
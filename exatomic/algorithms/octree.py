@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2018, Exa Analytics Development Team
+# Distributed under the terms of the Apache License 2.0
+"""
+Adaptive Octree Grids
+#########################
+Scalar fields such as molecular orbitals and densities vary rapidly near
+nuclei and slowly (or not at all) in vacuum. An adaptive octree evaluates
+the field on coarse cells and only subdivides cells that are close to a
+nucleus or where the field deviates from its trilinear interpolant. All
+evaluated points lie on the lattice of the finest level so that corners
+shared between cells are only evaluated once. The octree is then
+resampled onto a uniform grid (trilinear interpolation within leaf cells).
+Only the number of field evaluations is reduced: fields attached to a
+universe (and cube files, widgets) always hold the full uniform grid.
+
+.. code-block:: python
+
+    tree = OctreeGrid.from_field_params(fps, func, atoms=xyz, maxlevel=3)
+    tree.npts                                 # Number of evaluated points
+    vals = tree.resample(*numerical_grid_from_field_params(fps))
+"""
+import numpy as np
+
+
+# Corner offsets of a cell (and child offsets of a refined cell)
+_offsets = np.array([[i, j, k] for i in (0, 1) for j in (0, 1) for k in (0, 1)],
+                    dtype=np.int64)
+
+
+class OctreeGrid(object):
+    """
+    Adaptively refined grid of cubic cells with field values at the cell
+    corners.
+
+    Args:
+        origin (np.ndarray): lower corner of the grid
+        spacing (np.ndarray): point spacing of the finest level along each axis
+        dims (np.ndarray): number of root (level 0) cells along each axis
+        maxlevel (int): number of refinements of the root cells
+    """
+    @property
+    def npts(self):
+        """Number of evaluated points."""
+        return len(self.keys)
+
+    @property
+    def nleaf(self):
+        """Number of leaf cells."""
+        return len(self.levels)
+
+    def points(self):
+        """Cartesian coordinates of the evaluated points."""
+        return self._coords(self.keys)
+
+    def _lattice(self, ijk):
+        """Unique keys of integer coordinates on the finest lattice."""
+        ny, nz = self._shape[1], self._shape[2]
+        return (ijk[..., 0] * ny + ijk[..., 1]) * nz + ijk[..., 2]
+
+    def _coords(self, keys):
+        ny, nz = self._shape[1], self._shape[2]
+        ijk = np.column_stack((keys // (ny * nz), (keys // nz) % ny, keys % nz))
+        xyz = self.origin + ijk * self.spacing
+        return xyz[:, 0], xyz[:, 1], xyz[:, 2]
+
+    def _values(self, keys, func):
+        """Field values at lattice keys, evaluating func only at new keys."""
+        shape = keys.shape
+        keys = keys.ravel()
+        new = np.unique(keys)
+        new = new[~np.isin(new, self.keys)]
+        if len(new):
+            vals = np.asarray(func(*self._coords(new)), dtype=np.float64)
+            vals = vals.reshape(-1, len(new))
+            allkeys = np.concatenate((self.keys, new))
+            order = np.argsort(allkeys)
+            self.keys = allkeys[order]
+            if self.values is None: self.values = vals
+            else: self.values = np.hstack((self.values, vals))[:, order]
+        idx = np.searchsorted(self.keys, keys)
+        return self.values[:, idx].reshape((-1, ) + shape)
+
+    def refine(self, func, atoms=None, tol=1e-3, nucfac=1.):
+        """
+        Build the octree from the root cells.
+
+        A cell is subdivided if the field at its center differs from the
+        mean of its corners by more than tol (for any field), or if a
+        nucleus lies within nucfac cell edges of its center.
+
+        Args:
+            func (callable): func(x, y, z) returns (nfield, npts) or (npts, ) values
+            atoms (np.ndarray): nuclear coordinates (natom, 3)
+            tol (float): absolute interpolation error threshold
+            nucfac (float): refinement distance around nuclei in cell edges
+        """
+        cells = np.indices(self.dims).reshape(3, -1).T.astype(np.int64)
+        levels, leaves = [], []
+        for L in range(self.maxlevel + 1):
+            s = 2 ** (self.maxlevel - L)
+            if not len(cells): break
+            corners = self._lattice((cells[:, np.newaxis] + _offsets) * s)
+            cvals = self._values(corners, func)
+            if L == self.maxlevel:
+                refine = np.zeros(len(cells), dtype=np.bool_)
+            else:
+                cens = (2 * cells + 1) * (s // 2)
+                err = np.abs(self._values(self._lattice(cens), func)
+                             - cvals.mean(axis=2)).max(axis=0)
+                refine = err > tol
+                if atoms is not None and len(atoms):
+                    xyz = self.origin + cens * self.spacing
+                    edge = (s * self.spacing).max()
+                    dist = np.sqrt(((xyz[:, np.newaxis] - atoms) ** 2).sum(axis=2))
+                    refine |= dist.min(axis=1) < nucfac * edge
+            levels.append(np.full((~refine).sum(), L, dtype=np.int64))
+            leaves.append(cells[~refine])
+            cells = (2 * cells[refine][:, np.newaxis] + _offsets).reshape(-1, 3)
+        self.levels = np.concatenate(levels)
+        self.cells = np.concatenate(leaves)
+        return self
+
+    def resample(self, xs, ys, zs):
+        """
+        Trilinear interpolation of the field(s) at arbitrary points from
+        the corners of the leaf cells containing them. Points outside of
+        the octree are clamped to its boundary cells.
+
+        Args:
+            xs (np.ndarray): 1D-array of x values
+            ys (np.ndarray): 1D-array of y values
+            zs (np.ndarray): 1D-array of z values
+
+        Returns:
+            vals (np.ndarray): interpolated values (nfield, npts)
+        """
+        u = (np.column_stack((xs, ys, zs)) - self.origin) / self.spacing
+        npts = len(u)
+        cell = np.zeros((npts, 3), dtype=np.int64)
+        size = np.zeros(npts, dtype=np.int64)
+        found = np.zeros(npts, dtype=np.bool_)
+        for L in range(self.maxlevel + 1):
+            s = 2 ** (self.maxlevel - L)
+            ncell = self.dims * 2 ** L
+            mine = self.cells[self.levels == L]
+            if not len(mine): continue
+            lkey = lambda c: (c[:, 0] * ncell[1] + c[:, 1]) * ncell[2] + c[:, 2]
+            leaf = np.sort(lkey(mine))
+            todo = np.where(~found)[0]
+            c = np.clip(np.floor(u[todo] / s).astype(np.int64), 0, ncell - 1)
+            k = lkey(c)
+            pos = np.minimum(np.searchsorted(leaf, k), len(leaf) - 1)
+            hit = leaf[pos] == k
+            cell[todo[hit]] = c[hit]
+            size[todo[hit]] = s
+            found[todo[hit]] = True
+        t = np.clip((u - cell * size[:, np.newaxis]) / size[:, np.newaxis], 0, 1)
+        corners = (cell * size[:, np.newaxis])[:, np.newaxis] \
+                  + _offsets * size[:, np.newaxis, np.newaxis]
+        cvals = self.values[:, np.searchsorted(self.keys, self._lattice(corners))]
+        w = np.ones((npts, 8))
+        for a in range(3):
+            w *= np.where(_offsets[:, a], t[:, a, np.newaxis], 1 - t[:, a, np.newaxis])
+        return (cvals * w).sum(axis=2)
+
+    @classmethod
+    def from_field_params(cls, fps, func, atoms=None, maxlevel=3, tol=1e-3,
+                          nucfac=1.):
+        """
+        Octree covering the uniform grid described by field parameters,
+        whose finest level has the same spacing as the uniform grid.
+
+        Args:
+            fps (pd.Series): See :func:`~exatomic.algorithms.orbital_util.make_fps`
+            func (callable): func(x, y, z) returns (nfield, npts) or (npts, ) values
+            atoms (np.ndarray): nuclear coordinates (natom, 3)
+            maxlevel (int): number of refinements of the root cells
+            tol (float): absolute interpolation error threshold
+            nucfac (float): refinement distance around nuclei in cell edges
+        """
+        if hasattr(fps, 'columns'): fps = fps.loc[0]
+        origin = np.array([fps.ox, fps.oy, fps.oz], dtype=np.float64)
+        spacing = np.array([fps.dxi, fps.dyj, fps.dzk], dtype=np.float64)
+        npts = np.array([fps.nx, fps.ny, fps.nz], dtype=np.int64)
+        dims = np.maximum(1, -(-(npts - 1) // 2 ** maxlevel))
+        tree = cls(origin, spacing, dims, maxlevel)
+        return tree.refine(func, atoms=atoms, tol=tol, nucfac=nucfac)
+
+    def __repr__(self):
+        return 'OctreeGrid(levels={},leaves={},points={})'.format(
+            self.maxlevel + 1, self.nleaf, self.npts)
+
+    def __init__(self, origin, spacing, dims, maxlevel=3):
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.spacing = np.asarray(spacing, dtype=np.float64)
+        self.dims = np.asarray(dims, dtype=np.int64)
+        self.maxlevel = maxlevel
+        self._shape = self.dims * 2 ** maxlevel + 1
+        self.keys = np.empty(0, dtype=np.int64)
+        self.values = None
+        self.levels = np.empty(0, dtype=np.int64)
+        self.cells = np.empty((0, 3), dtype=np.int64)
@@ -6,44 +6,116 @@ Numerical Orbital Functions
 #############################
 Building discrete molecular orbitals (for visualization) requires a complex
 set of operations that are provided by this module and wrapped into a clean API.
+Values at arbitrary points (lines, planes, atom centered samples) are
+available without building a field:
+
+.. code-block:: python
+
+    x, y, z, t = line_points(uni.atom.loc[0, ['x', 'y', 'z']],
+                             uni.atom.loc[1, ['x', 'y', 'z']])
+    ovs = orbital_values(uni, x, y, z, vector=[4, 5])    # (2, 101)
+    rho = density_values(uni, x, y, z)                  # (101, )
 """
 import numpy as np
+import pandas as pd
 from numba import TypingError
 from datetime import datetime
+from multiprocessing.pool import ThreadPool
 from exatomic.base import sym2z
 from .orbital_util import (
-    numerical_grid_from_field_params, _determine_fps,
+    numerical_grid_from_field_params, line_points, plane_points,
+    _determine_fps, _grid_key,
     _determine_vector, _compute_orb_ang_mom, _compute_current_density,
-    _compute_density, _check_column, _make_field,
-    _compute_orbitals_numba, _compute_orbitals_numpy)
+    _current_density_matrix,
+    _compute_density, _compute_density_matrices, _check_column, _make_field,
+    _compute_orbitals_numba, _compute_orbitals_numpy,
+    _compute_orbitals_sparse)
+from .basis import SparseBasisValues
+from .octree import OctreeGrid
 
 
-def _setup_orbital(uni, verbose, vector, fps, icoefs, jcoefs=None, irrep=None):
+def _setup_orbital(uni, verbose, vector, fps, icoefs, jcoefs=None, irrep=None,
+                   frame=0):
     """Boilerplate for starting the functions in this module."""
     t1 = datetime.now()
-    nbf = len(uni.basis_functions)
-    if irrep is not None:
-        nbf = len(uni.basis_set_order.groupby('irrep').get_group(irrep).index)
-    if verbose:
-        p1 = 'Evaluating {} basis functions once.'
-        print(p1.format(nbf))
     vector = _determine_vector(uni, vector, irrep)
     fps = _determine_fps(uni, fps, len(vector))
     x, y, z = numerical_grid_from_field_params(fps)
-    bvs = uni.basis_functions.evaluate(x, y, z, irrep=irrep, verbose=verbose)
     icoefs = _check_column(uni, 'current_momatrix', icoefs)
-    icoefs = uni.current_momatrix.square(column=icoefs, irrep=irrep).values
+    icoefs = uni.current_momatrix.square(frame=frame, column=icoefs,
+                                         irrep=irrep).values
     if jcoefs is not None:
         jcoefs = _check_column(uni, 'current_momatrix', jcoefs)
-        jcoefs = uni.current_momatrix.square(column=jcoefs).values
-        return t1, vector, fps, x, y, z, bvs, icoefs, jcoefs
-    return t1, vector, fps, x, y, z, bvs, icoefs
+        jcoefs = uni.current_momatrix.square(frame=frame, column=jcoefs).values
+        return t1, vector, fps, x, y, z, icoefs, jcoefs
+    return t1, vector, fps, x, y, z, icoefs
+
+def _determine_frames(frame):
+    """A frame or an iterable of frames as a list."""
+    return [int(f) for f in np.atleast_1d(frame)]
+
+def _map_frames(func, frames, workers=1):
+    """Apply func to every frame, in a pool of worker threads if requested
+    (the compiled kernels and BLAS calls release the GIL)."""
+    if workers is None or workers <= 1 or len(frames) == 1:
+        return [func(f) for f in frames]
+    pool = ThreadPool(min(workers, len(frames)))
+    try: return pool.map(func, frames)
+    finally: pool.close()
 
-def _compute_orbital(verbose, npts, bvs, vector, cmat):
-    try: ovs = _compute_orbitals_numba(npts, bvs, vector, cmat)
+def _frame_fps(fps, frames):
+    """Repeat field parameters for every frame."""
+    return pd.concat([fps.assign(frame=f) for f in frames], ignore_index=True)
+
+def _block_size(nbf, max_memory):
+    """Number of grid points per block such that the basis function values
+    for the block fit in max_memory (MB). Blocks only depend on the basis
+    size so that cached blocks are shared by all functions in this module."""
+    return max(1, int(max_memory * 1024 ** 2 // (8 * nbf)))
+
+def _iter_basis_blocks(bfns, x, y, z, nbf, max_memory,
+                       irrep=None, tol=None, verbose=False, key=None):
+    """Walk the grid in blocks of points, yielding the block slice and the
+    basis function values on that block. Only one block of basis function
+    values is alive at a time unless a grid key is provided, in which case
+    blocks go through the basis function cache (see
+    :class:`~exatomic.algorithms.basis.BasisFunctionCache`)."""
+    npts = len(x)
+    size = _block_size(nbf, max_memory)
+    if verbose:
+        nblk = (npts + size - 1) // size
+        p1 = 'Evaluating {} basis functions in {} block(s) of up to {} points.'
+        print(p1.format(nbf, nblk, min(size, npts)))
+    nnz = 0
+    for i in range(0, npts, size):
+        sl = slice(i, min(i + size, npts))
+        if key is None:
+            bvs = bfns.evaluate(x[sl], y[sl], z[sl], irrep=irrep, tol=tol)
+        else:
+            bvs = bfns.evaluate_cached((key, sl.start, sl.stop),
+                                       x[sl], y[sl], z[sl],
+                                       irrep=irrep, tol=tol)
+        if isinstance(bvs, SparseBasisValues): nnz += bvs.nnz
+        yield sl, bvs
+    if verbose and tol is not None:
+        p2 = 'Screened basis functions: {:.1%} of values kept.'
+        print(p2.format(nnz / max(nbf * npts, 1)))
+
+def _compute_orbital(verbose, npts, bvs, vector, cmat, dtype=np.float64):
+    # Cast both operands (only the selected coefficients) so that the
+    # product itself is computed in dtype
+    cvs = np.ascontiguousarray(cmat[:, np.asarray(vector, dtype=np.int64)],
+                               dtype=dtype)
+    vector = np.arange(cvs.shape[1], dtype=np.int64)
+    if isinstance(bvs, SparseBasisValues):
+        ovs = np.zeros((len(vector), npts), dtype=dtype)
+        return _compute_orbitals_sparse(npts, bvs.indptr, bvs.indices,
+                                        bvs.data, vector, cvs, ovs)
+    bvs = np.ascontiguousarray(bvs, dtype=dtype)
+    try: ovs = _compute_orbitals_numba(npts, bvs, vector, cvs)
     except (ValueError, IndexError, AssertionError, TypingError) as e:
         if verbose: print('numba eval failed, falling back to numpy')
-        ovs = _compute_orbitals_numpy(npts, bvs, vector, cmat)
+        ovs = _compute_orbitals_numpy(npts, bvs, vector, cvs)
     return ovs
 
 def _teardown_orbital(uni, verbose, field, t1, inplace, name='orbitals'):
@@ -59,7 +131,9 @@ def _teardown_orbital(uni, verbose, field, t1, inplace, name='orbitals'):
 
 def add_molecular_orbitals(uni, field_params=None, mocoefs=None,
                            vector=None, frame=0, inplace=True,
-                           replace=False, verbose=True, irrep=None):
+                           replace=False, verbose=True, irrep=None, tol=None,
+                           max_memory=2048, dtype=np.float64, octree=None,
+                           workers=1):
     """A universe must contain basis_set, [basis_set_order], and
     momatrix attributes to use this function.  Evaluate molecular
     orbitals on a numerical grid.  Attempts to generate reasonable
@@ -73,23 +147,113 @@ def add_molecular_orbitals(uni, field_params=None, mocoefs=None,
         field_params (dict): See :func:`~exatomic.algorithms.orbital_util.make_fps`
         mocoefs (str): column in uni.current_momatrix (default 'coef')
         vector (int, list, range, np.ndarray): the MO vectors to evaluate
+        frame (int, list, range, np.ndarray): frame(s) for which to compute
+            fields, using the atoms (and MO coefficients, if stored per
+            frame) of each frame on the same grid
         inplace (bool): if False, return the field obj instead of modifying uni
         replace (bool): if False, do not delete any previous fields
         irrep (int): if symmetrized, the irrep to which the orbitals belong
+        tol (float): if provided, screen out basis function values below tol
+        max_memory (float): memory budget (MB) for basis function values;
+            the grid is evaluated in blocks of points that fit the budget
+        dtype (type): np.float32 halves memory and speeds up the contraction
+            for visualization quality fields (default np.float64)
+        octree (bool, dict): evaluate on an adaptive octree (options passed to
+            :meth:`~exatomic.algorithms.octree.OctreeGrid.from_field_params`)
+            and resample onto the uniform grid; this reduces the number of
+            evaluated points, not the size of the resulting field
+        workers (int): number of threads over which frames are distributed
+
+    .. code-block:: python
+
+        # Frontier orbitals along a geometry optimization
+        uni.add_molecular_orbitals(vector=[homo, lumo], frame=range(nframe),
+                                   workers=4)
+
+    Note:
+        All frames share the shell data (and evaluation plans) of the
+        basis functions; only the atomic centers differ (see
+        :meth:`~exatomic.algorithms.basis.BasisFunctions.at_frame`).
 
     Warning:
         If replace is True, removes any fields previously attached to the universe
     """
     if replace and hasattr(uni, '_field'): del uni.__dict__['_field']
-    t1, vector, fps, x, y, z, bvs, mocoefs = \
-        _setup_orbital(uni, verbose, vector, field_params, mocoefs, irrep=irrep)
-    ovs = _compute_orbital(verbose, len(x), bvs, vector, mocoefs)
-    field = _make_field(ovs, fps)
+    frames = _determine_frames(frame)
+    mocol = _check_column(uni, 'current_momatrix', mocoefs)
+    t1, vector, fps, x, y, z, mocoefs = \
+        _setup_orbital(uni, verbose, vector, field_params, mocol, irrep=irrep,
+                       frame=frames[0])
+    key = _grid_key(fps)
+    # Per block progress would interleave between frames
+    fverbose = verbose and len(frames) == 1
+
+    def _frame_orbitals(f):
+        bfns = uni.basis_functions.at_frame(uni, f)
+        cmat = mocoefs if f == frames[0] else uni.current_momatrix.square(
+            frame=f, column=mocol, irrep=irrep).values
+        if octree is None:
+            return _orbital_values(bfns, x, y, z, vector, cmat, max_memory,
+                                   irrep=irrep, tol=tol, dtype=dtype,
+                                   verbose=fverbose, key=key)
+        func = lambda bx, by, bz: _orbital_values(
+            bfns, bx, by, bz, vector, cmat, max_memory, irrep=irrep, tol=tol)
+        return _octree_values(bfns, fps, func, octree, fverbose).astype(dtype)
+
+    ovs = np.concatenate(_map_frames(_frame_orbitals, frames, workers))
+    if verbose and len(frames) > 1:
+        print('Evaluated {} orbitals on {} frames.'.format(len(vector),
+                                                           len(frames)))
+    field = _make_field(ovs, _frame_fps(fps, frames))
     return _teardown_orbital(uni, verbose, field, t1, inplace)
 
 
+def _orbital_values(bfns, x, y, z, vector, cmat, max_memory, irrep=None,
+                    tol=None, dtype=np.float64, verbose=False, key=None):
+    """Molecular orbitals at the points (x, y, z), evaluated in blocks."""
+    ovs = np.empty((len(vector), len(x)), dtype=dtype)
+    for sl, bvs in _iter_basis_blocks(bfns, x, y, z, cmat.shape[0],
+                                      max_memory, irrep=irrep, tol=tol,
+                                      verbose=verbose, key=key):
+        ovs[:, sl] = _compute_orbital(verbose, bvs.shape[1], bvs, vector,
+                                      cmat, dtype=dtype)
+    return ovs
+
+
+def _density_values(bfns, x, y, z, vector, orbocc, cmat, max_memory,
+                    tol=None, verbose=False, key=None):
+    """Electron density at the points (x, y, z), evaluated in blocks."""
+    nbf = cmat.shape[0]
+    # Many (fractionally) occupied orbitals are cheaper as a density matrix
+    if len(vector) > nbf // 2:
+        cocc = cmat[:, vector]
+        dmat = np.dot(cocc * orbocc, cocc.T)[np.newaxis]
+        return _density_matrix_fields(bfns, x, y, z, dmat, max_memory,
+                                      tol=tol, verbose=verbose, key=key)[0]
+    dens = np.empty(len(x), dtype=np.float64)
+    for sl, bvs in _iter_basis_blocks(bfns, x, y, z, nbf, max_memory,
+                                      tol=tol, verbose=verbose, key=key):
+        ovs = _compute_orbital(verbose, bvs.shape[1], bvs, vector, cmat)
+        dens[sl] = _compute_density(ovs, orbocc)
+    return dens
+
+
+def _octree_values(bfns, fps, func, octree, verbose):
+    """Evaluate func on an adaptive octree covering the grid described by
+    fps (refined around the nuclei) and resample onto that uniform grid.
+    The tree is discarded; only the resampled values are returned."""
+    opts = {} if octree is True else dict(octree)
+    tree = OctreeGrid.from_field_params(fps, func, atoms=bfns._xyzs, **opts)
+    x, y, z = numerical_grid_from_field_params(fps)
+    if verbose:
+        p1 = 'Octree: {} points evaluated ({:.1%} of the uniform grid).'
+        print(p1.format(tree.npts, tree.npts / float(len(x))))
+    return tree.resample(x, y, z)
+
+
 def add_density(uni, field_params=None, mocoefs=None, orbocc=None,
-                inplace=True, frame=0, norm='Nd', verbose=True):
+                inplace=True, frame=0, norm='Nd', verbose=True, tol=None,
+                max_memory=2048, octree=None):
     """A universe must contain basis_set, [basis_set_order], and
     momatrix attributes to use this function.  Compute a density
     with C matrix mocoefs and occupation vector orbocc.
@@ -100,22 +264,202 @@ def add_density(uni, field_params=None, mocoefs=None, orbocc=None,
         mocoefs (str): column in uni.current_momatrix (default 'coef')
         orbocc (str): column in uni.orbital (default 'occupation')
         inplace (bool): if False, return the field obj instead of modifying uni
+        frame (int): frame of the atoms (and MO coefficients)
+        tol (float): if provided, screen out basis function values below tol
+        max_memory (float): memory budget (MB) for basis function values;
+            the grid is evaluated in blocks of points that fit the budget
+        octree (bool, dict): evaluate on an adaptive octree and resample
+            onto the uniform grid (see add_molecular_orbitals)
     """
     mocol = mocoefs
-    t1, vector, fps, x, y, z, bvs, mocoefs = \
-        _setup_orbital(uni, verbose, None, field_params, mocoefs)
+    t1, vector, fps, x, y, z, mocoefs = \
+        _setup_orbital(uni, verbose, None, field_params, mocoefs, frame=frame)
+    bfns = uni.basis_functions.at_frame(uni, frame)
     orbocc = mocol if orbocc is None and mocol != 'coef' else orbocc
     orbocc = _check_column(uni, 'orbital', orbocc)
     vector = uni.orbital[~np.isclose(uni.orbital[orbocc], 0)].index.values
     orbocc = uni.orbital.loc[vector][orbocc].values
-    ovs = _compute_orbital(verbose, len(x), bvs, vector, mocoefs)
-    field = _make_field(_compute_density(ovs, orbocc), fps.loc[0])
+    if octree is None:
+        dens = _density_values(bfns, x, y, z, vector, orbocc, mocoefs,
+                               max_memory, tol=tol, verbose=verbose,
+                               key=_grid_key(fps))
+    else:
+        func = lambda bx, by, bz: _density_values(
+            bfns, bx, by, bz, vector, orbocc, mocoefs, max_memory, tol=tol)
+        dens = _octree_values(bfns, fps, func, octree, verbose)[0]
+    field = _make_field(dens, fps.assign(frame=frame).loc[0])
     return _teardown_orbital(uni, verbose, field, t1, inplace, name='density')
 
 
+def _density_matrix_fields(bfns, x, y, z, dmats, max_memory, tol=None,
+                           dtol=1e-12, verbose=False, key=None):
+    """Contract blocks of basis function values with a stack of density
+    matrices (see :func:`~exatomic.algorithms.orbital_util._compute_density_matrices`)."""
+    dmats = np.ascontiguousarray(dmats, dtype=np.float64)
+    ndens, nbf = dmats.shape[:2]
+    dmax = np.abs(dmats).max(axis=0)
+    dens = np.empty((ndens, len(x)), dtype=np.float64)
+    for sl, bvs in _iter_basis_blocks(bfns, x, y, z, nbf, max_memory,
+                                      tol=tol, verbose=verbose, key=key):
+        if isinstance(bvs, SparseBasisValues): bvs = bvs.toarray()
+        dens[:, sl] = _compute_density_matrices(bvs, dmats, dmax, tol=dtol)
+    return dens
+
+
+def add_density_from_matrix(uni, dmats=None, columns=None, field_params=None,
+                            frame=0, inplace=True, verbose=True, tol=None,
+                            dtol=1e-12, max_memory=2048):
+    """A universe must contain basis_set, [basis_set_order] and (unless
+    dmats are provided) density attributes to use this function. Compute
+    densities directly from density matrices, evaluating the basis
+    functions only once for all of them.
+
+    .. code-block:: python
+
+        add_density_from_matrix(uni)                               # uni.density['coef']
+        add_density_from_matrix(uni, columns=['alpha', 'beta'])    # multiple densities
+        add_density_from_matrix(uni, dmats=np.array([da, db, da - db]))
+
+    Args:
+        uni (:class:`~exatomic.container.Universe`): a universe
+        dmats (np.ndarray): square density matrix or stack of density matrices
+        columns (str, list): column(s) in uni.density (default 'coef')
+        field_params (dict): See :func:`~exatomic.algorithms.orbital_util.make_fps`
+        frame (int): frame of the atoms and of the density matrices in uni.density
+        inplace (bool): if False, return the field obj instead of modifying uni
+        tol (float): if provided, screen out basis function values below tol
+        dtol (float): skip basis functions whose density contributions are below dtol
+        max_memory (float): memory budget (MB) for basis function values
+    """
+    t1 = datetime.now()
+    if dmats is None:
+        columns = ['coef'] if columns is None else columns
+        columns = [columns] if isinstance(columns, str) else columns
+        dmats = [uni.density.square(frame=frame, column=col).values
+                 for col in columns]
+    dmats = np.asarray(dmats, dtype=np.float64)
+    if dmats.ndim == 2: dmats = dmats[np.newaxis]
+    fps = _determine_fps(uni, field_params, len(dmats))
+    x, y, z = numerical_grid_from_field_params(fps)
+    bfns = uni.basis_functions.at_frame(uni, frame)
+    dens = _density_matrix_fields(bfns, x, y, z, dmats, max_memory,
+                                  tol=tol, dtol=dtol, verbose=verbose,
+                                  key=_grid_key(fps))
+    field = _make_field(dens, fps.assign(frame=frame))
+    return _teardown_orbital(uni, verbose, field, t1, inplace, name='density')
+
+
+def _point_set(xs, ys, zs):
+    """Coerce points to contiguous float arrays of equal length."""
+    xs, ys, zs = (np.ascontiguousarray(np.ravel(i), dtype=np.float64)
+                  for i in (xs, ys, zs))
+    if not len(xs) == len(ys) == len(zs):
+        raise ValueError("xs, ys and zs must have the same length.")
+    return xs, ys, zs
+
+
+def orbital_values(uni, xs, ys, zs, vector=None, mocoefs=None, irrep=None,
+                   tol=None, max_memory=2048, dtype=np.float64, frame=0):
+    """Evaluate molecular orbitals at arbitrary points.
+
+    Args:
+        uni (:class:`~exatomic.core.universe.Universe`): a universe
+        xs (np.ndarray): 1D-array of x values
+        ys (np.ndarray): 1D-array of y values
+        zs (np.ndarray): 1D-array of z values
+        vector (int, list, range, np.ndarray): the MO vectors to evaluate
+        mocoefs (str): column in uni.current_momatrix (default 'coef')
+        irrep (int): if symmetrized, the irrep to which the orbitals belong
+        tol (float): if provided, screen out basis function values below tol
+        max_memory (float): memory budget (MB) for basis function values
+        frame (int): frame of the atoms (and MO coefficients)
+
+    Returns:
+        ovs (np.ndarray): orbital values (nvector, npts)
+
+    Note:
+        See :func:`~exatomic.algorithms.orbital_util.line_points` and
+        :func:`~exatomic.algorithms.orbital_util.plane_points`.
+    """
+    xs, ys, zs = _point_set(xs, ys, zs)
+    vector = _determine_vector(uni, vector, irrep)
+    mocoefs = _check_column(uni, 'current_momatrix', mocoefs)
+    cmat = uni.current_momatrix.square(frame=frame, column=mocoefs,
+                                       irrep=irrep).values
+    bfns = uni.basis_functions.at_frame(uni, frame)
+    return _orbital_values(bfns, xs, ys, zs, vector, cmat, max_memory,
+                           irrep=irrep, tol=tol, dtype=dtype)
+
+
+def density_values(uni, xs, ys, zs, mocoefs=None, orbocc=None, tol=None,
+                   max_memory=2048, frame=0):
+    """Evaluate the electron density at arbitrary points.
+
+    Args:
+        uni (:class:`~exatomic.core.universe.Universe`): a universe
+        xs (np.ndarray): 1D-array of x values
+        ys (np.ndarray): 1D-array of y values
+        zs (np.ndarray): 1D-array of z values
+        mocoefs (str): column in uni.current_momatrix (default 'coef')
+        orbocc (str): column in uni.orbital (default 'occupation')
+        tol (float): if provided, screen out basis function values below tol
+        max_memory (float): memory budget (MB) for basis function values
+        frame (int): frame of the atoms (and MO coefficients)
+
+    Returns:
+        dens (np.ndarray): density values (npts, )
+    """
+    xs, ys, zs = _point_set(xs, ys, zs)
+    mocol = mocoefs
+    mocoefs = _check_column(uni, 'current_momatrix', mocoefs)
+    cmat = uni.current_momatrix.square(frame=frame, column=mocoefs).values
+    orbocc = mocol if orbocc is None and mocol != 'coef' else orbocc
+    orbocc = _check_column(uni, 'orbital', orbocc)
+    vector = uni.orbital[~np.isclose(uni.orbital[orbocc], 0)].index.values
+    orbocc = uni.orbital.loc[vector][orbocc].values
+    bfns = uni.basis_functions.at_frame(uni, frame)
+    return _density_values(bfns, xs, ys, zs, vector, orbocc, cmat, max_memory,
+                           tol=tol)
+
+
+def orbital_gradients(uni, xs, ys, zs, vector=None, mocoefs=None,
+                      max_memory=2048, frame=0):
+    """Evaluate the gradients of molecular orbitals at arbitrary points.
+
+    Args:
+        uni (:class:`~exatomic.core.universe.Universe`): a universe
+        xs (np.ndarray): 1D-array of x values
+        ys (np.ndarray): 1D-array of y values
+        zs (np.ndarray): 1D-array of z values
+        vector (int, list, range, np.ndarray): the MO vectors to evaluate
+        mocoefs (str): column in uni.current_momatrix (default 'coef')
+        max_memory (float): memory budget (MB) for basis function values
+            and gradients
+        frame (int): frame of the atoms (and MO coefficients)
+
+    Returns:
+        grads (np.ndarray): orbital gradients (3, nvector, npts)
+    """
+    xs, ys, zs = _point_set(xs, ys, zs)
+    vector = _determine_vector(uni, vector)
+    mocoefs = _check_column(uni, 'current_momatrix', mocoefs)
+    cmat = uni.current_momatrix.square(frame=frame, column=mocoefs).values
+    bfns = uni.basis_functions.at_frame(uni, frame)
+    npts = len(xs)
+    size = _block_size(4 * cmat.shape[0], max_memory)
+    grads = np.empty((3, len(vector), npts), dtype=np.float64)
+    for i in range(0, npts, size):
+        sl = slice(i, min(i + size, npts))
+        dvs = bfns.evaluate_derivatives(xs[sl], ys[sl], zs[sl])
+        for j in range(3):
+            grads[j, :, sl] = _compute_orbital(False, dvs.shape[2], dvs[j + 1],
+                                               vector, cmat)
+    return grads
+
+
 def add_orb_ang_mom(uni, field_params=None, rcoefs=None, icoefs=None,
                     frame=0, orbocc=None, maxes=None, inplace=True,
-                    norm='Nd', verbose=True):
+                    norm='Nd', verbose=True, max_memory=2048):
     """A universe must contain basis_set, [basis_set_order], and
     momatrix attributes to use this function.  Compute the orbital
     angular momentum.  Requires C matrices from SODIZLDENS.X.X.R,I
@@ -129,31 +473,39 @@ def add_orb_ang_mom(uni, field_params=None, rcoefs=None, icoefs=None,
         maxes (np.ndarray): 3x3 array of magnetic axes (default np.eye(3))
         orbocc (str): column in uni.orbital (default 'lreal')
         inplace (bool): if False, return the field obj instead of modifying uni
+        max_memory (float): memory budget (MB) for a block of basis function
+            values and gradients (evaluated together)
     """
     if rcoefs is None or icoefs is None:
         raise Exception("Must specify rcoefs and icoefs")
     rcol = rcoefs
-    t1, vector, fps, x, y, z, bvs, rcoefs, icoefs = \
-        _setup_orbital(uni, verbose, None, field_params, rcoefs, jcoefs=icoefs)
+    t1, vector, fps, x, y, z, rcoefs, icoefs = \
+        _setup_orbital(uni, verbose, None, field_params, rcoefs, jcoefs=icoefs,
+                       frame=frame)
+    bfns = uni.basis_functions.at_frame(uni, frame)
     orbocc = rcol if orbocc is None else orbocc
     if maxes is None:
         maxes = np.eye(3)
         if verbose:
             print("If magnetic axes are not an identity matrix, specify maxes.")
     occvec = uni.orbital[orbocc].values
-    grx = uni.basis_functions.evaluate_diff(x, y, z, cart='x', verbose=verbose)
-    gry = uni.basis_functions.evaluate_diff(x, y, z, cart='y', verbose=verbose)
-    grz = uni.basis_functions.evaluate_diff(x, y, z, cart='z', verbose=verbose)
-    t2 = datetime.now()
+    kmat = _current_density_matrix(rcoefs, icoefs, occvec)
+    nbf = kmat.shape[0]
+    curx, cury, curz = (np.empty(len(x), dtype=np.float64) for _ in range(3))
+    key = _grid_key(fps)
+    npts = len(x)
+    # values, three gradients and one K * gradient product per block
+    size = _block_size(5 * nbf, max_memory)
+    for i in range(0, npts, size):
+        sl = slice(i, min(i + size, npts))
+        bvs, grx, gry, grz = bfns.evaluate_cached(
+            (key, sl.start, sl.stop), x[sl], y[sl], z[sl], cart='grad')
+        curx[sl], cury[sl], curz[sl] = _compute_current_density(
+            bvs, grx, gry, grz, kmat)
     if verbose:
-        p1 = 'Timing: grid evaluation  - {:>8.2f}s.'
+        t2 = datetime.now()
+        p1 = 'Timing: current density  - {:>8.2f}s.'
         print(p1.format((t2-t1).total_seconds()))
-    curx, cury, curz = _compute_current_density(
-        bvs, grx, gry, grz, rcoefs, icoefs, occvec, verbose=verbose)
-    t3 = datetime.now()
-    if verbose:
-        p2 = 'Timing: current density  - {:>8.2f}s.'
-        print(p2.format((t3-t2).total_seconds()))
     field = _make_field(_compute_orb_ang_mom(
         x, y, z, curx, cury, curz, maxes), fps)
     return _teardown_orbital(uni, verbose, field, t1, inplace, name='angmom')
@@ -12,10 +12,7 @@ from __future__ import division
 import six
 import numpy as np
 import pandas as pd
-from numba import jit
-from numexpr import evaluate
-from IPython.display import display
-from ipywidgets import FloatProgress
+from numba import jit, prange
 from exatomic.core.field import AtomicField
 from exatomic.base import nbpll
 
@@ -73,6 +70,60 @@ def numerical_grid_from_field_params(fps):
     return _meshgrid3d(x, y, z)
 
 
+def line_points(start, end, npts=101):
+    """Evenly spaced points on the segment from start to end.
+
+    Args:
+        start (array-like): (x, y, z) of the first point
+        end (array-like): (x, y, z) of the last point
+        npts (int): number of points
+
+    Returns:
+        grid (tup): (xs, ys, zs, ts) 1D-arrays, ts being the distance from start
+    """
+    start = np.asarray(start, dtype=np.float64)
+    end = np.asarray(end, dtype=np.float64)
+    frac = np.linspace(0, 1, npts)
+    xyz = start + frac[:, np.newaxis] * (end - start)
+    ts = frac * np.linalg.norm(end - start)
+    return xyz[:, 0].copy(), xyz[:, 1].copy(), xyz[:, 2].copy(), ts
+
+
+def plane_points(origin, u, v, nu=101, nv=101):
+    """Points of the parallelogram spanned by the vectors u and v.
+
+    .. code-block:: python
+
+        x, y, z = plane_points((-5, -5, 0), (10, 0, 0), (0, 10, 0))
+        vals = orbital_values(uni, x, y, z, vector=5).reshape(101, 101)
+
+    Args:
+        origin (array-like): (x, y, z) of the corner of the plane
+        u (array-like): first edge vector (slowest varying)
+        v (array-like): second edge vector
+        nu (int): number of points along u
+        nv (int): number of points along v
+
+    Returns:
+        grid (tup): (xs, ys, zs) 1D-arrays of nu * nv points
+    """
+    origin = np.asarray(origin, dtype=np.float64)
+    u = np.asarray(u, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    fu, fv = np.meshgrid(np.linspace(0, 1, nu), np.linspace(0, 1, nv),
+                         indexing='ij')
+    xyz = origin + fu.reshape(-1, 1) * u + fv.reshape(-1, 1) * v
+    return xyz[:, 0].copy(), xyz[:, 1].copy(), xyz[:, 2].copy()
+
+
+def _grid_key(fps):
+    """Hashable identifier of the numerical grid described by field parameters."""
+    if isinstance(fps, pd.DataFrame):
+        fps = fps.loc[0]
+    return tuple(float(fps[col]) for col in ('ox', 'nx', 'dxi', 'oy', 'ny',
+                                             'dyj', 'oz', 'nz', 'dzk'))
+
+
 def make_fps(rmin=None, rmax=None, nr=None, nrfps=1,
              xmin=None, xmax=None, nx=None, frame=0,
              ymin=None, ymax=None, ny=None, field_type=0,
@@ -168,40 +219,42 @@ def _make_field(flds, fps):
             field_values=[flds])
 
 
-def _compute_current_density(bvs, gvx, gvy, gvz, cmatr, cmati, occvec, verbose=True):
-    """Compute the current density in each cartesian direction."""
-    nbas, npts = bvs.shape
-    curx = np.zeros(npts, dtype=np.float64)
-    cury = np.zeros(npts, dtype=np.float64)
-    curz = np.zeros(npts, dtype=np.float64)
-    cval = np.zeros(nbas, dtype=np.float64)
-    if verbose:
-        fp = FloatProgress(description='Computing:')
-        display(fp)
-    for mu in range(nbas):
-        if verbose:
-            fp.value = mu / nbas * 100
-        crmu = cmatr[mu]
-        cimu = cmati[mu]
-        bvmu = bvs[mu]
-        gvxmu = gvx[mu]
-        gvymu = gvy[mu]
-        gvzmu = gvz[mu]
-        for nu in range(nbas):
-            crnu = cmatr[nu]
-            cinu = cmati[nu]
-            bvnu = bvs[nu]
-            gvxnu = gvx[nu]
-            gvynu = gvy[nu]
-            gvznu = gvz[nu]
-            cval = evaluate('-0.5 * (occvec * (crmu * cinu - cimu * crnu))', out=cval)
-            csum = cval.sum()
-            evaluate('curx + csum * (bvmu * gvxnu - gvxmu * bvnu)', out=curx)
-            evaluate('cury + csum * (bvmu * gvynu - gvymu * bvnu)', out=cury)
-            evaluate('curz + csum * (bvmu * gvznu - gvzmu * bvnu)', out=curz)
-    if verbose:
-        fp.close()
-    return curx, cury, curz
+def _current_density_matrix(cmatr, cmati, occvec):
+    """Antisymmetric coefficient product matrix of the current density.
+
+    .. math::
+
+        K_{\\mu\\nu} = -\\frac{1}{2}\\sum_{i}n_{i}\\left(C^{R}_{\\mu i}C^{I}_{\\nu i}
+                                                - C^{I}_{\\mu i}C^{R}_{\\nu i}\\right)
+    """
+    crn = cmatr * occvec
+    cin = cmati * occvec
+    return -0.5 * (np.dot(crn, cmati.T) - np.dot(cin, cmatr.T))
+
+
+def _compute_current_density(bvs, gvx, gvy, gvz, kmat):
+    """Compute the current density in each cartesian direction.
+
+    As K is antisymmetric, the sum over basis function pairs
+    K_mu,nu * (phi_mu * dphi_nu - dphi_mu * phi_nu) reduces to
+    2 * phi^T K dphi, so each direction is one matrix product followed
+    by a column-wise dot product. Only one (nbf, npts) temporary is
+    alive at a time.
+
+    Args:
+        bvs (np.ndarray): basis function values (nbf, npts)
+        gvx (np.ndarray): basis function x-derivatives (nbf, npts)
+        gvy (np.ndarray): basis function y-derivatives (nbf, npts)
+        gvz (np.ndarray): basis function z-derivatives (nbf, npts)
+        kmat (np.ndarray): see :func:`~exatomic.algorithms.orbital_util._current_density_matrix`
+
+    Returns:
+        curx, cury, curz (np.ndarray): current density components
+    """
+    curs = []
+    for gv in (gvx, gvy, gvz):
+        curs.append(2 * np.einsum('ij,ij->j', bvs, np.dot(kmat, gv)))
+    return curs[0], curs[1], curs[2]
 
 
 def _determine_vector(uni, vector, irrep=None):
@@ -290,20 +343,35 @@ def _check_column(uni, df, key):
     return key
 
 
-@jit(nopython=True, nogil=True, parallel=nbpll)
+@jit(nopython=True, nogil=True)
 def _compute_orbitals_numba(npts, bvs, vecs, cmat):
-    """Compute orbitals from numerical basis functions."""
-    ovs = np.empty((len(vecs), npts), dtype=np.float64)
+    """Compute orbitals from numerical basis functions as a single
+    (norb, nbf) x (nbf, npts) matrix product."""
+    cvs = np.empty((len(vecs), cmat.shape[0]), dtype=bvs.dtype)
     for i, vec in enumerate(vecs):
-        ovs[i] = np.dot(cmat[:, vec], bvs)
+        cvs[i] = cmat[:, vec]
+    return np.dot(cvs, bvs)
+
+@jit(nopython=True, nogil=True, parallel=nbpll)
+def _compute_orbitals_sparse(npts, indptr, indices, data, vecs, cmat, ovs):
+    """Compute orbitals from screened (CSR) numerical basis functions,
+    accumulating into the zeroed array ovs (whose dtype is that of the
+    result)."""
+    nbf = len(indptr) - 1
+    for i in prange(len(vecs)):
+        vec = vecs[i]
+        for mu in range(nbf):
+            c = cmat[mu, vec]
+            if c == 0.: continue
+            for k in range(indptr[mu], indptr[mu + 1]):
+                ovs[i, indices[k]] += c * data[k]
     return ovs
 
 def _compute_orbitals_numpy(npts, bvs, vecs, cmat):
-    """Compute orbitals from numerical basis functions."""
-    ovs = np.empty((len(vecs), npts), dtype=np.float64)
-    for i, vec in enumerate(vecs):
-        ovs[i] = np.dot(cmat[:, vec], bvs)
-    return ovs
+    """Compute orbitals from numerical basis functions as a single
+    (norb, nbf) x (nbf, npts) matrix product."""
+    cvs = np.ascontiguousarray(cmat[:, vecs].T, dtype=bvs.dtype)
+    return np.dot(cvs, bvs)
 
 @jit(nopython=True, nogil=True, parallel=nbpll)
 def _compute_density(ovs, occvec):
@@ -316,6 +384,40 @@ def _compute_density(ovs, occvec):
     return dens
 
 
+def _compute_density_matrices(bvs, dmats, dmax, tol=1e-12):
+    """Densities from one block of numerical basis functions and a stack of
+    (symmetric) density matrices.
+
+    .. math::
+
+        \\rho_{k}\\left(r\\right) = \\sum_{\\mu\\nu}D^{k}_{\\mu\\nu}
+            \\phi_{\\mu}\\left(r\\right)\\phi_{\\nu}\\left(r\\right)
+
+    Basis functions are dropped from the block if their largest possible
+    contribution, max|phi_mu| * sum_nu dmax_mu,nu * max|phi_nu|, is below
+    tol. The remaining density matrices are contracted with the block in a
+    single matrix product.
+
+    Args:
+        bvs (np.ndarray): basis function values for the block (nbf, npts)
+        dmats (np.ndarray): density matrices (ndens, nbf, nbf)
+        dmax (np.ndarray): largest absolute element over the density matrices (nbf, nbf)
+        tol (float): screening threshold
+
+    Returns:
+        dens (np.ndarray): densities (ndens, npts)
+    """
+    ndens, npts = dmats.shape[0], bvs.shape[1]
+    bmax = np.abs(bvs).max(axis=1)
+    keep = np.where(bmax * np.dot(dmax, bmax) > tol)[0]
+    if not len(keep): return np.zeros((ndens, npts), dtype=np.float64)
+    bvs = bvs[keep]
+    nkeep = len(keep)
+    dmat = dmats[:, keep][:, :, keep].reshape(ndens * nkeep, nkeep)
+    dbvs = np.dot(dmat, bvs).reshape(ndens, nkeep, npts)
+    return (dbvs * bvs).sum(axis=1)
+
+
 @jit(nopython=True, nogil=True, parallel=nbpll)
 def _compute_orb_ang_mom(rx, ry, rz, jx, jy, jz, mxs):
     """Compute the orbital angular momentum in each direction and the sum."""
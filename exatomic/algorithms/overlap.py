@@ -7,11 +7,13 @@ Overlap computation
 Utilities for computing the overlap between gaussian type functions.
 """
 
+from collections import OrderedDict
 import numpy as np
 from numba import jit, prange
-from .numerical import fac, fac2, dfac21, sdist, choose
+from .numerical import (fac, fac2, dfac21, sdist, choose, _enum_cartesian,
+                        _square)
 from .car2sph import car2sph_scaled
-from exatomic.base import nbche
+from exatomic.base import nbche, nbpll
 
 #################################
 # Primitive cartesian integrals #
@@ -185,26 +187,378 @@ def _cartesian_shell_pairs(ndim, ptrs, xyzs, *shls):
         jj += jblk
     return cart
 
+###########################################
+# Parallel screened shell-pair assembly   #
+###########################################
+
+def _unique_shell_arrays(shls):
+    """Struct of arrays description of the unique shells of a basis set
+    (see :meth:`~exatomic.core.basis.BasisSet.shell_arrays`).
+
+    Returns:
+        sl (np.ndarray): angular momenta
+        sprm (np.ndarray): pointers into alphas (nshl + 1)
+        alphas (np.ndarray): primitive exponents
+        scof (np.ndarray): pointers into coefs (nshl + 1)
+        coefs (np.ndarray): normalized (nprim, ncont) coefficients, flattened
+        scnt (np.ndarray): number of contracted functions
+        sphr (np.ndarray): spherical (True) or cartesian shell
+    """
+    coefs = [shl.norm_contract().ravel() for shl in shls]
+    return (np.array([shl.L for shl in shls], dtype=np.int64),
+            np.cumsum([0] + [shl.nprim for shl in shls]).astype(np.int64),
+            np.concatenate([shl.alphas for shl in shls] + [np.empty(0)]),
+            np.cumsum([0] + [len(c) for c in coefs]).astype(np.int64),
+            np.concatenate(coefs + [np.empty(0)]).astype(np.float64),
+            np.array([shl.ncont for shl in shls], dtype=np.int64),
+            np.array([shl.spherical for shl in shls], dtype=np.bool_))
+
+
+def _gather_ragged(ptr, vals, idx):
+    """Pointers and values of the ragged rows idx of (ptr, vals)."""
+    cnt = ptr[idx + 1] - ptr[idx]
+    nptr = np.cumsum(np.append(0, cnt)).astype(np.int64)
+    pos = np.repeat(ptr[idx] - nptr[:-1], cnt) + np.arange(nptr[-1])
+    return nptr, vals[pos]
+
+
+def _shell_arrays(ptrs, xyzs, shls, soa=None):
+    """Struct of arrays description of shell instances (a shell placed on
+    a center) in the order of ptrs, as consumed by
+    :func:`~exatomic.algorithms.overlap._overlap_shell_pairs`. The
+    unique shell arrays are gathered by pointer, so passing a cached
+    soa (see :func:`~exatomic.algorithms.overlap._unique_shell_arrays`)
+    skips the per shell normalization entirely.
+
+    Returns:
+        sxyz (np.ndarray): shell instance centers (nshl, 3)
+        sl (np.ndarray): angular momenta
+        sprm (np.ndarray): pointers into alphas (nshl + 1)
+        alphas (np.ndarray): primitive exponents
+        scof (np.ndarray): pointers into coefs (nshl + 1)
+        coefs (np.ndarray): normalized (nprim, ncont) coefficients, flattened
+        scnt (np.ndarray): number of contracted functions
+        sphr (np.ndarray): spherical (True) or cartesian shell
+        soff (np.ndarray): first basis function of each shell instance (nshl + 1)
+        pows (np.ndarray): cartesian powers (lmax + 1, ncart, 3)
+        c2s (np.ndarray): cartesian to spherical transforms (lmax + 1, ncart, nsphr)
+    """
+    ptrs = np.asarray(ptrs, dtype=np.int64)
+    if soa is None: soa = _unique_shell_arrays(shls)
+    usl, usprm, ualphas, uscof, ucoefs, uscnt, usphr = soa
+    idx = ptrs[:, 1]
+    sl, scnt, sphr = usl[idx], uscnt[idx], usphr[idx]
+    sprm, alphas = _gather_ragged(usprm, ualphas, idx)
+    scof, coefs = _gather_ragged(uscof, ucoefs, idx)
+    lmax = sl.max() if len(sl) else 0
+    ncart = (lmax + 1) * (lmax + 2) // 2
+    pows = np.zeros((lmax + 1, ncart, 3), dtype=np.int64)
+    c2s = np.zeros((lmax + 1, ncart, 2 * lmax + 1))
+    for L in range(lmax + 1):
+        cart = np.array(list(_enum_cartesian(L)), dtype=np.int64)
+        pows[L, :len(cart)] = cart
+        c2s[L, :len(cart), :2 * L + 1] = car2sph_scaled(L)
+    nfunc = np.where(sphr, 2 * sl + 1, (sl + 1) * (sl + 2) // 2) * scnt
+    return (xyzs[ptrs[:, 0]].astype(np.float64), sl, sprm, alphas, scof,
+            coefs, scnt, sphr, np.cumsum(np.append(0, nfunc)).astype(np.int64),
+            pows, c2s)
+
+
+def _screen_shell_pairs(sxyz, sprm, alphas, tol):
+    """Lower triangle shell instance pairs (i >= j) whose largest gaussian
+    product prefactor, exp(-mu R ** 2) of the most diffuse primitives,
+    is at least tol."""
+    nshl = len(sxyz)
+    i, j = np.tril_indices(nshl)
+    amin = np.array([alphas[sprm[s]:sprm[s + 1]].min() for s in range(nshl)])
+    mu = amin[i] * amin[j] / (amin[i] + amin[j])
+    r2 = ((sxyz[i] - sxyz[j]) ** 2).sum(axis=1)
+    keep = np.exp(-mu * r2) >= tol
+    return np.ascontiguousarray(np.column_stack((i[keep], j[keep])),
+                                dtype=np.int64)
+
+
+# Operators computed by _shell_pair_integrals, in order
+_operators = ['overlap', 'kinetic', 'dipole_x', 'dipole_y', 'dipole_z',
+              'quadrupole_xx', 'quadrupole_xy', 'quadrupole_xz',
+              'quadrupole_yy', 'quadrupole_yz', 'quadrupole_zz']
+
+
+def _operator_names(kinetic, order):
+    """Names of the operators computed for given options (see _operators)."""
+    names = ['overlap'] + (['kinetic'] if kinetic else [])
+    if order > 0: names += _operators[2:5]
+    if order > 1: names += _operators[5:]
+    return names
+
+
+@jit(nopython=True, nogil=True, cache=nbche)
+def _spherical_block(cblk, la, ca, lb, cb, sa, sb, c2s):
+    """Transform the rows (columns) of a cartesian block of contracted
+    functions (angular component major, contraction minor) to spherical
+    functions if sa (sb)."""
+    na = (la + 1) * (la + 2) // 2
+    nb = (lb + 1) * (lb + 2) // 2
+    if sa and la:
+        nsa = 2 * la + 1
+        tmp = np.zeros((nsa * ca, cblk.shape[1]))
+        for s in range(nsa):
+            for i in range(na):
+                t = c2s[la, i, s]
+                if t == 0.: continue
+                for u in range(ca):
+                    tmp[s * ca + u] += t * cblk[i * ca + u]
+        cblk = tmp
+    if sb and lb:
+        nsb = 2 * lb + 1
+        tmp = np.zeros((cblk.shape[0], nsb * cb))
+        for s in range(nsb):
+            for j in range(nb):
+                t = c2s[lb, j, s]
+                if t == 0.: continue
+                for v in range(cb):
+                    tmp[:, s * cb + v] += t * cblk[:, j * cb + v]
+        cblk = tmp
+    return cblk
+
+
+@jit(nopython=True, nogil=True, parallel=nbpll)
+def _shell_pair_integrals(pairs, sxyz, sl, sprm, alphas, scof, coefs, scnt,
+                          sphr, soff, pows, c2s, origin, kinetic, order):
+    """Compute contracted one-electron integral blocks of shell instance
+    pairs in parallel. For every primitive pair the gaussian product and
+    the one dimensional overlaps are computed once and shared by all
+    operators; kinetic energy and multipole integrals are linear
+    combinations of them,
+
+    .. math::
+
+        T_{ij} = -\\frac{1}{2}\\left[j(j - 1)S_{i,j-2} - 2b(2j + 1)S_{ij}
+                 + 4b^{2}S_{i,j+2}\\right]
+
+        M^{1}_{ij} = S_{i,j+1} + X_{BC}S_{ij}\\qquad
+        M^{2}_{ij} = S_{i,j+2} + 2X_{BC}S_{i,j+1} + X_{BC}^{2}S_{ij}
+
+    Blocks of distinct pairs never overlap in the output, so each task
+    writes its blocks directly into the packed lower triangles.
+
+    Args:
+        pairs (np.ndarray): shell instance pairs (npair, 2) with i >= j
+        origin (np.ndarray): origin of the multipole operators
+        kinetic (bool): compute kinetic energy integrals
+        order (int): highest multipole (0: none, 1: dipole, 2: quadrupole)
+
+    Returns:
+        ints (np.ndarray): packed integrals (noperator, ndim * (ndim + 1) // 2)
+            in the order of :data:`~exatomic.algorithms.overlap._operators`
+
+    Note:
+        Other arguments are those returned by
+        :func:`~exatomic.algorithms.overlap._shell_arrays`. Within a shell,
+        functions are ordered by angular component then contraction, as
+        in :func:`~exatomic.algorithms.overlap._cartesian_shell_pair`.
+        Quadrupoles are cartesian second moments (not traceless).
+    """
+    ndim = soff[-1]
+    kin = 1 if kinetic else 0
+    nop = 1 + kin + (3 if order > 0 else 0) + (6 if order > 1 else 0)
+    jext = 2 if kinetic or order > 1 else order
+    ints = np.zeros((nop, ndim * (ndim + 1) // 2))
+    lmax = pows.shape[0] - 1
+    for q in prange(len(pairs)):
+        a, b = pairs[q, 0], pairs[q, 1]
+        la, lb = sl[a], sl[b]
+        ca, cb = scnt[a], scnt[b]
+        na = (la + 1) * (la + 2) // 2
+        nb = (lb + 1) * (lb + 2) // 2
+        cblk = np.zeros((nop, na * ca, nb * cb))
+        s1 = np.empty((3, lmax + 1, lmax + 3))
+        t1 = np.empty((3, lmax + 1, lmax + 1))
+        m1 = np.empty((3, lmax + 1, lmax + 1))
+        m2 = np.empty((3, lmax + 1, lmax + 1))
+        ops = np.empty(nop)
+        bc = sxyz[b] - origin
+        for k in range(sprm[a], sprm[a + 1]):
+            for m in range(sprm[b], sprm[b + 1]):
+                bexp = alphas[m]
+                (N, p, mu, ab2, pax, pay, paz,
+                 pbx, pby, pbz) = _gaussian_product(
+                    alphas[k], bexp, sxyz[a, 0], sxyz[a, 1], sxyz[a, 2],
+                    sxyz[b, 0], sxyz[b, 1], sxyz[b, 2])
+                pre = np.exp(-mu * ab2)
+                _obara_saika(s1[0], la, lb + jext, pax, pbx, p, N)
+                _obara_saika(s1[1], la, lb + jext, pay, pby, p, N)
+                _obara_saika(s1[2], la, lb + jext, paz, pbz, p, N)
+                for i in range(la + 1):
+                    for d in range(3):
+                        for j in range(lb + 1):
+                            if kinetic:
+                                t = 4 * bexp * bexp * s1[d, i, j + 2] \
+                                    - 2 * bexp * (2 * j + 1) * s1[d, i, j]
+                                if j > 1: t += j * (j - 1) * s1[d, i, j - 2]
+                                t1[d, i, j] = -0.5 * t
+                            if order > 0:
+                                m1[d, i, j] = s1[d, i, j + 1] + bc[d] * s1[d, i, j]
+                            if order > 1:
+                                m2[d, i, j] = (s1[d, i, j + 2]
+                                               + 2 * bc[d] * s1[d, i, j + 1]
+                                               + bc[d] * bc[d] * s1[d, i, j])
+                ka = scof[a] + (k - sprm[a]) * ca
+                kb = scof[b] + (m - sprm[b]) * cb
+                for i in range(na):
+                    li, mi, ni = pows[la, i, 0], pows[la, i, 1], pows[la, i, 2]
+                    for j in range(nb):
+                        lj, mj, nj = pows[lb, j, 0], pows[lb, j, 1], pows[lb, j, 2]
+                        sx, sy, sz = s1[0, li, lj], s1[1, mi, mj], s1[2, ni, nj]
+                        ops[0] = sx * sy * sz
+                        o = 1
+                        if kinetic:
+                            ops[1] = (t1[0, li, lj] * sy * sz
+                                      + sx * t1[1, mi, mj] * sz
+                                      + sx * sy * t1[2, ni, nj])
+                            o = 2
+                        if order > 0:
+                            mx, my, mz = m1[0, li, lj], m1[1, mi, mj], m1[2, ni, nj]
+                            ops[o] = mx * sy * sz
+                            ops[o + 1] = sx * my * sz
+                            ops[o + 2] = sx * sy * mz
+                        if order > 1:
+                            ops[o + 3] = m2[0, li, lj] * sy * sz
+                            ops[o + 4] = mx * my * sz
+                            ops[o + 5] = mx * sy * mz
+                            ops[o + 6] = sx * m2[1, mi, mj] * sz
+                            ops[o + 7] = sx * my * mz
+                            ops[o + 8] = sx * sy * m2[2, ni, nj]
+                        for u in range(ca):
+                            for v in range(cb):
+                                c = coefs[ka + u] * coefs[kb + v] * pre
+                                for x in range(nop):
+                                    cblk[x, i * ca + u, j * cb + v] += c * ops[x]
+        oa, ob = soff[a], soff[b]
+        for x in range(nop):
+            blk = _spherical_block(cblk[x], la, ca, lb, cb, sphr[a], sphr[b], c2s)
+            for i in range(blk.shape[0]):
+                r = oa + i
+                for j in range(blk.shape[1]):
+                    c = ob + j
+                    if c > r: break
+                    ints[x, r * (r + 1) // 2 + c] = blk[i, j]
+    return ints
+
+
+def shell_pair_integrals(ptrs, xyzs, shls, kinetic=True, order=2,
+                         origin=None, tol=1e-14, soa=None):
+    """
+    One-electron integrals (overlap, kinetic energy, dipole and quadrupole)
+    of contracted gaussian basis functions, assembled in parallel over
+    screened shell instance pairs in a single pass.
+
+    .. code-block:: python
+
+        ptrs, xyzs, shls = uni.enumerate_shells()
+        ints = shell_pair_integrals(ptrs, xyzs, shls)
+        ints['kinetic']                     # packed lower triangle
+
+    Args:
+        ptrs (np.ndarray): (center, shell) pointers (see enumerate_shells)
+        xyzs (np.ndarray): atomic coordinates
+        shls (np.ndarray): :class:`~exatomic.algorithms.numerical.Shell` objects
+        kinetic (bool): compute kinetic energy integrals (default True)
+        order (int): highest multipole: 0, 1 (dipole) or 2 (quadrupole)
+        origin (array-like): origin of the multipole operators (default (0, 0, 0))
+        tol (float): skip shell pairs whose gaussian product prefactor is below tol
+        soa (tuple): cached unique shell arrays of shls (see
+            :meth:`~exatomic.core.basis.BasisSet.shell_arrays`)
+
+    Returns:
+        ints (OrderedDict): packed lower triangles by operator name
+    """
+    origin = np.zeros(3) if origin is None else np.asarray(origin, dtype=np.float64)
+    arrs = _shell_arrays(ptrs, xyzs, shls, soa=soa)
+    pairs = _screen_shell_pairs(arrs[0], arrs[2], arrs[3], tol)
+    ints = _shell_pair_integrals(pairs, *(arrs + (origin, bool(kinetic),
+                                                  np.int64(order))))
+    return OrderedDict(zip(_operator_names(kinetic, order), ints))
+
+
+def shell_pair_overlap(ptrs, xyzs, shls, tol=1e-14, packed=True, soa=None):
+    """
+    Overlap matrix of contracted gaussian basis functions, assembled in
+    parallel over screened shell instance pairs.
+
+    .. code-block:: python
+
+        ptrs, xyzs, shls = uni.enumerate_shells()
+        tri = shell_pair_overlap(ptrs, xyzs, shls)        # packed lower triangle
+        sq = shell_pair_overlap(ptrs, xyzs, shls, packed=False)
+
+    Args:
+        ptrs (np.ndarray): (center, shell) pointers (see enumerate_shells)
+        xyzs (np.ndarray): atomic coordinates
+        shls (np.ndarray): :class:`~exatomic.algorithms.numerical.Shell` objects
+        tol (float): skip shell pairs whose gaussian product prefactor is below tol
+        packed (bool): return the lower triangle, row major (default True)
+        soa (tuple): cached unique shell arrays of shls (see
+            :meth:`~exatomic.core.basis.BasisSet.shell_arrays`)
+
+    Returns:
+        ovl (np.ndarray): packed (ndim * (ndim + 1) // 2, ) or square overlap
+    """
+    tri = shell_pair_integrals(ptrs, xyzs, shls, kinetic=False, order=0,
+                               tol=tol, soa=soa)['overlap']
+    return tri if packed else _square(tri)
+
+
 ##################################
 # Obara-Saika recursion relation #
 ##################################
 
+@jit(nopython=True, nogil=True, cache=nbche)
+def _obara_saika(s0, l, m, pa, pb, p, N):
+    """
+    Fill the one dimensional overlap table s0[i, j] for i <= l, j <= m
+    (without the exp(-mu * ab2) prefactor) using the Obara-Saika recursion
+    (see Molecular Electronic-Structure Theory by Trygve Helgaker et al.,
+    section 9.3),
+
+    .. math::
+
+        S_{i+1,j} = X_{PA}S_{ij} + \\frac{1}{2p}\\left(iS_{i-1,j} + jS_{i,j-1}\\right)
+
+        S_{i,j+1} = X_{PB}S_{ij} + \\frac{1}{2p}\\left(iS_{i-1,j} + jS_{i,j-1}\\right)
+
+    Every component of a shell pair is then a product of three table
+    entries, so one table per dimension replaces the binomial sums of
+    :func:`~exatomic.algorithms.overlap._nin`.
+
+    Args:
+        s0 (np.ndarray): output table with shape at least (l + 1, m + 1)
+        l (int): highest power on center A
+        m (int): highest power on center B
+        pa (float): P - A along the dimension
+        pb (float): P - B along the dimension
+        p (float): total exponent
+        N (float): sqrt(pi / p)
+    """
+    p2 = 1 / (2 * p)
+    s0[0, 0] = N
+    for i in range(l):
+        s0[i + 1, 0] = pa * s0[i, 0]
+        if i: s0[i + 1, 0] += i * p2 * s0[i - 1, 0]
+    for j in range(m):
+        for i in range(l + 1):
+            t = pb * s0[i, j]
+            if i: t += i * p2 * s0[i - 1, j]
+            if j: t += j * p2 * s0[i, j - 1]
+            s0[i, j + 1] = t
+
+
 @jit(nopython=True, nogil=True, cache=nbche)
 def _obara_s_recurr(p, l, m, pa, pb, s):
-    """There is a bug in this function. Do not use."""
+    """One dimensional overlap s_{lm} by Obara-Saika recursion from s_{00} = s."""
     if not l + m: return s
-    p2 = 1 / (2 * p)
-    s0 = np.zeros((l + 1, m + 1))
-    s0[0, 0] = s
-    if l: s0[1, 0] = pa * s
-    if m: s0[0, 1] = pb * s
-    if l and m: s0[1, 1] = pb * s0[1, 0] + p2 * s
-    for i in range(1, l):
-        for j in range(1, m):
-            mul = p2 * (i * s0[i - 1, j] + j * s0[i, j - 1])
-            s0[i + 1, j] = pa * s0[i, j] + mul
-            s0[i, j + 1] = pb * s0[i, j] + mul
-            s0[i + 1, j + 1] = pa * s0[i, j + 1] + p2 * ((i + 1) * s0[i, j] + j * s0[i + 1, j])
+    s0 = np.empty((l + 1, m + 1))
+    _obara_saika(s0, l, m, pa, pb, p, s)
     return s0[l, m]
 
 
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2018, Exa Analytics Development Team
+# Distributed under the terms of the Apache License 2.0
+"""
+Population Analysis
+#####################
+Mulliken and Löwdin population analysis of all molecular orbitals at
+once. Basis function contributions are computed with dense matrix
+products and summed into groups of basis functions (atoms, angular
+momenta, ...) with a sparse indicator matrix built once per universe.
+The character of every orbital (its largest basis function or group
+weights) is summarized in one pass by :func:`orbital_contributions`.
+
+.. math::
+
+    q_{\\mu i}^{M} = C_{\\mu i} \\left(SC\\right)_{\\mu i} \\\\
+    q_{\\mu i}^{L} = \\left(S^{1/2}C\\right)_{\\mu i}^{2}
+"""
+import six
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from exatomic.core.orbital import _dense_coefficients
+
+
+def _basis_groups(bso, by):
+    """
+    Sparse indicator matrix of shape (ngroup, nbas) summing basis
+    functions into the unique values of the `by` columns of the
+    basis set order, along with the group labels.
+    """
+    if by == 'chi' or by == ['chi']:
+        nbas = len(bso)
+        return sparse.identity(nbas, format='csr'), \
+               pd.DataFrame({'chi': np.arange(nbas)})
+    keys = bso[by].values.astype(np.int64)
+    labels, grp = np.unique(keys, axis=0, return_inverse=True)
+    grp = grp.ravel()
+    mat = sparse.csr_matrix((np.ones(len(grp)), (grp, np.arange(len(grp)))),
+                            shape=(len(labels), len(grp)))
+    return mat, pd.DataFrame(labels, columns=by)
+
+
+def _sqrt_overlap(smat):
+    """Symmetric square root of the overlap matrix."""
+    vals, vecs = np.linalg.eigh(smat)
+    return (vecs * np.sqrt(np.abs(vals))).dot(vecs.T)
+
+
+def _populations(cmat, smat, groups, lowdin=True):
+    """
+    Grouped Mulliken (and Löwdin) populations of every column of the
+    coefficient matrix, each of shape (ngroup, norb).
+    """
+    mull = groups.dot(cmat * smat.dot(cmat))
+    if not lowdin: return mull, None
+    return mull, groups.dot(np.square(_sqrt_overlap(smat).dot(cmat)))
+
+
+def _occupations(uni, orbocc, frame, norb):
+    if not isinstance(orbocc, six.string_types):
+        occvec = np.asarray(orbocc, dtype=np.float64)
+    else:
+        orbs = uni.orbital
+        if 'frame' in orbs.columns and orbs['frame'].nunique() > 1:
+            orbs = orbs[orbs['frame'] == frame]
+        occvec = orbs[orbocc].values.astype(np.float64)
+    if len(occvec) != norb:
+        raise ValueError('{} occupations for {} orbitals; pass the '
+                         'occupations explicitly'.format(len(occvec), norb))
+    return occvec
+
+
+def _frame_matrices(uni, mocoefs, frame):
+    """Yields the frame and dense coefficient matrix per frame."""
+    momat = _dense_coefficients(uni)
+    if momat is not None:
+        frames, irreps = momat.frames, momat.irreps
+    else:
+        momat = uni.momatrix
+        frames = momat['frame'].unique().tolist() \
+                 if 'frame' in momat.columns else [0]
+        irreps = momat['irrep'].unique().tolist() \
+                 if 'irrep' in momat.columns else [None]
+    if len(irreps) > 1:
+        raise ValueError('population analysis of symmetry blocked '
+                         'coefficients is not supported')
+    if frame is not None:
+        frames = [frame] if not isinstance(frame, (list, tuple)) else frame
+    for fdx in frames:
+        yield fdx, momat.square(frame=fdx, column=mocoefs).values
+
+
+def _frame_populations(uni, mocoefs, by, frame, lowdin):
+    """
+    Yields the frame, group labels and grouped populations per frame.
+    An overlap of a single frame is shared by all frames.
+    """
+    if isinstance(by, six.string_types): by = [by]
+    groups, labels = _basis_groups(uni.basis_set_order, list(by))
+    ovl = uni.overlap
+    ofrms = ovl['frame'].astype(np.int64).unique().tolist() \
+            if 'frame' in ovl.columns else [0]
+    smat = ovl.square(frame=ofrms[0]).values if len(ofrms) == 1 else None
+    for fdx, cmat in _frame_matrices(uni, mocoefs, frame):
+        if len(ofrms) > 1:
+            if fdx not in ofrms:
+                raise ValueError('overlap has no frame {}'.format(fdx))
+            smat = ovl.square(frame=fdx).values
+        yield fdx, labels, _populations(cmat, smat, groups, lowdin=lowdin)
+
+
+def _group_weights(weights, grp):
+    """
+    Sums the rows of weights into groups with a single np.add.reduceat
+    over the group sorted rows; returns the sorted unique group codes
+    and the grouped weights of shape (ngroup, norb).
+    """
+    srt = np.argsort(grp, kind='mergesort')
+    grp = grp[srt]
+    starts = np.r_[0, np.flatnonzero(np.diff(grp)) + 1]
+    return grp[starts], np.add.reduceat(weights[srt], starts, axis=0)
+
+
+def _top_contributions(weights, topk, tol):
+    """
+    Per column of weights, the rows of the (at most) topk largest
+    weights above tol in decreasing order. Returns orbital, row, weight
+    and rank arrays in orbital major order.
+    """
+    nrow, norb = weights.shape
+    cols = np.arange(norb)
+    if topk is not None and topk < nrow:
+        idx = np.argpartition(-weights, topk - 1, axis=0)[:topk]
+    else:
+        idx = np.repeat(np.arange(nrow)[:, None], norb, axis=1)
+    vals = weights[idx, cols]
+    srt = np.argsort(-vals, axis=0, kind='mergesort')
+    idx, vals = idx[srt, cols].T, vals[srt, cols].T
+    keep = vals > tol
+    orb, rank = np.nonzero(keep)
+    return orb, idx[keep], vals[keep], rank
+
+
+def orbital_populations(uni, mocoefs='coef', by='center', frame=None,
+                        lowdin=True):
+    """
+    Mulliken and Löwdin populations of every molecular orbital, summed
+    over groups of basis functions.
+
+    .. code-block:: python
+
+        orbital_populations(uni)                      # per atom
+        orbital_populations(uni, by=['center', 'L'])  # per atom and L
+
+    Args:
+        uni (:class:`~exatomic.core.universe.Universe`): a universe with
+            momatrix, overlap and basis_set_order
+        mocoefs (str): column of MO coefficients
+        by (str, list): basis_set_order column(s) to group by ('chi' for
+            basis function populations)
+        frame (int, list): frame(s) to analyze (default all)
+        lowdin (bool): also compute Löwdin populations (default True)
+
+    Returns:
+        pops (pd.DataFrame): long table of frame, orbital, groups and
+            populations
+    """
+    dfs = []
+    for fdx, labels, (mull, low) in _frame_populations(uni, mocoefs, by,
+                                                       frame, lowdin):
+        ngrp, norb = mull.shape
+        df = labels.iloc[np.tile(np.arange(ngrp), norb)].reset_index(drop=True)
+        df.insert(0, 'orbital', np.repeat(np.arange(norb), ngrp))
+        df.insert(0, 'frame', fdx)
+        df['mulliken'] = mull.ravel(order='F')
+        if low is not None: df['lowdin'] = low.ravel(order='F')
+        dfs.append(df)
+    return pd.concat(dfs, ignore_index=True)
+
+
+def atomic_populations(uni, mocoefs='coef', orbocc='occupation', by='center',
+                       frame=None, lowdin=True):
+    """
+    Occupation weighted (gross) Mulliken and Löwdin populations, summed
+    over groups of basis functions.
+
+    Args:
+        uni (:class:`~exatomic.core.universe.Universe`): a universe with
+            momatrix, overlap, basis_set_order and orbital
+        mocoefs (str): column of MO coefficients
+        orbocc (str, array): column of occupations in uni.orbital or an
+            occupation vector
+        by (str, list): basis_set_order column(s) to group by
+        frame (int, list): frame(s) to analyze (default all)
+        lowdin (bool): also compute Löwdin populations (default True)
+
+    Returns:
+        pops (pd.DataFrame): table of frame, groups and populations
+    """
+    dfs = []
+    for fdx, labels, (mull, low) in _frame_populations(uni, mocoefs, by,
+                                                       frame, lowdin):
+        occvec = _occupations(uni, orbocc, fdx, mull.shape[1])
+        df = labels.copy()
+        df.insert(0, 'frame', fdx)
+        df['mulliken'] = mull.dot(occvec)
+        if low is not None: df['lowdin'] = low.dot(occvec)
+        dfs.append(df)
+    return pd.concat(dfs, ignore_index=True)
+
+
+def orbital_contributions(uni, mocoefs='coef', by='chi', topk=None, tol=0.01,
+                          frame=None):
+    """
+    The major contributions to every molecular orbital in one pass. The
+    weight of a basis function in an orbital is its squared coefficient
+    normalized over the orbital; weights are summed into groups of basis
+    functions when `by` names basis_set_order columns.
+
+    .. code-block:: python
+
+        # three largest basis functions of each orbital
+        orbital_contributions(uni, topk=3)
+        # atom and L channel weights above 5 percent
+        orbital_contributions(uni, by=['center', 'L'], tol=0.05)
+
+    Args:
+        uni (:class:`~exatomic.core.universe.Universe`): a universe with
+            momatrix and basis_set_order
+        mocoefs (str): column of MO coefficients
+        by (str, list): 'chi' for basis functions or basis_set_order
+            column(s) to group by
+        topk (int): maximum number of contributions per orbital (default all)
+        tol (float): minimum weight of a contribution
+        frame (int, list): frame(s) to analyze (default all)
+
+    Returns:
+        contribs (pd.DataFrame): long table of frame, orbital, rank, the
+            basis function (or group) and its weight
+    """
+    if isinstance(by, six.string_types): by = [by]
+    by, bso = list(by), uni.basis_set_order
+    chis = by == ['chi']
+    if chis:
+        labels = bso.reset_index(drop=True)
+        if 'chi' not in labels.columns: labels.insert(0, 'chi', labels.index)
+    else:
+        keys, grp = np.unique(bso[by].values.astype(np.int64), axis=0,
+                              return_inverse=True)
+        grp = grp.ravel()
+    dfs = []
+    for fdx, cmat in _frame_matrices(uni, mocoefs, frame):
+        weights = np.square(cmat)
+        weights /= weights.sum(axis=0)
+        if not chis: _, weights = _group_weights(weights, grp)
+        orb, row, wgt, rank = _top_contributions(weights, topk, tol)
+        if chis:
+            df = labels.iloc[row].reset_index(drop=True)
+            df[mocoefs] = cmat[row, orb]
+        else:
+            df = pd.DataFrame(keys[row], columns=by)
+        df.insert(0, 'rank', rank)
+        df.insert(0, 'orbital', orb)
+        df.insert(0, 'frame', fdx)
+        df['weight'] = wgt
+        dfs.append(df)
+    return pd.concat(dfs, ignore_index=True)
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2018, Exa Analytics Development Team
+# Distributed under the terms of the Apache License 2.0
+"""
+Residence Times
+##################
+Neighbor lifetime (residence) correlation functions, e.g. how long solvent
+molecules remain in the first solvation shell of a solute. Neighbor lists
+are built from the two body table with a distance cutoff and stored as a
+boolean (pair x frame) occupancy matrix :math:`h_{i}\\left(t\\right)`.
+
+.. math::
+
+    C_{I}\\left(t\\right) = \\frac{\\left<h_{i}\\left(0\\right)h_{i}\\left(t\\right)\\right>}
+                                  {\\left<h_{i}\\left(0\\right)^{2}\\right>}
+
+    C_{C}\\left(t\\right) = \\frac{\\left<h_{i}\\left(0\\right)H_{i}\\left(t\\right)\\right>}
+                                  {\\left<h_{i}\\left(0\\right)^{2}\\right>}
+
+where :math:`H_{i}\\left(t\\right)` is one only if the pair has been
+continuously present from the time origin to :math:`t`. The intermittent
+function is computed with FFTs and the continuous function from run length
+histograms, so the cost is linear (up to a log factor) in the number of
+frames.
+"""
+import numpy as np
+import pandas as pd
+from numba import jit
+from exatomic.base import nbche
+
+
+def _atom_labels(atom):
+    """Atom labels, computed (without modifying the atom table) if missing."""
+    if 'label' in atom.columns:
+        return atom['label'].astype(np.int64)
+    return atom.get_atom_labels().astype(np.int64)
+
+
+def _atom_selection(universe, labels, a):
+    """Select atom indices by symbol (str), label (int, list) or index (array)."""
+    if isinstance(a, str):
+        return universe.atom[universe.atom['symbol'] == a].index.values
+    if isinstance(a, (int, list, tuple, np.int64, np.int32)):
+        a = [a] if not isinstance(a, (list, tuple)) else a
+        return labels.index[labels.isin(a)].values
+    return np.asarray(a)
+
+
+def occupancy_matrix(universe, a, b, rcut):
+    """
+    Build the boolean (pair x frame) occupancy matrix of neighbors b
+    within a distance rcut of sources a.
+
+    .. code-block:: Python
+
+        pairs, occ = occupancy_matrix(uni, 'Na', 'O', 6.0)
+        occ.sum(axis=1)    # Number of frames each (Na, O) pair were neighbors
+
+    Args:
+        universe (:class:`~exatomic.core.universe.Universe`): Universe with two body data
+        a (str, list, array): Source atoms (see :func:`~exatomic.algorithms.pcf.radial_pair_correlation`)
+        b (str, list, array): Neighbor atoms
+        rcut (float): Neighbor cutoff distance (same units as the two body table)
+
+    Returns:
+        pairs (:class:`~pandas.DataFrame`): Atom labels of each pair (row of occ)
+        occ (:class:`~numpy.ndarray`): Boolean occupancy matrix
+
+    Note:
+        Pairs are identified by atom labels (see
+        :func:`~exatomic.core.atom.Atom.get_atom_labels`) so that the same
+        pair can be followed from frame to frame.
+    """
+    labels = _atom_labels(universe.atom)
+    a_idx = _atom_selection(universe, labels, a)
+    b_idx = _atom_selection(universe, labels, b)
+    col = "distance" if "distance" in universe.atom_two.columns else "dr"
+    two = universe.atom_two
+    atom0 = two['atom0'].values.astype(np.int64)
+    atom1 = two['atom1'].values.astype(np.int64)
+    fwd = np.isin(atom0, a_idx) & np.isin(atom1, b_idx)
+    rev = np.isin(atom1, a_idx) & np.isin(atom0, b_idx)
+    keep = (fwd | rev) & (two[col].values < rcut)
+    src = np.where(fwd, atom0, atom1)[keep]
+    nbr = np.where(fwd, atom1, atom0)[keep]
+    la = labels.loc[src].values
+    lb = labels.loc[nbr].values
+    # Identical source and neighbor selections see each pair from both ends
+    both = (fwd & rev)[keep]
+    la, lb = (np.where(both, np.minimum(la, lb), la),
+              np.where(both, np.maximum(la, lb), lb))
+    frames = universe.atom['frame'].astype(np.int64)
+    allframes = np.sort(frames.unique())
+    fdx = np.searchsorted(allframes, frames.loc[src].values)
+    nlab = labels.max() + 1
+    ukey, pdx = np.unique(la * nlab + lb, return_inverse=True)
+    occ = np.zeros((len(ukey), len(allframes)), dtype=np.bool_)
+    occ[pdx, fdx] = True
+    pairs = pd.DataFrame.from_dict({'label0': ukey // nlab,
+                                    'label1': ukey % nlab})
+    pairs.index.name = 'pair'
+    return pairs, occ
+
+
+def intermittent_correlation(occ):
+    """
+    Intermittent neighbor correlation function of an occupancy matrix.
+
+    The autocorrelation of every pair is computed at once with zero-padded
+    FFTs along the frame axis and averaged over pairs and time origins.
+
+    Args:
+        occ (:class:`~numpy.ndarray`): Boolean (pair x frame) occupancy matrix
+
+    Returns:
+        corr (:class:`~numpy.ndarray`): Normalized correlation per frame lag
+    """
+    h = np.asarray(occ, dtype=np.float64)
+    nframe = h.shape[1]
+    nfft = 2 ** int(np.ceil(np.log2(2 * nframe)))
+    fh = np.fft.rfft(h, n=nfft, axis=1)
+    acf = np.fft.irfft((fh * fh.conj()).sum(axis=0), n=nfft)[:nframe]
+    acf /= nframe - np.arange(nframe)
+    if np.isclose(acf[0], 0): return np.zeros(nframe)
+    return acf / acf[0]
+
+
+@jit(nopython=True, nogil=True, cache=nbche)
+def _run_length_histogram(occ):
+    """Histogram of the lengths of uninterrupted runs of occupancy."""
+    npair, nframe = occ.shape
+    hist = np.zeros(nframe + 1, dtype=np.int64)
+    for i in range(npair):
+        run = 0
+        for t in range(nframe):
+            if occ[i, t]:
+                run += 1
+            elif run:
+                hist[run] += 1
+                run = 0
+        if run: hist[run] += 1
+    return hist
+
+
+def continuous_correlation(occ):
+    """
+    Continuous neighbor (survival) correlation function of an occupancy matrix.
+
+    A run of L consecutive occupied frames contributes (L - t) time origins
+    to lag t, so the numerator follows from reverse cumulative sums of the
+    run length histogram.
+
+    Args:
+        occ (:class:`~numpy.ndarray`): Boolean (pair x frame) occupancy matrix
+
+    Returns:
+        corr (:class:`~numpy.ndarray`): Normalized correlation per frame lag
+    """
+    nframe = occ.shape[1]
+    hist = _run_length_histogram(np.ascontiguousarray(occ, dtype=np.bool_))
+    lens = np.arange(nframe + 1)
+    # Runs longer than t and their total length, for each lag t
+    nlong = np.cumsum(hist[::-1])[::-1][1:]
+    tlong = np.cumsum((hist * lens)[::-1])[::-1][1:]
+    lags = lens[:-1]
+    surv = (tlong - lags * nlong) / (nframe - lags)
+    if np.isclose(surv[0], 0): return np.zeros(nframe)
+    return surv / surv[0]
+
+
+def residence_correlation(universe, a, b, rcut, time='time'):
+    """
+    Compute intermittent and continuous residence correlation functions.
+
+    .. code-block:: Python
+
+        corr = residence_correlation(uni, 'Na', 'O', 6.0)
+        corr.plot()
+        residence_time(corr)
+
+    Args:
+        universe (:class:`~exatomic.core.universe.Universe`): Universe with two body data
+        a (str, list, array): Source atoms
+        b (str, list, array): Neighbor atoms
+        rcut (float): Neighbor cutoff distance
+        time (str): Column of the frame table used to convert lags to times
+
+    Returns:
+        corr (:class:`~pandas.DataFrame`): Correlation functions indexed by lag
+    """
+    _, occ = occupancy_matrix(universe, a, b, rcut)
+    nframe = occ.shape[1]
+    df = pd.DataFrame.from_dict({'intermittent': intermittent_correlation(occ),
+                                 'continuous': continuous_correlation(occ)})
+    df.index.name = 'lag'
+    if time in universe.frame.columns and nframe > 1:
+        dt = np.diff(np.sort(universe.frame[time].values.astype(np.float64))).mean()
+        df[time] = df.index.values * dt
+    return df
+
+
+def residence_time(corr, column='continuous', time='time'):
+    """
+    Integrate a residence correlation function to obtain a lifetime.
+
+    Args:
+        corr (:class:`~pandas.DataFrame`): Output of :func:`~exatomic.algorithms.residence.residence_correlation`
+        column (str): Correlation function to integrate
+        time (str): Column of times (falls back to frame lags)
+
+    Returns:
+        tau (float): Residence time in units of time (or frames)
+    """
+    y = corr[column].values
+    t = corr[time].values if time in corr.columns else corr.index.values
+    return (0.5 * (y[1:] + y[:-1]) * np.diff(t)).sum()
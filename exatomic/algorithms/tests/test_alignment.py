@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2018, Exa Analytics Development Team
+# Distributed under the terms of the Apache License 2.0
+"""Tests for batched Kabsch alignment and RMSD."""
+import six
+import numpy as np
+from unittest import TestCase
+from exatomic.core.atom import Atom
+from exatomic.core.universe import Universe
+from exatomic.algorithms.alignment import (kabsch, pairwise_rmsd, align_frames,
+                                           rmsd)
+
+
+def _rotation(a, b, c):
+    rx = np.array([[1, 0, 0], [0, np.cos(a), -np.sin(a)], [0, np.sin(a), np.cos(a)]])
+    ry = np.array([[np.cos(b), 0, np.sin(b)], [0, 1, 0], [-np.sin(b), 0, np.cos(b)]])
+    rz = np.array([[np.cos(c), -np.sin(c), 0], [np.sin(c), np.cos(c), 0], [0, 0, 1]])
+    return np.dot(rz, np.dot(ry, rx))
+
+
+class TestKabsch(TestCase):
+    def setUp(self):
+        np.random.seed(2)
+        self.ref = np.random.rand(12, 3) * 4
+        self.xyz = np.array([np.dot(self.ref, _rotation(*np.random.rand(3) * 6).T)
+                             + np.random.rand(3) + np.random.normal(0, s, (12, 3))
+                             for s in (0., 0.05, 0.2)])
+
+    def test_rigid(self):
+        rot, rmsd = kabsch(self.ref, self.xyz[:1])
+        self.assertTrue(np.isclose(rmsd[0], 0, atol=1e-7))
+        self.assertTrue(np.allclose(np.linalg.det(rot), 1))
+
+    def test_rmsd(self):
+        rot, rmsd = kabsch(self.ref, self.xyz)
+        mob = self.xyz - self.xyz.mean(axis=1)[:, np.newaxis]
+        new = np.einsum('fni,fji->fnj', mob, rot) + self.ref.mean(axis=0)
+        chk = np.sqrt(((new - self.ref) ** 2).sum(axis=(1, 2)) / len(self.ref))
+        self.assertTrue(np.allclose(rmsd, chk))
+        self.assertTrue(np.all(np.diff(rmsd) > 0))
+
+    def test_pairwise(self):
+        xyz = np.vstack([self.ref[np.newaxis], self.xyz])
+        pw = pairwise_rmsd(xyz, block=2)
+        self.assertTrue(np.allclose(pw, pw.T))
+        self.assertTrue(np.allclose(np.diag(pw), 0))
+        self.assertTrue(np.allclose(pw[0, 1:], kabsch(self.ref, self.xyz)[1]))
+
+
+class TestAlignFrames(TestCase):
+    def setUp(self):
+        np.random.seed(3)
+        ref = np.random.rand(5, 3) * 4
+        frames = [ref] + [np.dot(ref, _rotation(*np.random.rand(3) * 6).T)
+                          + np.random.rand(3) for _ in range(2)]
+        xyz = np.vstack(frames)
+        self.ref = ref
+        self.uni = Universe(atom=Atom.from_dict({
+            'symbol': ['C', 'H', 'H', 'O', 'N'] * 3,
+            'x': xyz[:, 0], 'y': xyz[:, 1], 'z': xyz[:, 2],
+            'frame': np.repeat([0, 1, 2], 5)}))
+
+    def test_align_frames(self):
+        atom, dev = align_frames(self.uni)
+        self.assertNotIn('label', self.uni.atom.columns)
+        self.assertTrue(np.allclose(dev, 0, atol=1e-7))
+        for fdx, grp in atom.groupby('frame'):
+            self.assertTrue(np.allclose(grp[['x', 'y', 'z']].values, self.ref))
+
+    def test_align_labels(self):
+        atom, dev = align_frames(self.uni, ref_frame=2, labels=[0, 1, 2])
+        self.assertEqual(dev.index.tolist(), [0, 1, 2])
+        self.assertTrue(np.allclose(dev, 0, atol=1e-7))
+        ref = self.uni.atom.loc[self.uni.atom['frame'] == 2, ['x', 'y', 'z']]
+        for fdx, grp in atom.groupby('frame'):
+            self.assertTrue(np.allclose(grp[['x', 'y', 'z']].values, ref.values))
+
+    def test_universe(self):
+        atom = self.uni.align()
+        self.assertFalse(np.allclose(self.uni.atom['x'], atom['x']))
+        self.assertTrue(np.allclose(self.uni.rmsd(), 0, atol=1e-7))
+        pw = self.uni.rmsd(pairwise=True)
+        self.assertEqual(pw.shape, (3, 3))
+        self.assertTrue(np.allclose(pw, 0, atol=1e-7))
+        self.uni.align(inplace=True)
+        self.assertTrue(np.allclose(self.uni.atom['x'], atom['x']))
+
+    def test_missing_ref_frame(self):
+        with six.assertRaisesRegex(self, ValueError, 'frame 7'):
+            align_frames(self.uni, ref_frame=7)
+        with six.assertRaisesRegex(self, ValueError, 'frame 7'):
+            rmsd(self.uni, ref_frame=7)
+        with six.assertRaisesRegex(self, ValueError, 'frame 7'):
+            self.uni.rmsd(ref_frame=7)
@@ -9,12 +9,16 @@ from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
 
+import warnings
 import numpy as np
+import pandas as pd
 from unittest import TestCase
 from exatomic.base import resource
 from exatomic import nwchem, molcas
 from ..basis import (cart_lml_count, spher_lml_count, solid_harmonics,
-                     enum_cartesian, car2sph, BasisFunctions)
+                     enum_cartesian, car2sph, evaluate_expr, diff_expr,
+                     BasisFunctions, BasisFunctionCache,
+                     compute_uncontracted_basis_set_order, _shell_counts)
 
 
 class TestCartesianToSpherical(TestCase):
@@ -36,6 +40,43 @@ class TestCartesianToSpherical(TestCase):
             self.assertEqual(c2s[L].shape, (c, s))
 
 
+class TestBasisFunctionCache(TestCase):
+
+    def test_lru(self):
+        cache = BasisFunctionCache(max_bytes=3 * 800)
+        for i in range(3): cache.put(i, np.zeros(100))
+        self.assertIsNotNone(cache.get(0))
+        cache.put(3, np.zeros(100))
+        self.assertNotIn(1, cache)
+        self.assertIn(0, cache)
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.stats['hits'], 1)
+        self.assertEqual(cache.stats['misses'], 1)
+        self.assertEqual(cache.stats['evictions'], 1)
+        cache.max_bytes = 800
+        self.assertEqual(len(cache), 1)
+        self.assertIn(3, cache)
+
+
+class TestShellCounts(TestCase):
+
+    def test_shell_counts(self):
+        prims = pd.Series([3, 2, 4], index=pd.MultiIndex.from_tuples(
+            [(0, 0), (0, 1), (1, 0)], names=['set', 'L']))
+        pos = _shell_counts(prims, np.array([1, 0, 0]), np.array([0, 1, 0]))
+        self.assertTrue(np.array_equal(pos, [2, 1, 0]))
+        first, nshl = _shell_counts(prims, np.array([1, 0]))
+        self.assertTrue(np.array_equal(first, [2, 0]))
+        self.assertTrue(np.array_equal(nshl, [1, 2]))
+        empty = np.empty(0, dtype=np.int64)
+        self.assertEqual(len(_shell_counts(prims, empty, empty)), 0)
+        self.assertEqual(len(_shell_counts(prims, empty)[0]), 0)
+        with self.assertRaises(ValueError):
+            _shell_counts(prims, np.array([2]), np.array([0]))
+        with self.assertRaises(ValueError):
+            _shell_counts(prims, np.array([2]))
+
+
 class TestBasisFunctions(TestCase):
 
     def setUp(self):
@@ -53,3 +94,83 @@ class TestBasisFunctions(TestCase):
             self.assertTrue(np.isclose(np.float64(a), np.float64(b)))
         self.assertFalse(len(nwfns[11].expand().as_coefficients_dict()) ==
                          len(mofns[11].expand().as_coefficients_dict()))
+
+    def test_numerical_evaluation(self):
+        xs, ys, zs = np.random.RandomState(0).rand(3, 20) * 4 - 2
+        for uni in (self.nw, self.mo):
+            syms = uni.basis_functions.evaluate()
+            vals = uni.basis_functions.evaluate(xs, ys, zs)
+            self.assertEqual(vals.shape, (len(syms), len(xs)))
+            for i, sym in enumerate(syms):
+                chk = evaluate_expr(sym, xs, ys, zs) * np.ones(len(xs))
+                self.assertTrue(np.allclose(vals[i], chk))
+
+    def test_screened_evaluation(self):
+        xs, ys, zs = np.random.RandomState(0).rand(3, 500) * 16 - 8
+        for uni in (self.nw, self.mo):
+            vals = uni.basis_functions.evaluate(xs, ys, zs)
+            sprs = uni.basis_functions.evaluate(xs, ys, zs, tol=1e-8)
+            self.assertTrue(sprs.nnz < vals.size)
+            self.assertTrue(np.allclose(sprs.toarray(), vals, atol=1e-8))
+            cuts = uni.basis_functions.shell_cutoffs(1e-8)
+            self.assertTrue(uni.basis_functions.shell_cutoffs(1e-8) is cuts)
+            self.assertFalse(cuts.flags.writeable)
+
+    def test_derivatives(self):
+        xs, ys, zs = np.random.RandomState(0).rand(3, 40) * 4 - 2
+        for uni in (self.nw, self.mo):
+            bfns = uni.basis_functions
+            vals = bfns.evaluate_derivatives(xs, ys, zs, laplacian=True)
+            self.assertEqual(vals.shape, (5, len(bfns), len(xs)))
+            self.assertTrue(np.allclose(vals[0], bfns.evaluate(xs, ys, zs)))
+            lap = -6 * vals[0]
+            h = 1e-3
+            for i, d in enumerate(np.eye(3) * h):
+                fwd = bfns.evaluate(xs + d[0], ys + d[1], zs + d[2])
+                bwd = bfns.evaluate(xs - d[0], ys - d[1], zs - d[2])
+                self.assertTrue(np.allclose(vals[i + 1], (fwd - bwd) / (2 * h),
+                                            atol=1e-5))
+                lap += fwd + bwd
+            self.assertTrue(np.allclose(vals[4], lap / h ** 2, atol=1e-3))
+        bfns = self.mo.basis_functions
+        dx = (bfns.evaluate(xs + h, ys, zs) - bfns.evaluate(xs - h, ys, zs))
+        self.assertTrue(np.allclose(bfns.evaluate_diff(xs, ys, zs, cart='x'),
+                                    dx / (2 * h), atol=1e-5))
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            dsym = diff_expr(bfns.evaluate()[3], cart='x')
+        self.assertTrue(any(issubclass(w.category, DeprecationWarning)
+                            for w in caught))
+        chk = evaluate_expr(dsym, xs, ys, zs) * np.ones(len(xs))
+        self.assertTrue(np.allclose(chk, dx[3] / (2 * h), atol=1e-5))
+
+    def test_enumerate_shells(self):
+        for uni in (self.nw, self.mo):
+            ptrs, xyzs, shls = uni.enumerate_shells()
+            self.assertEqual(len(xyzs), len(uni.atom))
+            sets = uni.atom['set'].astype(np.int64).values
+            bset = uni.basis_set.shells(uni.meta['program'],
+                                        uni.meta['spherical'],
+                                        uni.meta['gaussian'])
+            self.assertTrue(np.array_equal(
+                bset['set'].values[ptrs[:, 1]].astype(np.int64),
+                sets[ptrs[:, 0]]))
+            self.assertEqual(len(ptrs), bset.groupby('set').size()
+                                            .loc[sets].sum())
+        uni = self.mo
+        sets = uni.atom['set'].copy()
+        try:
+            uni.atom['set'] = sets.astype(np.int64) + 1000
+            with self.assertRaises(ValueError):
+                uni.enumerate_shells()
+        finally:
+            uni.atom['set'] = sets
+
+    def test_uncontracted_basis_set_order(self):
+        for uni in (self.nw, self.mo):
+            nprim = uni.basis_set.primitives(True).groupby(level=0).sum()
+            unc = compute_uncontracted_basis_set_order(uni)
+            self.assertEqual(len(unc), nprim.loc[uni.atom['set']].sum())
+            keys = unc[unc['shell'] == 0][['center', 'L', 'ml']]
+            self.assertEqual(len(keys), len(keys.drop_duplicates()))
+            self.assertTrue(uni.meta['uncontracted'])
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2018, Exa Analytics Development Team
+# Distributed under the terms of the Apache License 2.0
+"""Tests for the cartesian to spherical basis transformation."""
+import numpy as np
+import pandas as pd
+from unittest import TestCase
+from exatomic.base import resource
+from exatomic import nwchem
+from exatomic.algorithms.numerical import Shell, _enum_cartesian
+from exatomic.algorithms.overlap import shell_pair_overlap
+from exatomic.algorithms.basis import BasisFunctions
+from exatomic.algorithms.car2sph import (car2sph_transform, car2sph_matrices,
+                                         _sphr_order)
+from exatomic.core.basis import Overlap
+from exatomic.core.orbital import MOMatrix
+
+
+class _Uni(object):
+    """Minimal stand-in for a universe with matrix tables."""
+    def __init__(self, **tables):
+        for name, tbl in tables.items():
+            setattr(self, '_' + name, tbl)
+            setattr(self, name, tbl)
+
+
+class _CartUni(object):
+    """Cartesian twin of a universe, sharing its atoms and basis set."""
+    def __init__(self, uni):
+        self.meta = {'program': '', 'spherical': False, 'gaussian': True}
+        self.basis_set = uni.basis_set
+        self.basis_dims = uni.basis_dims
+        self._ptrs, self._xyzs, _ = uni.enumerate_shells()
+        self._shls = uni.basis_set.shells('', False, True)[0].values
+        rows = []
+        for cen, idx in self._ptrs:
+            shl = self._shls[idx]
+            for l, m, n in _enum_cartesian(shl.L):
+                rows += [(cen, shl.L, c, l, m, n) for c in range(shl.ncont)]
+        self.current_basis_set_order = pd.DataFrame(
+            rows, columns=['center', 'L', 'shell', 'l', 'm', 'n'])
+
+    def enumerate_shells(self, frame=0):
+        return self._ptrs, self._xyzs, self._shls
+
+
+class TestCar2SphTransform(TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        lmax = 4
+        self.xyzs = rng.rand(2, 3) * 2
+        self.ptrs = np.array([(c, L) for c in range(2) for L in range(lmax + 1)])
+        self.cart, self.sphr = [], []
+        for L in range(lmax + 1):
+            alphas = np.sort(rng.rand(3) * 3 + 0.3)[::-1].copy()
+            coef = rng.rand(6)
+            self.cart.append(Shell(coef, alphas, 3, 2, L, False, True, None, None))
+            self.sphr.append(Shell(coef, alphas, 3, 2, L, L > 1, True, None, None))
+        crow, srow = [], []
+        for c in range(2):
+            for L in range(lmax + 1):
+                for l, m, n in _enum_cartesian(L):
+                    crow += [(c, L, k, l, m, n) for k in range(2)]
+                # s and p shells are cartesian normalized like the kernel,
+                # p functions are x, y, z (ml = 1, -1, 0) as in the parsers
+                mls = [1, -1, 0] if L == 1 else range(-L, L + 1)
+                for ml in mls:
+                    srow += [(c, L, k, ml) for k in range(2)]
+        self.corder = pd.DataFrame(crow, columns=['center', 'L', 'shell',
+                                                  'l', 'm', 'n'])
+        self.sorder = pd.DataFrame(srow, columns=['center', 'L', 'shell', 'ml'])
+
+    def test_overlap(self):
+        tmat, pmat = car2sph_transform(self.corder, self.sorder)
+        cart = shell_pair_overlap(self.ptrs, self.xyzs, self.cart, packed=False)
+        sphr = shell_pair_overlap(self.ptrs, self.xyzs, self.sphr, packed=False)
+        self.assertTrue(np.allclose(tmat.T.dot(tmat.T.dot(cart).T), sphr))
+        self.assertTrue(np.allclose(pmat.dot(tmat).toarray(),
+                                    np.eye(tmat.shape[1])))
+        self.assertTrue(car2sph_transform(self.corder, self.sorder)[0] is tmat)
+
+    def test_sphr_order(self):
+        order = _sphr_order(self.corder)
+        self.assertEqual(len(order), 2 * sum(2 * (2 * L + 1) for L in range(5)))
+        tmat, _ = car2sph_transform(self.corder, order)
+        self.assertEqual(tmat.shape, (len(self.corder), len(order)))
+
+    def test_car2sph_matrices(self):
+        tmat, pmat = car2sph_transform(self.corder, self.sorder)
+        cart = shell_pair_overlap(self.ptrs, self.xyzs, self.cart, packed=False)
+        sphr = shell_pair_overlap(self.ptrs, self.xyzs, self.sphr, packed=False)
+        nsph = tmat.shape[1]
+        csph = np.random.RandomState(1).rand(nsph, nsph)
+        ccart = tmat.dot(csph)
+        uni = _Uni(basis_set_order=self.corder,
+                   sphr_basis_set_order=self.sorder,
+                   overlap=Overlap.from_square(cart),
+                   momatrix=MOMatrix(pd.DataFrame({
+                       'chi': np.tile(range(len(ccart)), nsph),
+                       'orbital': np.repeat(range(nsph), len(ccart)),
+                       'coef': ccart.ravel(order='F'), 'frame': 0})))
+        tables = car2sph_matrices(uni)
+        self.assertEqual(list(tables), ['basis_set_order', 'momatrix', 'overlap'])
+        self.assertTrue(np.allclose(pmat.dot(tmat).toarray(), np.eye(nsph)))
+        proj = tmat.dot(pmat)
+        self.assertTrue(np.allclose(proj.dot(tmat).toarray(), tmat.toarray()))
+        self.assertTrue(np.allclose(tables['overlap'].square().values, sphr))
+        self.assertTrue(np.allclose(tables['momatrix'].square().values, csph))
+
+
+class TestCar2SphNWChem(TestCase):
+    def setUp(self):
+        self.uni = nwchem.Output(resource('nw-ch3nh2-631g.out')).to_universe()
+
+    def test_orbital_values(self):
+        # Spherical functions in the order of the parser
+        sphr = self.uni.basis_set_order
+        cart = _CartUni(self.uni)
+        corder = cart.current_basis_set_order
+        xs, ys, zs = np.random.RandomState(0).rand(3, 200) * 4 - 2
+        svals = self.uni.basis_functions.evaluate(xs, ys, zs)
+        cvals = BasisFunctions(cart, cartp=False)._evaluate_gau_mag(xs, ys, zs)
+        tmat, _ = car2sph_transform(corder, sphr)
+        self.assertTrue(np.allclose(tmat.T.dot(cvals), svals))
+        # Orbitals of cartesian coefficients before and after the transform
+        csph = self.uni.momatrix.square().values
+        ccart = tmat.dot(csph)
+        nbas, norb = ccart.shape
+        uni = _Uni(basis_set_order=corder, sphr_basis_set_order=sphr,
+                   momatrix=MOMatrix(pd.DataFrame({
+                       'chi': np.tile(range(nbas), norb),
+                       'orbital': np.repeat(range(norb), nbas),
+                       'coef': ccart.ravel(order='F'), 'frame': 0})))
+        after = car2sph_matrices(uni)['momatrix'].square().values
+        self.assertTrue(np.allclose(after, csph))
+        self.assertTrue(np.allclose(ccart.T.dot(cvals), after.T.dot(svals)))
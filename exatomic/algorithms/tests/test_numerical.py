@@ -1,6 +1,95 @@
 # -*- coding: utf-8 -*-
 # Copyright (c) 2015-2018, Exa Analytics Development Team
 # Distributed under the terms of the Apache License 2.0
+import numpy as np
+import pandas as pd
+from unittest import TestCase
+from exatomic.core.basis import Overlap
+from exatomic.core.orbital import MOMatrix
+from exatomic.algorithms.numerical import (_index_map, reorder_matrix,
+                                           reorder_matrices,
+                                           _screen_shell_points)
+
+
+class _Uni(object):
+    """Minimal stand-in for a universe with matrix tables."""
+    def __init__(self, order, **tables):
+        self.current_basis_set_order = pd.DataFrame(
+            order, columns=['center', 'L', 'ml', 'shell'])
+        for name, tbl in tables.items():
+            setattr(self, '_' + name, tbl)
+            setattr(self, name, tbl)
+
+
+class TestReorder(TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.old = np.array([(c, L, ml, s) for c in range(3) for L in range(3)
+                             for ml in range(-L, L + 1) for s in range(2)])
+        self.perm = rng.permutation(len(self.old))
+        n = len(self.old)
+        self.cmat = rng.rand(n, n)
+        smat = rng.rand(n, n)
+        self.smat = smat + smat.T
+        momat = MOMatrix(pd.DataFrame({'chi': np.tile(range(n), n),
+                                       'orbital': np.repeat(range(n), n),
+                                       'coef': self.cmat.ravel(order='F'),
+                                       'frame': 0}))
+        self.uni = _Uni(self.old, momatrix=momat,
+                        overlap=Overlap.from_square(self.smat))
+        self.ref = _Uni(self.old[self.perm])
+
+    def test_index_map(self):
+        self.assertTrue(np.array_equal(
+            _index_map(self.old, self.old[self.perm]), self.perm))
+        with self.assertRaises(ValueError):
+            _index_map(self.old[:-1], self.old)
+        # index ranges whose mixed radix key overflows int64
+        big = self.old * np.array([1, 1, 2 ** 20, 2 ** 40])
+        self.assertTrue(np.array_equal(
+            _index_map(big, big[self.perm]), self.perm))
+
+    def test_reorder_matrices(self):
+        ix = np.ix_(self.perm, self.perm)
+        tables = reorder_matrices(self.uni, self.ref)
+        self.assertEqual(list(tables), ['momatrix', 'overlap'])
+        self.assertTrue(np.allclose(tables['momatrix'].square().values,
+                                    self.cmat[self.perm]))
+        self.assertTrue(np.allclose(tables['overlap'].square().values,
+                                    self.smat[ix]))
+        self.assertTrue(np.allclose(
+            reorder_matrix(self.uni, self.ref, attr='overlap').values,
+            self.smat[ix]))
+        self.assertTrue(np.allclose(
+            reorder_matrix(self.uni, self.ref).values, self.cmat[ix]))
+
+
+class TestScreen(TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        # A dense cluster and a few far away points
+        self.xyz = np.vstack([rng.rand(200, 3), rng.rand(5, 3) * 1e4])
+        self.sxyz = rng.rand(4, 3)
+        self.cuts = np.array([0.2, 0.5, 0.0, 1e4])
+
+    def _check(self, xyz, edge):
+        sptr, spts = _screen_shell_points(xyz[:, 0], xyz[:, 1], xyz[:, 2],
+                                          self.sxyz, self.cuts, edge)
+        self.assertEqual(len(sptr), len(self.cuts) + 1)
+        for s, cut in enumerate(self.cuts):
+            dist = np.linalg.norm(xyz - self.sxyz[s], axis=1)
+            chk = np.flatnonzero(dist <= cut)
+            self.assertTrue(np.array_equal(np.sort(spts[sptr[s]:sptr[s + 1]]),
+                                           chk))
+
+    def test_screen_shell_points(self):
+        self._check(self.xyz, 0.1)
+        # A tiny edge over a huge extent must not allocate a huge cell grid
+        self._check(self.xyz, 1e-6)
+
+    def test_no_points(self):
+        self._check(np.empty((0, 3)), 0.1)
+
 
 # from ..numerical import fac, fac2, dfac21, _CFunction, _SFunction
 #
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2018, Exa Analytics Development Team
+# Distributed under the terms of the Apache License 2.0
+"""Tests for adaptive octree grids."""
+import numpy as np
+import pandas as pd
+from unittest import TestCase
+from exatomic.algorithms.octree import OctreeGrid
+
+
+def _fps(n=49, o=-6.):
+    d = -2 * o / (n - 1)
+    return pd.Series({'ox': o, 'oy': o, 'oz': o, 'nx': n, 'ny': n, 'nz': n,
+                      'dxi': d, 'dyj': d, 'dzk': d, 'fx': -o, 'fy': -o, 'fz': -o})
+
+
+def _grid(fps):
+    x = fps.ox + np.arange(fps.nx) * fps.dxi
+    y = fps.oy + np.arange(fps.ny) * fps.dyj
+    z = fps.oz + np.arange(fps.nz) * fps.dzk
+    return [a.ravel() for a in np.meshgrid(x, y, z, indexing='ij')]
+
+
+class TestOctreeGrid(TestCase):
+    def setUp(self):
+        self.fps = _fps()
+        self.atoms = np.array([[0., 0., 0.], [1.5, 0., 0.], [-1., 1.25, 0.5]])
+
+    def gaussians(self, x, y, z):
+        vals = np.zeros((2, len(x)))
+        for i, (ax, ay, az) in enumerate(self.atoms):
+            r2 = (x - ax) ** 2 + (y - ay) ** 2 + (z - az) ** 2
+            vals[0] += np.exp(-1.5 * r2)
+            vals[1] += (x - ax) * np.exp(-0.8 * r2)
+        return vals
+
+    def test_linear(self):
+        func = lambda x, y, z: 1. + 2. * x - y + 0.5 * z
+        tree = OctreeGrid.from_field_params(self.fps, func)
+        x, y, z = _grid(self.fps)
+        self.assertTrue((tree.levels == 0).all())
+        self.assertTrue(np.allclose(tree.resample(x, y, z)[0], func(x, y, z)))
+
+    def test_adaptive(self):
+        tree = OctreeGrid.from_field_params(self.fps, self.gaussians,
+                                            atoms=self.atoms, tol=3e-4)
+        x, y, z = _grid(self.fps)
+        self.assertLess(tree.npts, 0.2 * len(x))
+        vals = tree.resample(x, y, z)
+        self.assertEqual(vals.shape, (2, len(x)))
+        self.assertLess(np.abs(vals - self.gaussians(x, y, z)).max(), 5e-3)
+        # Nuclei lie on the finest lattice, where values are exact
+        nuc = tree.resample(*self.atoms.T)
+        self.assertTrue(np.allclose(nuc, self.gaussians(*self.atoms.T)))
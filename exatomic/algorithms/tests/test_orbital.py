@@ -3,13 +3,37 @@
 # Distributed under the terms of the Apache License 2.0
 """Tests for computing orbitals, densities and orbital angular momenta."""
 import numpy as np
+import pandas as pd
 from unittest import TestCase
 from exatomic import Universe, nwchem, molcas
 from exatomic.base import resource
-from exatomic.algorithms.orbital_util import compare_fields
+from exatomic.algorithms.orbital_util import (compare_fields, line_points,
+                                              numerical_grid_from_field_params,
+                                              _current_density_matrix,
+                                              _compute_current_density)
 from exatomic.algorithms.orbital import (add_molecular_orbitals,
                                          add_orb_ang_mom,
-                                         add_density)
+                                         add_density,
+                                         add_density_from_matrix,
+                                         orbital_values, density_values)
+
+
+class TestCurrentDensity(TestCase):
+
+    def test_compute_current_density(self):
+        rng = np.random.RandomState(0)
+        nbf, npts = 6, 11
+        cmatr, cmati = rng.rand(2, nbf, nbf)
+        kmat = _current_density_matrix(cmatr, cmati, rng.rand(nbf))
+        self.assertTrue(np.allclose(kmat, -kmat.T))
+        bvs, gvx, gvy, gvz = rng.rand(4, nbf, npts)
+        curs = _compute_current_density(bvs, gvx, gvy, gvz, kmat)
+        for cur, gv in zip(curs, (gvx, gvy, gvz)):
+            chk = np.zeros(npts)
+            for mu in range(nbf):
+                for nu in range(nbf):
+                    chk += kmat[mu, nu] * (bvs[mu] * gv[nu] - gv[mu] * bvs[nu])
+            self.assertTrue(np.allclose(cur, chk))
 
 
 class TestMolcasOrbital(TestCase):
@@ -43,6 +67,14 @@ class TestADFOrbital(TestCase):
         res = compare_fields(chk, uni, signed=False, verbose=False)
         self.assertTrue(np.isclose(len(res), sum(res), rtol=5e-4))
 
+    def test_screened(self):
+        chk = Universe.load(resource('adf-lu-valid.hdf5'))
+        uni = Universe.load(resource('adf-lu.hdf5'))
+        uni.add_molecular_orbitals(vector=range(8, 60), verbose=False,
+                                   field_params=chk.field.loc[0], tol=1e-10)
+        res = compare_fields(chk, uni, signed=False, verbose=False)
+        self.assertTrue(np.isclose(len(res), sum(res), rtol=5e-4))
+
 
 class TestNWChemOrbital(TestCase):
 
@@ -55,3 +87,97 @@ class TestNWChemOrbital(TestCase):
         mo.add_molecular_orbitals(vector=range(3, 10), verbose=False)
         res = compare_fields(nw, mo, signed=False, rtol=5e-3)
         self.assertTrue(np.isclose(sum(res), len(res), rtol=5e-3))
+
+    def test_blocks(self):
+        nw = nwchem.Output(resource('nw-ch3nh2-631g.out')).to_universe()
+        fld = nw.add_molecular_orbitals(vector=range(3, 10), verbose=False,
+                                        inplace=False)
+        blk = nw.add_molecular_orbitals(vector=range(3, 10), verbose=False,
+                                        inplace=False, max_memory=0.05)
+        for a, b in zip(fld.field_values, blk.field_values):
+            self.assertTrue(np.allclose(a, b))
+
+    def test_single_precision(self):
+        nw = nwchem.Output(resource('nw-ch3nh2-631g.out')).to_universe()
+        fld = nw.add_molecular_orbitals(vector=range(3, 10), verbose=False,
+                                        inplace=False)
+        sgl = nw.add_molecular_orbitals(vector=range(3, 10), verbose=False,
+                                        inplace=False, dtype=np.float32)
+        scr = nw.add_molecular_orbitals(vector=range(3, 10), verbose=False,
+                                        inplace=False, dtype=np.float32,
+                                        tol=1e-12)
+        for a, b, c in zip(fld.field_values, sgl.field_values,
+                           scr.field_values):
+            self.assertEqual(b.dtype, np.float32)
+            self.assertEqual(c.dtype, np.float32)
+            self.assertTrue(np.allclose(a, b, atol=1e-5))
+            self.assertTrue(np.allclose(a, c, atol=1e-5))
+
+    def test_density_from_matrix(self):
+        nw = nwchem.Output(resource('nw-ch3nh2-631g.out')).to_universe()
+        cmat = nw.current_momatrix.square().values
+        occ = nw.orbital['occupation'].values
+        dmat = np.dot(cmat * occ, cmat.T)
+        rho = add_density(nw, verbose=False, inplace=False)
+        fld = add_density_from_matrix(nw, dmats=[dmat, 0.5 * dmat],
+                                      verbose=False, inplace=False)
+        self.assertTrue(np.allclose(fld.field_values[0], rho.field_values[0]))
+        self.assertTrue(np.allclose(fld.field_values[1], 0.5 * rho.field_values[0]))
+        # Field parameters passed in are left untouched
+        fps = {'rmin': -3., 'rmax': 3., 'nr': 11}
+        chk = dict(fps)
+        rho = add_density(nw, field_params=fps, verbose=False, inplace=False)
+        fld = add_density_from_matrix(nw, dmats=dmat, field_params=fps,
+                                      verbose=False, inplace=False)
+        self.assertEqual(fps, chk)
+        self.assertTrue((fld['frame'] == 0).all())
+        self.assertTrue(np.allclose(fld.field_values[0], rho.field_values[0]))
+
+    def test_dense_momatrix(self):
+        nw = nwchem.Output(resource('nw-ch3nh2-631g.out')).to_universe()
+        cmat = nw.momatrix.square().values
+        nw.dense_momatrix
+        momat = nw.momatrix.copy()
+        momat['coef'] *= 2
+        nw.momatrix = momat
+        self.assertFalse(hasattr(nw, '_dense_momatrix'))
+        self.assertTrue(np.allclose(nw.current_momatrix.square().values,
+                                    2 * cmat))
+        nw.dense_momatrix
+        nw.momatrix.loc[:, 'coef'] *= 0.5
+        self.assertTrue(np.allclose(nw.current_momatrix.square().values, cmat))
+
+    def test_point_values(self):
+        nw = nwchem.Output(resource('nw-ch3nh2-631g.out')).to_universe()
+        fld = nw.add_molecular_orbitals(vector=range(3, 10), verbose=False,
+                                        inplace=False)
+        rho = add_density(nw, verbose=False, inplace=False)
+        x, y, z = numerical_grid_from_field_params(fld.loc[0])
+        idx = np.arange(0, len(x), 97)
+        ovs = orbital_values(nw, x[idx], y[idx], z[idx], vector=range(3, 10))
+        for i, vals in enumerate(ovs):
+            self.assertTrue(np.allclose(vals, fld.field_values[i].values[idx]))
+        dens = density_values(nw, x[idx], y[idx], z[idx])
+        self.assertTrue(np.allclose(dens, rho.field_values[0].values[idx]))
+        x, y, z, t = line_points((0, 0, -2), (0, 0, 2), npts=41)
+        self.assertEqual(orbital_values(nw, x, y, z, vector=5).shape, (1, 41))
+        self.assertTrue(np.isclose(t[-1], 4))
+
+    def test_frames(self):
+        nw = nwchem.Output(resource('nw-ch3nh2-631g.out')).to_universe()
+        atom = pd.DataFrame(nw.atom).copy()
+        atom['frame'] = atom['frame'].astype(np.int64)
+        moved = atom.copy()
+        moved['frame'] = 1
+        moved['x'] += 0.3
+        nw.atom = pd.concat([atom, moved], ignore_index=True)
+        kws = {'vector': range(3, 6), 'verbose': False, 'inplace': False}
+        fld = nw.add_molecular_orbitals(frame=[0, 1], workers=2, **kws)
+        self.assertEqual(len(fld.field_values), 6)
+        self.assertEqual(list(fld['frame'].astype(np.int64)), [0] * 3 + [1] * 3)
+        for frame in (0, 1):
+            one = nw.add_molecular_orbitals(frame=frame, **kws)
+            for i in range(3):
+                self.assertTrue(np.allclose(fld.field_values[3 * frame + i],
+                                            one.field_values[i]))
+        self.assertFalse(np.allclose(fld.field_values[0], fld.field_values[3]))
@@ -6,9 +6,102 @@ import numpy as np
 from unittest import TestCase
 from exatomic.base import resource
 from exatomic.core.basis import Overlap
+from exatomic.algorithms.numerical import (Shell, _triangle, _square,
+                                           _enum_cartesian)
+from exatomic.algorithms.overlap import (shell_pair_overlap,
+                                         shell_pair_integrals,
+                                         _cartesian_shell_pairs,
+                                         _obara_saika, _obara_s_recurr, _nin)
 from exatomic.molcas import Output as MolOutput
 
 
+class TestObaraSaika(TestCase):
+    def test_recursion(self):
+        for pa, pb, p in [(0.3, -0.7, 1.3), (-1.2, 0.4, 0.6), (2., 1.5, 0.2)]:
+            N = np.sqrt(np.pi / p)
+            tbl = np.empty((7, 7))
+            _obara_saika(tbl, 6, 6, pa, pb, p, N)
+            for l in range(7):
+                for m in range(7):
+                    ref = _nin(l, m, pa, pb, p, N)
+                    self.assertTrue(np.isclose(tbl[l, m], ref))
+                    self.assertTrue(np.isclose(
+                        _obara_s_recurr(p, l, m, pa, pb, N), ref))
+
+
+def _quadrature_integrals(ptrs, xyzs, shls, origin, npts=8):
+    """Reference one-electron integrals of cartesian shells from a Gauss-Hermite
+    quadrature (exact for these polynomial times gaussian integrands) of
+    every primitive pair."""
+    t, w = np.polynomial.hermite.hermgauss(npts)
+    grid = np.array(np.meshgrid(t, t, t, indexing='ij')).reshape(3, -1)
+    wts = np.prod(np.array(np.meshgrid(w, w, w, indexing='ij')).reshape(3, -1),
+                  axis=0)
+    funcs = []
+    for ctr, shl in ptrs:
+        coef = shls[shl].norm_contract()
+        for pw in _enum_cartesian(shls[shl].L):
+            for c in range(coef.shape[1]):
+                funcs.append((xyzs[ctr], np.array(pw), shls[shl].alphas,
+                              coef[:, c]))
+    names = ['overlap', 'kinetic', 'dipole_x', 'dipole_y', 'dipole_z',
+             'quadrupole_xx', 'quadrupole_xy', 'quadrupole_xz',
+             'quadrupole_yy', 'quadrupole_yz', 'quadrupole_zz']
+    ref = dict((name, np.zeros((len(funcs), len(funcs)))) for name in names)
+    for i, (ra, pa, alpa, ca) in enumerate(funcs):
+        for j, (rb, pb, alpb, cb) in enumerate(funcs):
+            for a, da in zip(alpa, ca):
+                for b, db in zip(alpb, cb):
+                    p = a + b
+                    rp = (a * ra + b * rb) / p
+                    r = rp[:, np.newaxis] + grid / np.sqrt(p)
+                    pre = (da * db * np.exp(-a * b / p * ((ra - rb) ** 2).sum())
+                           * wts / p ** 1.5)
+                    ua, ub = r - ra[:, np.newaxis], r - rb[:, np.newaxis]
+                    fa = np.prod(ua ** pa[:, np.newaxis], axis=0)
+                    fb = np.prod(ub ** pb[:, np.newaxis], axis=0)
+                    # -1/2 laplacian of the ket, divided by its gaussian
+                    lap = 0.
+                    for d in range(3):
+                        n = pb[d]
+                        d2 = (4 * b * b * ub[d] ** (n + 2)
+                              - 2 * b * (2 * n + 1) * ub[d] ** n)
+                        if n > 1: d2 += n * (n - 1) * ub[d] ** (n - 2)
+                        lap = lap + d2 * np.prod([ub[e] ** pb[e] for e in range(3)
+                                                  if e != d], axis=0)
+                    rc = r - np.asarray(origin)[:, np.newaxis]
+                    ops = [fb, -0.5 * lap, rc[0] * fb, rc[1] * fb, rc[2] * fb,
+                           rc[0] * rc[0] * fb, rc[0] * rc[1] * fb,
+                           rc[0] * rc[2] * fb, rc[1] * rc[1] * fb,
+                           rc[1] * rc[2] * fb, rc[2] * rc[2] * fb]
+                    for name, op in zip(names, ops):
+                        ref[name][i, j] += (pre * fa * op).sum()
+    return ref
+
+
+class TestShellPairIntegrals(TestCase):
+    def setUp(self):
+        f8 = lambda *x: np.array(x, dtype=np.float64)
+        self.shls = np.array([
+            Shell(f8(0.6, 0.5), f8(1.3, 0.4), 2, 1, 0, False, True, None, None),
+            Shell(f8(1.), f8(0.8), 1, 1, 1, False, True, None, None),
+            Shell(f8(0.7, 0.4), f8(1.1, 0.3), 2, 1, 2, False, True, None, None)])
+        self.ptrs = np.array([[0, 0], [0, 1], [1, 0], [1, 1], [1, 2]])
+        self.xyzs = f8([0., 0., 0.], [0.3, -0.5, 0.9])
+        self.origin = f8(0.5, -1., 2.)
+
+    def test_reference(self):
+        ints = shell_pair_integrals(self.ptrs, self.xyzs, self.shls,
+                                    origin=self.origin, tol=0.)
+        ref = _quadrature_integrals(self.ptrs, self.xyzs, self.shls, self.origin)
+        self.assertEqual(list(ints.keys()), list(ref.keys()))
+        for name, vals in ints.items():
+            self.assertTrue(np.allclose(_square(vals), ref[name], atol=1e-10),
+                            name)
+        # Normalized s and p functions
+        self.assertTrue(np.allclose(np.diag(ref['overlap'])[:8], 1.))
+
+
 class TestMolcasOverlap(TestCase):
     def setUp(self):
         dz = MolOutput(resource('mol-carbon-dz.out'))
@@ -35,3 +128,32 @@ class TestMolcasOverlap(TestCase):
                            rtol=5e-5, atol=1e-12).sum() \
                 / (ovls.shape[0] * ovls.shape[1])
             self.assertTrue(n > 0.999)
+
+    def test_shell_pairs(self):
+        for uni in self.unis:
+            ptrs, xyzs, shls = uni.enumerate_shells()
+            ref = _cartesian_shell_pairs(len(uni.basis_functions),
+                                         ptrs.astype(np.int64), xyzs, *shls)
+            sq = shell_pair_overlap(ptrs, xyzs, shls, tol=0., packed=False)
+            self.assertTrue(np.allclose(sq, ref))
+            tri = shell_pair_overlap(ptrs, xyzs, shls)
+            self.assertTrue(np.allclose(tri, _triangle(ref), atol=1e-12))
+
+    def test_one_electron_integrals(self):
+        for uni in self.unis[:2]:
+            ints = uni.basis_functions.one_electron_integrals()
+            ovl = uni.basis_functions.integrals()
+            self.assertTrue(np.allclose(ints['overlap'], ovl['coef']))
+            kin = ints.square(column='kinetic').values
+            self.assertTrue(np.all(np.linalg.eigvalsh(kin) > 0))
+            ptrs, xyzs, shls = uni.enumerate_shells()
+            c = np.array([0.5, -1., 2.])
+            shft = shell_pair_integrals(ptrs, xyzs, shls, kinetic=False,
+                                        origin=c)
+            for i, ax in enumerate('xyz'):
+                dip = ints['dipole_' + ax].values
+                self.assertTrue(np.allclose(shft['dipole_' + ax],
+                                            dip - c[i] * ovl['coef'].values))
+            quad = (ints['quadrupole_xy'] - c[0] * ints['dipole_y']
+                    - c[1] * ints['dipole_x'] + c[0] * c[1] * ovl['coef'])
+            self.assertTrue(np.allclose(shft['quadrupole_xy'], quad))
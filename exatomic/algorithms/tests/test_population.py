@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2018, Exa Analytics Development Team
+# Distributed under the terms of the Apache License 2.0
+"""Tests for Mulliken and Löwdin population analysis."""
+import numpy as np
+import pandas as pd
+from unittest import TestCase
+from exatomic.core.basis import Overlap
+from exatomic.core.orbital import MOMatrix, DenseMOMatrix
+from exatomic.algorithms.population import (orbital_populations,
+                                            atomic_populations,
+                                            orbital_contributions)
+
+
+class _Uni(object):
+    """Minimal stand-in for a universe with MO and overlap tables."""
+    def __init__(self, **tables):
+        for name, tbl in tables.items():
+            setattr(self, name, tbl)
+
+
+class TestPopulations(TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        order = [(c, L) for c in range(3) for L in range(3)
+                 for ml in range(2 * L + 1)]
+        n = len(order)
+        smat = rng.rand(n, n) * 0.1
+        self.smat = smat + smat.T + np.eye(n)
+        vals, vecs = np.linalg.eigh(self.smat)
+        shalf = (vecs / np.sqrt(vals)).dot(vecs.T)
+        self.cmats = [shalf.dot(np.linalg.qr(rng.rand(n, n))[0])
+                      for frame in range(2)]
+        momat = MOMatrix(pd.concat([pd.DataFrame({
+            'chi': np.tile(range(n), n), 'orbital': np.repeat(range(n), n),
+            'coef': cmat.ravel(order='F'), 'frame': frame})
+            for frame, cmat in enumerate(self.cmats)], ignore_index=True))
+        self.occ = np.r_[np.full(4, 2.), np.zeros(n - 4)]
+        self.uni = _Uni(momatrix=momat, overlap=Overlap.from_square(self.smat),
+                        basis_set_order=pd.DataFrame(order,
+                                                     columns=['center', 'L']),
+                        orbital=pd.DataFrame({'occupation': self.occ}))
+        self.order = np.array(order)
+
+    def test_orbital_populations(self):
+        pops = orbital_populations(self.uni, by=['center', 'L'])
+        self.assertEqual(len(pops), 2 * 9 * len(self.order))
+        tot = pops.groupby(['frame', 'orbital'])[['mulliken', 'lowdin']].sum()
+        self.assertTrue(np.allclose(tot.values, 1.))
+        cmat = self.cmats[1]
+        mull = cmat[:, 3] * self.smat.dot(cmat[:, 3])
+        sel = (self.order[:, 0] == 2) & (self.order[:, 1] == 1)
+        row = pops[(pops['frame'] == 1) & (pops['orbital'] == 3) &
+                   (pops['center'] == 2) & (pops['L'] == 1)]
+        self.assertTrue(np.isclose(row['mulliken'].values[0], mull[sel].sum()))
+
+    def test_frame_overlaps(self):
+        smat = self.smat + 0.05 * np.eye(len(self.order))
+        ovls = [Overlap.from_square(self.smat), Overlap.from_square(smat)]
+        ovls[1]['frame'] = 1
+        self.uni.overlap = Overlap(pd.concat(ovls, ignore_index=True))
+        pops = orbital_populations(self.uni, by='chi', lowdin=False)
+        for frame, sq in enumerate([self.smat, smat]):
+            cmat = self.cmats[frame]
+            mull = pops[pops['frame'] == frame]['mulliken'].values
+            chk = (cmat * sq.dot(cmat)).ravel(order='F')
+            self.assertTrue(np.allclose(mull, chk))
+        ovls[1]['frame'] = 2
+        self.uni.overlap = Overlap(pd.concat(ovls, ignore_index=True))
+        with self.assertRaises(ValueError):
+            orbital_populations(self.uni, frame=1)
+
+    def test_atomic_populations(self):
+        pops = atomic_populations(self.uni)
+        self.assertEqual(pops.columns.tolist(),
+                         ['frame', 'center', 'mulliken', 'lowdin'])
+        self.assertTrue(np.allclose(pops.groupby('frame')['mulliken'].sum(), 8.))
+        self.assertTrue(np.allclose(pops.groupby('frame')['lowdin'].sum(), 8.))
+        self.uni._dense_momatrix = DenseMOMatrix.from_momatrix(self.uni.momatrix)
+        dense = atomic_populations(self.uni, frame=1)
+        self.assertTrue(np.allclose(dense['mulliken'].values,
+                                    pops[pops['frame'] == 1]['mulliken'].values))
+        # Dense coefficients are dropped once their source table is edited
+        self.uni.momatrix.loc[:, 'coef'] *= 2
+        edit = atomic_populations(self.uni, frame=1)
+        self.assertFalse(hasattr(self.uni, '_dense_momatrix'))
+        self.assertTrue(np.allclose(edit['mulliken'].values,
+                                    4 * dense['mulliken'].values))
+        with self.assertRaises(ValueError):
+            atomic_populations(self.uni, orbocc=self.occ[:-1])
+
+    def test_orbital_contributions(self):
+        weights = np.square(self.cmats[0])
+        weights /= weights.sum(axis=0)
+        con = orbital_contributions(self.uni, topk=3, tol=0., frame=0)
+        self.assertEqual(len(con), 3 * len(self.order))
+        top = con[con['orbital'] == 5]
+        chk = np.argsort(-weights[:, 5])[:3]
+        self.assertTrue(np.array_equal(top['chi'].values, chk))
+        self.assertTrue(np.array_equal(top['rank'].values, [0, 1, 2]))
+        self.assertTrue(np.allclose(top['coef'].values, self.cmats[0][chk, 5]))
+        self.assertTrue(np.array_equal(top['center'].values,
+                                       self.order[chk, 0]))
+        grp = orbital_contributions(self.uni, by=['center', 'L'], tol=0.05)
+        self.assertTrue((grp['weight'] > 0.05).all())
+        one = grp[(grp['frame'] == 1) & (grp['orbital'] == 2)]
+        sel = (self.order[:, 0] == one['center'].values[0]) & \
+              (self.order[:, 1] == one['L'].values[0])
+        wgt = np.square(self.cmats[1][:, 2])
+        self.assertTrue(np.isclose(one['weight'].values[0],
+                                   wgt[sel].sum() / wgt.sum()))
+        self.assertTrue(np.all(np.diff(one['weight'].values) <= 0))
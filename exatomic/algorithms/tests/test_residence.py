@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2018, Exa Analytics Development Team
+# Distributed under the terms of the Apache License 2.0
+"""Tests for residence time correlation functions."""
+import numpy as np
+import pandas as pd
+from unittest import TestCase
+from exatomic.algorithms.residence import (occupancy_matrix,
+                                           intermittent_correlation,
+                                           continuous_correlation)
+
+
+def _brute_force(occ, continuous):
+    npair, nframe = occ.shape
+    corr = np.zeros(nframe)
+    for t in range(nframe):
+        tot = 0.
+        for t0 in range(nframe - t):
+            if continuous:
+                tot += occ[:, t0:t0 + t + 1].all(axis=1).sum()
+            else:
+                tot += (occ[:, t0] & occ[:, t0 + t]).sum()
+        corr[t] = tot / (nframe - t)
+    return corr / corr[0]
+
+
+class _Atom(pd.DataFrame):
+    """Atom table stand-in providing per frame atom labels."""
+    @property
+    def _constructor(self):
+        return _Atom
+
+    def get_atom_labels(self):
+        return self.groupby('frame').cumcount().astype('category')
+
+
+class _Uni(object):
+    """Three frames of (Na, O, O) with hand-picked pair distances."""
+    def __init__(self):
+        self.atom = _Atom.from_dict({'symbol': ['Na', 'O', 'O'] * 3,
+                                     'frame': np.repeat([0, 1, 2], 3)})
+        # (Na, O1), (Na, O2), (O1, O2) in each frame
+        atom0 = np.array([0, 0, 1, 3, 3, 4, 6, 6, 7])
+        atom1 = np.array([1, 2, 2, 4, 5, 5, 7, 8, 8])
+        dist = np.array([2.0, 7.0, 3.0, 2.5, 5.0, 9.0, 8.0, 4.0, 1.0])
+        self.atom_two = pd.DataFrame.from_dict({'atom0': atom0, 'atom1': atom1,
+                                                'distance': dist})
+
+
+class TestOccupancy(TestCase):
+    def setUp(self):
+        self.uni = _Uni()
+
+    def test_symbols(self):
+        pairs, occ = occupancy_matrix(self.uni, 'Na', 'O', 6.0)
+        self.assertEqual(pairs['label0'].tolist(), [0, 0])
+        self.assertEqual(pairs['label1'].tolist(), [1, 2])
+        self.assertTrue(np.array_equal(occ, [[True, True, False],
+                                             [False, True, True]]))
+        self.assertNotIn('label', self.uni.atom.columns)
+
+    def test_labels(self):
+        pairs, occ = occupancy_matrix(self.uni, 0, [1, 2], 6.0)
+        chk = occupancy_matrix(self.uni, 'Na', 'O', 6.0)[1]
+        self.assertTrue(np.array_equal(occ, chk))
+        self.assertNotIn('label', self.uni.atom.columns)
+
+    def test_same_selection(self):
+        pairs, occ = occupancy_matrix(self.uni, 'O', 'O', 6.0)
+        self.assertEqual(pairs.values.tolist(), [[1, 2]])
+        self.assertTrue(np.array_equal(occ, [[True, False, True]]))
+
+
+class TestResidence(TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.occ = np.random.rand(7, 40) > 0.3
+        self.occ[0] = True
+        self.occ[1] = False
+
+    def test_intermittent(self):
+        chk = _brute_force(self.occ, False)
+        self.assertTrue(np.allclose(intermittent_correlation(self.occ), chk))
+
+    def test_continuous(self):
+        chk = _brute_force(self.occ, True)
+        self.assertTrue(np.allclose(continuous_correlation(self.occ), chk))
+
+    def test_empty(self):
+        occ = np.zeros((3, 10), dtype=bool)
+        self.assertTrue(np.allclose(continuous_correlation(occ), 0))
+        self.assertTrue(np.allclose(intermittent_correlation(occ), 0))
@@ -21,9 +21,12 @@ from io import StringIO
 from exa import DataFrame
 from exatomic.algorithms.basis import cart_lml_count, spher_lml_count
 from exatomic.algorithms.numerical import _tri_indices, _square, Shell
+from exatomic.algorithms.overlap import _unique_shell_arrays
+from .matrices import (_MatrixCache, _block_square, _frozen_square,
+                       _packed_index)
 
 
-class BasisSet(DataFrame):
+class BasisSet(_MatrixCache, DataFrame):
     """
     Stores information about a basis set. Common basis set types in use for
     electronic structure calculations usually consist of Gaussians or Slater
@@ -80,7 +83,11 @@ class BasisSet(DataFrame):
     def shells(self, program='', spherical=True, gaussian=True):
         """
         Generate a multi-index series of :class:`~exatomic.algorithms.numerical.Shell`
-        in the basis set, indexed by set and L.
+        in the basis set, indexed by set and L. Shells are compiled once
+        per (program, spherical, gaussian) and cached until a column of
+        the basis set is changed (see
+        :class:`~exatomic.core.matrices._MatrixCache`). Every call returns
+        copies of the cached shells, which may be modified freely.
 
         Args:
             program (str): which code the basis set comes from
@@ -88,26 +95,51 @@ class BasisSet(DataFrame):
             gaussian (bool): exponential dependence of basis functions
 
         Returns:
-            srs (pd.Series): multi-indexed by set and L
+            shls (pd.DataFrame): set, L and the shell (column 0)
         """
-        def _shell_gau(df):
-            col = ('alpha', 'shell', 'd')
-            alphas = df.alpha.unique()
-            piv = df.pivot(*col).loc[alphas].fillna(0.)
-            nprim, ncont = piv.shape
-            return Shell(piv.values.flatten(), alphas, nprim, ncont, df.L.values[0],
-                         df.norm.values[0], gaussian, None, None)
-        def _shell_sto(df):
-            col = ('alpha', 'shell', 'd')
-            alphas = df.alpha.unique()
-            piv = df.pivot(*col).loc[alphas].fillna(0.)
-            nprim, ncont = piv.shape
-            return Shell(piv.values.flatten(), alphas, nprim, ncont, df.L.values[0],
-                         df.norm.values[0], gaussian, df.r.values, df.n.values)
-        self.spherical_by_shell(program, spherical)
-        if gaussian:
-            return self.groupby(['set', 'L']).apply(_shell_gau).reset_index()
-        return self.groupby(['set', 'L']).apply(_shell_sto).reset_index()
+        def _shells():
+            cols = ['set', 'L', 'alpha', 'shell', 'd']
+            if not gaussian: cols += ['r', 'n']
+            df = pd.DataFrame(self[cols])
+            df['L'] = df['L'].astype(np.int64)
+            df['norm'] = self._shell_norms(program, spherical, df['L'])
+            shls = []
+            for (seht, L), grp in df.groupby(['set', 'L']):
+                alphas = grp['alpha'].unique()
+                piv = grp.pivot(index='alpha', columns='shell',
+                                values='d').loc[alphas].fillna(0.)
+                nprim, ncont = piv.shape
+                rs, ns = (None, None) if gaussian else \
+                         (grp['r'].values, grp['n'].values)
+                shls.append((seht, L, Shell(piv.values.flatten(), alphas,
+                             nprim, ncont, L, grp['norm'].values[0],
+                             gaussian, rs, ns)))
+            return pd.DataFrame(shls, columns=['set', 'L', 0])
+        shls = self._cached(('shells', program, spherical, gaussian),
+                            _shells).copy()
+        shls[0] = [_copy_shell(shl) for shl in shls[0]]
+        return shls
+
+    def shell_arrays(self, program='', spherical=True, gaussian=True):
+        """
+        Struct of arrays form of :meth:`~exatomic.core.basis.BasisSet.shells`
+        (one entry per row, see
+        :func:`~exatomic.algorithms.overlap._unique_shell_arrays`), usable
+        directly by the numba kernels. Cached like the shells; the arrays
+        are read only.
+        """
+        def _arrays():
+            shls = self.shells(program, spherical, gaussian)
+            arrs = _unique_shell_arrays(shls[0].values)
+            for arr in arrs: arr.flags.writeable = False
+            return arrs
+        return self._cached(('shell_arrays', program, spherical, gaussian),
+                            _arrays)
+
+    @staticmethod
+    def _shell_norms(program, spherical, L):
+        if program in ['molcas', 'nwchem']: return L > 1
+        return pd.Series(spherical, index=L.index)
 
     def spherical_by_shell(self, program, spherical=True):
         """Allows for some flexibility in treating shells either as
@@ -117,10 +149,7 @@ class BasisSet(DataFrame):
             program (str): which code the basis set comes from
         """
         self['L'] = self['L'].astype(np.int64)
-        if program in ['molcas', 'nwchem']:
-            self['norm'] = self['L'].apply(lambda L: L > 1)
-        else:
-            self['norm'] = spherical
+        self['norm'] = self._shell_norms(program, spherical, self['L'])
         self['L'] = self['L'].astype('category')
 
     def functions_by_shell(self):
@@ -162,6 +191,14 @@ class BasisSet(DataFrame):
         #self.gaussian = gaussian
 
 
+def _copy_shell(shl):
+    """A :class:`~exatomic.algorithms.numerical.Shell` sharing no arrays with shl."""
+    rs = None if shl.rs is None else shl.rs.copy()
+    ns = None if shl.ns is None else shl.ns.copy()
+    return Shell(shl._coef.copy(), shl.alphas.copy(), shl.nprim, shl.ncont,
+                 shl.L, shl.spherical, shl.gaussian, rs, ns)
+
+
 def deduplicate_basis_sets(sets, sp=False):
     """Deduplicate identical basis sets on different centers.
 
@@ -251,7 +288,7 @@ class BasisSetOrder(DataFrame):
     _categories = {'L': np.int64}
 
 
-class Overlap(DataFrame):
+class Overlap(_MatrixCache, DataFrame):
     """
     Overlap enumerates the overlap matrix elements between basis functions in
     a contracted basis set. Currently nothing disambiguates between the
@@ -277,8 +314,16 @@ class Overlap(DataFrame):
     _index = 'index'
 
 
+    def _frame_slice(self, frame):
+        if 'frame' in self.columns:
+            frames = self['frame'].astype(np.int64)
+            if frames.nunique() > 1: return self[frames == frame]
+        return self
+
     def square(self, frame=0, column='coef', mocoefs=None, irrep=None):
-        """Return a 'square' matrix DataFrame of the Overlap.
+        """Return a 'square' matrix DataFrame of the Overlap. The square
+        is memoized (see :class:`~exatomic.core.matrices._MatrixCache`)
+        and a writeable copy of it is returned.
 
         Args:
             column (str): column of coefficients to reshape
@@ -287,27 +332,31 @@ class Overlap(DataFrame):
             irrep (int): irreducible representation if symmetrized
         """
         if mocoefs is not None: column = mocoefs
-        if 'irrep' in self.columns:
-            if irrep is None:
-                irreps, i, j = self.groupby('irrep'), 0, 0
-                norb = (irreps.chi0.max() + 1).sum()
-                nchi = (irreps.chi1.max() + 1).sum()
-                cmat = np.zeros((nchi, norb))
-                for irrep, grp in irreps:
-                    piv = grp.pivot('chi0', 'chi1', column)
-                    ii, jj = piv.shape
-                    cmat[i : i + ii, j : j + jj] = piv.values
-                    i += ii
-                    j += jj
-                idx = pd.Index(range(nchi), name='chi0')
-                orb = pd.Index(range(norb), name='chi1')
-                return pd.DataFrame(cmat, index=idx, columns=orb)
-            return self.groupby('irrep').get_group(irrep
-                        ).pivot('chi', 'orbital', column)
-        sq = _square(self[column].values)
-        idx = pd.Index(range(sq.shape[0]), name='chi0')
-        orb = pd.Index(range(sq.shape[1]), name='chi1')
-        return pd.DataFrame(sq, index=idx, columns=orb)
+        def _sq():
+            df = self._frame_slice(frame)
+            if 'irrep' in df.columns:
+                if irrep is not None: df = df[df['irrep'] == irrep]
+                return _frozen_square(_block_square(
+                    df['chi0'].values, df['chi1'].values, df[column].values,
+                    blocks=df['irrep'].values, symmetric=True))
+            return _frozen_square(_square(df[column].values))
+        return self._cached(('square', frame, column, irrep), _sq).copy()
+
+    def packed(self, frame=0, column='coef', irrep=None):
+        """Return the row major packed lower triangle of the Overlap
+        (memoized like :meth:`~exatomic.core.basis.Overlap.square`)."""
+        def _packed():
+            df = self._frame_slice(frame)
+            if 'irrep' in df.columns:
+                sq = self.square(frame=frame, column=column, irrep=irrep).values
+                tri = sq[np.tril_indices(len(sq))]
+            else:
+                tri = np.empty(len(df), dtype=np.float64)
+                tri[_packed_index(df['chi0'].values, df['chi1'].values)] = \
+                    df[column].values
+            tri.flags.writeable = False
+            return tri
+        return self._cached(('packed', frame, column, irrep), _packed)
 
     @classmethod
     def from_column(cls, source):
@@ -330,17 +379,10 @@ class Overlap(DataFrame):
 
     @classmethod
     def from_square(cls, df):
-        ndim = df.shape[0]
+        """Create an Overlap from the lower triangle of a square matrix."""
         try: arr = df.values
-        except AttributeError: arr = df
-        arlen = ndim * (ndim + 1) // 2
-        ret = np.empty((arlen,), dtype=[('chi0', 'i8'),
-                                        ('chi1', 'i8'),
-                                        ('coef', 'f8'),
-                                        ('frame', 'i8')])
-        cnt = 0
-        for i in range(ndim):
-            for j in range(i + 1):
-                ret[cnt] = (i, j, arr[i, j], 0)
-                cnt += 1
-        return cls(ret)
+        except AttributeError: arr = np.asarray(df)
+        chi0, chi1 = np.tril_indices(arr.shape[0])
+        return cls(pd.DataFrame.from_dict({'chi0': chi0, 'chi1': chi1,
+                                           'coef': arr[chi0, chi1],
+                                           'frame': 0}))
@@ -6,7 +6,6 @@ Matrices
 #############
 For handling matrices of common dimensionality in QM calcs.
 """
-
 import numpy as np
 import pandas as pd
 from exa import DataFrame
@@ -58,6 +57,128 @@ def _square_to_square(ix0, ix1, values):
         square[i, j] = val
     return square
 
+def _packed_index(idx0, idx1):
+    """Position of matrix elements in the row major packed lower triangle."""
+    row = np.maximum(idx0, idx1)
+    col = np.minimum(idx0, idx1)
+    return row * (row + 1) // 2 + col
+
+def _block_square(idx0, idx1, values, blocks=None, symmetric=False):
+    """
+    Scatter matrix elements into a dense array in a single vectorized
+    assignment (rather than pivoting). If block labels (e.g. irreps) are
+    given, indices are local to each block and the blocks are placed
+    along the diagonal in sorted label order.
+    """
+    idx0 = np.asarray(idx0, dtype=np.int64)
+    idx1 = np.asarray(idx1, dtype=np.int64)
+    if blocks is None:
+        shape = [idx0.max() + 1, idx1.max() + 1]
+    else:
+        labels, inv = np.unique(np.asarray(blocks), return_inverse=True)
+        n0 = np.zeros(len(labels), dtype=np.int64)
+        n1 = np.zeros(len(labels), dtype=np.int64)
+        np.maximum.at(n0, inv, idx0 + 1)
+        np.maximum.at(n1, inv, idx1 + 1)
+        if symmetric: n0 = n1 = np.maximum(n0, n1)
+        idx0 = idx0 + np.cumsum(n0)[inv] - n0[inv]
+        idx1 = idx1 + np.cumsum(n1)[inv] - n1[inv]
+        shape = [n0.sum(), n1.sum()]
+    if symmetric: shape = [max(shape)] * 2
+    square = np.zeros(shape, dtype=np.float64)
+    square[idx0, idx1] = values
+    if symmetric: square[idx1, idx0] = values
+    return square
+
+def _frozen_square(square, idx0='chi0', idx1='chi1'):
+    """Wrap a (read only) square array in a labeled DataFrame."""
+    square.flags.writeable = False
+    return pd.DataFrame(square, index=pd.Index(range(square.shape[0]), name=idx0),
+                        columns=pd.Index(range(square.shape[1]), name=idx1))
+
+
+class _CacheIndexer(object):
+    """Wraps a pandas indexer (loc, iloc, at, iat) so that assignments
+    through it invalidate the matrix cache of the table."""
+    def __init__(self, obj, indexer):
+        self._obj = obj
+        self._indexer = indexer
+
+    def __call__(self, *args, **kwargs):
+        return _CacheIndexer(self._obj, self._indexer(*args, **kwargs))
+
+    def __getitem__(self, key):
+        return self._indexer[key]
+
+    def __setitem__(self, key, value):
+        self._obj._bump_version()
+        self._indexer[key] = value
+
+    def __getattr__(self, name):
+        return getattr(self._indexer, name)
+
+
+def _cache_indexer(name):
+    def _indexer(self):
+        return _CacheIndexer(self, getattr(super(_MatrixCache, self), name))
+    _indexer.__name__ = name
+    return property(_indexer)
+
+
+class _MatrixCache(object):
+    """
+    Memoizes the dense forms (square and packed lower triangle) of a
+    matrix table by (form, frame, column, irrep), so that repeated
+    calculations do not rebuild them. Cached arrays are read only;
+    public square methods return writeable copies. Entries are tied to
+    a version counter of the table, bumped by setting, inserting or
+    deleting columns, by assignments through .loc, .iloc, .at and .iat
+    and by inplace methods (sort_values, fillna, ...). Edits made
+    directly to the underlying arrays (e.g. through .values) are not
+    seen; call clear_cache after them.
+    """
+    _matrix_cache = None
+    _matrix_version = 0
+
+    loc = _cache_indexer('loc')
+    iloc = _cache_indexer('iloc')
+    at = _cache_indexer('at')
+    iat = _cache_indexer('iat')
+
+    def _bump_version(self):
+        object.__setattr__(self, '_matrix_version', self._matrix_version + 1)
+
+    def _cached(self, key, func):
+        version = self._matrix_version
+        if self._matrix_cache is None or self._matrix_cache[0] != version:
+            object.__setattr__(self, '_matrix_cache', (version, {}))
+        cache = self._matrix_cache[1]
+        try: return cache[key]
+        except KeyError: pass
+        cache[key] = obj = func()
+        return obj
+
+    def clear_cache(self):
+        """Discard all memoized square and packed matrices (and mark the table as edited)."""
+        self._bump_version()
+        object.__setattr__(self, '_matrix_cache', None)
+
+    def __setitem__(self, key, value):
+        self._bump_version()
+        super(_MatrixCache, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self._bump_version()
+        super(_MatrixCache, self).__delitem__(key)
+
+    def insert(self, *args, **kwargs):
+        self._bump_version()
+        super(_MatrixCache, self).insert(*args, **kwargs)
+
+    def _update_inplace(self, *args, **kwargs):
+        self._bump_version()
+        super(_MatrixCache, self)._update_inplace(*args, **kwargs)
+
 #
 #   Basically the only thing that is exatomic specific currently
 #   is that _symmetric_from_square, _square_from_square return
@@ -65,7 +186,7 @@ def _square_to_square(ix0, ix1, values):
 #   include 'frame' in the generation of the DataFrames.
 #
 
-class _Matrix(DataFrame):
+class _Matrix(_MatrixCache, DataFrame):
     """
     Base class for square and symmetric matrices stored in
     a DataFrame format with matrix indices as columns.
@@ -100,15 +221,25 @@ class _Symmetric(_Matrix):
     #    return _Symmetric
 
     def square(self, column=None):
-        """Return a square DataFrame of the matrix."""
+        """Return a square DataFrame of the matrix (a writeable copy of
+        the memoized square)."""
+        column = self.defaultcolumn if column is None else column
+        idx0, idx1 = self.indices
+        return self._cached(('square', 0, column, None), lambda: _frozen_square(
+            _symmetric_to_square(self[idx0].values, self[idx1].values,
+                                 self[column].values), idx0, idx1)).copy()
+
+    def packed(self, column=None):
+        """Return the row major packed lower triangle of the matrix."""
         column = self.defaultcolumn if column is None else column
         idx0, idx1 = self.indices
-        ret = pd.DataFrame(_symmetric_to_square(self[idx0].values,
-                                                self[idx1].values,
-                                                self[column.values]))
-        ret.index.name = idx0
-        ret.columns.name = idx1
-        return ret
+        def _packed():
+            tri = np.empty(len(self), dtype=np.float64)
+            tri[_packed_index(self[idx0].values, self[idx1].values)] = \
+                self[column].values
+            tri.flags.writeable = False
+            return tri
+        return self._cached(('packed', 0, column, None), _packed)
 
     @classmethod
     def from_square(cls, square, column=None):
@@ -131,15 +262,13 @@ class _Square(_Matrix):
     #    return _Square
 
     def square(self, column=None):
-        """Return a square DataFrame of the square matrix."""
+        """Return a square DataFrame of the square matrix (a writeable
+        copy of the memoized square)."""
         column = self.defaultcolumn if column is None else column
         idx0, idx1 = self.indices
-        ret = pd.DataFrame(_square_to_square(self[idx0].values,
-                                             self[idx1].values,
-                                             self[column].values))
-        ret.index.name = idx0
-        ret.columns.name = idx1
-        return ret
+        return self._cached(('square', 0, column, None), lambda: _frozen_square(
+            _square_to_square(self[idx0].values, self[idx1].values,
+                              self[column].values), idx0, idx1)).copy()
 
     @classmethod
     def from_square(cls, square, column=None):
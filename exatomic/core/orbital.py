@@ -17,18 +17,26 @@ matrix as one would write it out. This table should have dimensions
 N_basis_functions * N_basis_functions. The DensityMatrix table stores
 a triangular matrix in columnar format and contains a similar square()
 method to return the matrix as we see it on a piece of paper.
+
+The DenseMOMatrix holds the same coefficients as one contiguous array
+per coefficient column, frame and irrep; its square() returns a view
+of the stored array and the columnar MOMatrix is only built on request.
 """
 from __future__ import absolute_import
 from __future__ import print_function
 from __future__ import division
+from collections import OrderedDict
+import six
 import numpy as np
 import pandas as pd
 from exa import DataFrame
 from exa.util.units import Energy
 from exatomic.algorithms.numerical import (density_from_momatrix,
-                                           density_as_square)
+                                           density_as_square, _packed_density)
                                            #momatrix_as_square)
 from exatomic.core.field import AtomicField
+from exatomic.core.matrices import (_MatrixCache, _block_square,
+                                    _frozen_square, _packed_index)
 
 
 class _Convolve(DataFrame):
@@ -327,7 +335,7 @@ class Excitation(_Convolve):
         return cls(tdm.reset_index())
 
 
-class MOMatrix(DataFrame):
+class MOMatrix(_MatrixCache, DataFrame):
     """
     The MOMatrix is the result of solving a quantum mechanical eigenvalue
     problem in a finite basis set. Individual columns are eigenfunctions
@@ -374,29 +382,213 @@ class MOMatrix(DataFrame):
     def square(self, frame=0, column='coef', mocoefs=None, irrep=None):
         """
         Returns a square dataframe corresponding to the canonical C matrix
-        representation.
+        representation. If coefficients are stored for multiple frames,
+        those of the given frame are returned. For symmetry blocked
+        coefficients and irrep None, the block diagonal matrix of all
+        irreps is returned. The square is memoized (see
+        :class:`~exatomic.core.matrices._MatrixCache`) and a writeable
+        copy of it is returned.
+        """
+        if mocoefs is None: mocoefs = column
+        def _sq():
+            df = self
+            if 'frame' in self.columns:
+                frames = self['frame'].astype(np.int64)
+                if frames.nunique() > 1: df = self[frames == frame]
+            blocks = None
+            if 'irrep' in df.columns:
+                if irrep is not None: df = df[df['irrep'] == irrep]
+                blocks = df['irrep'].values
+            return _frozen_square(_block_square(
+                df['chi'].values, df['orbital'].values, df[mocoefs].values,
+                blocks=blocks), 'chi', 'orbital')
+        return self._cached(('square', frame, mocoefs, irrep), _sq).copy()
+
+
+class DenseMOMatrix(object):
+    """
+    Dense storage of molecular orbital coefficients. Each coefficient
+    column, frame and irrep is kept as a contiguous (nchi, norb) array, so
+    :meth:`~exatomic.core.orbital.DenseMOMatrix.square` wraps the stored
+    array without pivoting or copying. The columnar
+    :class:`~exatomic.core.orbital.MOMatrix` is derived (and cached) only
+    when requested.
+
+    .. code-block:: python
+
+        dense = DenseMOMatrix.from_momatrix(uni.momatrix)
+        dense.square(column='coef')             # view, no pivot
+        dense.to_momatrix()                     # columnar table
+        uni.dense_momatrix = dense              # used by orbital functions
+    """
+    @property
+    def columns(self):
+        """Columns of the equivalent :class:`~exatomic.core.orbital.MOMatrix`."""
+        cols = ['chi', 'orbital'] + self.coefs + ['frame']
+        if self.irreps != [None]: cols.append('irrep')
+        return pd.Index(cols)
+
+    @property
+    def coefs(self):
+        """Names of the coefficient columns."""
+        return list(OrderedDict.fromkeys(key[0] for key in self._blocks))
+
+    @property
+    def frames(self):
+        """Frames for which coefficients are stored."""
+        return sorted(set(key[1] for key in self._blocks))
+
+    @property
+    def irreps(self):
+        """Irreducible representations (None if not symmetry blocked)."""
+        irreps = set(key[2] for key in self._blocks)
+        return [None] if irreps == {None} else sorted(irreps)
+
+    @property
+    def nbytes(self):
+        """Memory used by the coefficient arrays."""
+        return sum(arr.nbytes for arr in self._blocks.values())
+
+    def add(self, arr, column='coef', frame=0, irrep=None):
+        """
+        Store a coefficient matrix (rows are basis functions, columns
+        are orbitals).
+
+        Args:
+            arr (np.ndarray): (nchi, norb) coefficient matrix
+            column (str): name of the coefficient column
+            frame (int): frame index
+            irrep (int): irreducible representation (if symmetry blocked)
+        """
+        self._blocks[(column, int(frame), irrep)] = \
+            np.ascontiguousarray(arr, dtype=np.float64)
+        self._long = None
+        self._source = None
+
+    def is_current(self):
+        """
+        False if the columnar table these coefficients were pivoted from
+        (or derived into) has been edited in place since.
+        """
+        if self._source is None: return True
+        table, version = self._source
+        return getattr(table, '_matrix_version', None) == version
+
+    def matrix(self, frame=0, column='coef', irrep=None):
+        """
+        The coefficient matrix as an array. For symmetry blocked
+        coefficients and irrep None, the block diagonal matrix of all
+        irreps is assembled (a copy); otherwise the stored array is
+        returned.
+        """
+        frames = self.frames
+        if frame not in frames and len(frames) == 1: frame = frames[0]
+        irreps = self.irreps
+        if irreps == [None] or irrep is not None:
+            try: return self._blocks[(column, int(frame), irrep)]
+            except KeyError:
+                raise KeyError('"{}" not stored for frame {} and irrep {}'.format(
+                               column, frame, irrep))
+        blks = [self.matrix(frame, column, irr) for irr in irreps]
+        cmat = np.zeros((sum(b.shape[0] for b in blks),
+                         sum(b.shape[1] for b in blks)))
+        i, j = 0, 0
+        for blk in blks:
+            ii, jj = blk.shape
+            cmat[i : i + ii, j : j + jj] = blk
+            i += ii
+            j += jj
+        return cmat
+
+    def square(self, frame=0, column='coef', mocoefs=None, irrep=None):
+        """
+        Returns a square dataframe corresponding to the canonical C matrix
+        representation; see :meth:`~exatomic.core.orbital.MOMatrix.square`.
         """
         if mocoefs is None: mocoefs = column
-        if 'irrep' in self.columns:
-            if irrep is None:
-                irreps, i, j = self.groupby('irrep'), 0, 0
-                norb = (irreps.orbital.max() + 1).sum()
-                nchi = (irreps.chi.max() + 1).sum()
-                cmat = np.zeros((nchi, norb))
-                for irrep, grp in irreps:
-                    piv = grp.pivot('chi', 'orbital', mocoefs)
-                    ii, jj = piv.shape
-                    cmat[i : i + ii, j : j + jj] = piv.values
-                    i += ii
-                    j += jj
-                return pd.DataFrame(cmat, index=pd.Index(range(nchi), name='chi'),
-                                    columns=pd.Index(range(norb), name='orbital'))
-            return self.groupby('irrep').get_group(irrep
-                        ).pivot('chi', 'orbital', mocoefs)
-        return self.pivot('chi', 'orbital', mocoefs)
-
-
-class DensityMatrix(DataFrame):
+        cmat = self.matrix(frame=frame, column=mocoefs, irrep=irrep)
+        return pd.DataFrame(cmat, copy=False,
+                            index=pd.Index(range(cmat.shape[0]), name='chi'),
+                            columns=pd.Index(range(cmat.shape[1]), name='orbital'))
+
+    def contributions(self, orbital, mocoefs='coef', tol=0.01, frame=0):
+        """
+        Returns all non-negligible basis function contributions to a
+        specific orbital; see :meth:`~exatomic.core.orbital.MOMatrix.contributions`.
+        """
+        vec = self.matrix(frame=frame, column=mocoefs)[:, orbital]
+        chi = np.where(np.abs(vec) > tol)[0]
+        return pd.DataFrame({'chi': chi, 'orbital': orbital,
+                             mocoefs: vec[chi], 'frame': frame})
+
+    def to_momatrix(self):
+        """The coefficients as a columnar :class:`~exatomic.core.orbital.MOMatrix`."""
+        if self._long is not None and self.is_current(): return self._long
+        coefs, irreps, dfs = self.coefs, self.irreps, []
+        for frame in self.frames:
+            for irrep in irreps:
+                nchi, norb = self._blocks[(coefs[0], frame, irrep)].shape
+                df = pd.DataFrame({'chi': np.tile(np.arange(nchi), norb),
+                                   'orbital': np.repeat(np.arange(norb), nchi)})
+                for col in coefs:
+                    df[col] = self._blocks[(col, frame, irrep)].ravel(order='F')
+                df['frame'] = frame
+                if irrep is not None: df['irrep'] = irrep
+                dfs.append(df)
+        self._long = MOMatrix(pd.concat(dfs, ignore_index=True))
+        self._source = (self._long, self._long._matrix_version)
+        return self._long
+
+    @classmethod
+    def from_momatrix(cls, momatrix):
+        """
+        Pivot every coefficient column of a columnar MOMatrix once.
+
+        Args:
+            momatrix (:class:`~exatomic.core.orbital.MOMatrix`): columnar C matrix
+
+        Returns:
+            dense (:class:`~exatomic.core.orbital.DenseMOMatrix`): dense C matrix
+        """
+        dense = cls()
+        skip = ('chi', 'orbital', 'frame', 'irrep')
+        coefs = [col for col in momatrix.columns if col not in skip
+                 and np.issubdtype(momatrix[col].dtype, np.floating)]
+        frame = momatrix['frame'].astype(np.int64) if 'frame' in momatrix.columns else 0
+        df = momatrix.assign(frame=frame)
+        keys = ['frame', 'irrep'] if 'irrep' in df.columns else ['frame']
+        for key, grp in df.groupby(keys):
+            key = key if isinstance(key, tuple) else (key, )
+            frame, irrep = int(key[0]), (key[1] if len(key) > 1 else None)
+            for col in coefs:
+                piv = grp.pivot(index='chi', columns='orbital', values=col)
+                dense.add(piv.values, column=col, frame=frame, irrep=irrep)
+        dense._source = (momatrix, getattr(momatrix, '_matrix_version', None))
+        return dense
+
+    def __repr__(self):
+        return 'DenseMOMatrix(coefs={},frames={},irreps={})'.format(
+            self.coefs, len(self.frames), len(self.irreps))
+
+    def __init__(self):
+        self._blocks = OrderedDict()
+        self._long = None
+        self._source = None
+
+
+def _dense_coefficients(uni):
+    """
+    The dense coefficients of a universe, or None if there are none or
+    the momatrix table they were pivoted from has since been edited (in
+    which case they are dropped).
+    """
+    dense = getattr(uni, '_dense_momatrix', None)
+    if dense is None or dense.is_current(): return dense
+    del uni._dense_momatrix
+    return None
+
+
+class DensityMatrix(_MatrixCache, DataFrame):
     """
     The density matrix in a contracted basis set. As it is
     square symmetric, only n_basis_functions * (n_basis_functions + 1) / 2
@@ -422,13 +614,23 @@ class DensityMatrix(DataFrame):
     #def _constructor(self):
     #    return DensityMatrix
 
-    def square(self, frame=0):
-        """Returns a square dataframe of the density matrix."""
-        denvec = self[self['frame'] == frame]['coef'].values
-        square = pd.DataFrame(density_as_square(denvec))
-        square.index.name = 'chi0'
-        square.columns.name = 'chi1'
-        return square
+    def square(self, frame=0, column='coef'):
+        """Returns a square dataframe of the density matrix (a writeable
+        copy of the memoized square, see
+        :class:`~exatomic.core.matrices._MatrixCache`)."""
+        return self._cached(('square', frame, column, None), lambda: _frozen_square(
+            density_as_square(self[self['frame'] == frame][column].values))).copy()
+
+    def packed(self, frame=0, column='coef'):
+        """Returns the row major packed lower triangle of the density matrix."""
+        def _packed():
+            df = self[self['frame'] == frame]
+            tri = np.empty(len(df), dtype=np.float64)
+            tri[_packed_index(df['chi0'].values, df['chi1'].values)] = \
+                df[column].values
+            tri.flags.writeable = False
+            return tri
+        return self._cached(('packed', frame, column, None), _packed)
 
     @classmethod
     def from_momatrix(cls, momatrix, occvec, mocoefs='coef'):
@@ -439,7 +641,8 @@ class DensityMatrix(DataFrame):
             D_{uv} = \sum_{i}^{N} C_{ui} C_{vi} n_{i}
 
         Args:
-            momatrix (:class:`~exatomic.orbital.MOMatrix`): a C matrix
+            momatrix (:class:`~exatomic.orbital.MOMatrix`): a C matrix (or
+                :class:`~exatomic.orbital.DenseMOMatrix`)
             occvec (:class:`~np.array` or similar): vector of len(C.shape[0])
                 containing the occupations of each molecular orbital.
 
@@ -452,23 +655,64 @@ class DensityMatrix(DataFrame):
                               'coef': dens, 'frame': frame})
 
     @classmethod
-    def from_universe(cls, uni, mocoefs, orbocc):
+    def from_universe(cls, uni, mocoefs='coef', orbocc='occupation',
+                      columns=None, frame=None):
         """
         The density matrix is defined as:
         .. math::
 
             D_{uv} = \sum_{i}^{N} C_{ui} C_{vi} n_{i}
 
+        Several coefficient sets (e.g. alpha, beta and natural orbitals)
+        may be given at once, paired with their occupations; each is
+        stored as a column of the result. Every frame of the MO
+        coefficients is included unless a frame is given.
+
+        .. code-block:: python
+
+            DensityMatrix.from_universe(uni)
+            DensityMatrix.from_universe(uni, ['coef', 'coef1'],
+                                        ['occupation', 'occupation1'])
+
         Args:
             uni (:class:`~exatomic.core.universe.Universe`): a universe containing momatrix and orbital
-            mocoefs (str): column name of C matrix in uni.momatrix
-            orbocc (str): column name of occupation vector in uni.orbital
+            mocoefs (str, list): column name(s) of C matrix in uni.momatrix
+            orbocc (str, array, list): column name(s) of occupation vector
+                in uni.orbital or the occupation vector(s) themselves
+            columns (list): names of the density columns (default 'coef'
+                for a single set, otherwise mocoefs)
+            frame (int): a single frame (default all frames)
 
         Returns:
             ret (:class:`~exatomic.orbital.DensityMatrix`): The density matrix
         """
-        cmat = uni.momatrix.square(mocoefs=mocoefs).values
-        occvec = uni.orbital[orbocc].values
-        chi0, chi1, dens, frame = density_from_momatrix(cmat, occvec)
-        return cls.from_dict({'chi0': chi0, 'chi1': chi1,
-                              'coef': dens, 'frame': frame})
+        single = isinstance(mocoefs, six.string_types)
+        if single: mocoefs, orbocc = [mocoefs], [orbocc]
+        if len(mocoefs) != len(orbocc):
+            raise ValueError('mocoefs and orbocc must be paired')
+        if columns is None: columns = ['coef'] if single else list(mocoefs)
+        momatrix = _dense_coefficients(uni)
+        if momatrix is not None: frames = momatrix.frames
+        else:
+            momatrix = uni.momatrix
+            frames = momatrix['frame'].astype(np.int64).unique().tolist() \
+                     if 'frame' in momatrix.columns else [0]
+        if frame is not None: frames = [frame]
+        orbs = getattr(uni, 'orbital', None)
+        nfrm = orbs['frame'].nunique() \
+               if orbs is not None and 'frame' in orbs.columns else 1
+        dfs = []
+        for fdx in frames:
+            dens = OrderedDict()
+            for col, mocoef, occ in zip(columns, mocoefs, orbocc):
+                if isinstance(occ, six.string_types):
+                    occ = (orbs[orbs['frame'] == fdx] if nfrm > 1
+                           else orbs)[occ].values
+                cmat = momatrix.square(frame=fdx, column=mocoef).values
+                dens[col] = _packed_density(cmat, occ)
+            chi0, chi1 = np.tril_indices(cmat.shape[0])
+            df = pd.DataFrame(OrderedDict([('chi0', chi0), ('chi1', chi1)]))
+            for col, vals in dens.items(): df[col] = vals
+            df['frame'] = fdx
+            dfs.append(df)
+        return cls(pd.concat(dfs, ignore_index=True))
@@ -41,6 +41,35 @@ class TestBasisSet(TestCase):
         self.mbs.shells()
         self.lbs.shells()
 
+    def test_shell_cache(self):
+        shls = self.lbs.shells()
+        self.assertEqual(len(shls), 5)
+        self.assertFalse('norm' in self.lbs.columns)
+        # Callers get their own copies of the cached shells
+        again = self.lbs.shells()[0].values[2]
+        self.assertFalse(again is shls[0].values[2])
+        self.assertTrue(np.array_equal(again.alphas, shls[0].values[2].alphas))
+        shls[0].values[2].alphas[:] = 0.
+        shls[0].values[2].L = 4
+        again = self.lbs.shells()[0].values[2]
+        self.assertEqual(again.L, 2)
+        self.assertFalse(np.allclose(again.alphas, 0.))
+        shls = self.lbs.shells()
+        sl, sprm, alphas, scof, coefs, scnt, sphr = self.lbs.shell_arrays()
+        self.assertTrue(np.array_equal(sl, shls['L'].values))
+        self.assertTrue(np.array_equal(np.diff(sprm), [3, 2, 1, 2, 1]))
+        self.assertTrue(np.allclose(coefs[scof[1]:scof[2]],
+                                    shls[0].values[1].norm_contract().ravel()))
+        self.assertFalse(coefs.flags.writeable)
+        self.assertTrue(self.lbs.shell_arrays() is self.lbs.shell_arrays())
+        self.assertTrue(sphr.all())
+        self.assertFalse(self.lbs.shell_arrays(spherical=False)[-1].any())
+        arrs = self.lbs.shell_arrays()
+        self.lbs['alpha'] = 2 * self.lbs['alpha']
+        self.assertTrue(np.allclose(self.lbs.shells()[0].values[2].alphas,
+                                    2 * shls[0].values[2].alphas))
+        self.assertFalse(self.lbs.shell_arrays() is arrs)
+
     def test_functions_by_shell(self):
         n = ['set', 'L']
         mfp = pd.MultiIndex.from_product
@@ -8,10 +8,12 @@ Testing for Matrix base classes and numba funcs.
 """
 import numpy as np
 from unittest import TestCase
+from exatomic.core.basis import Overlap
 from exatomic.core.matrices import (_symmetric_from_square,
                                     _symmetric_to_square,
                                     _square_from_square,
-                                    _square_to_square)
+                                    _square_to_square,
+                                    _block_square, Triangle)
 
 
 class TestNumbaFuncs(TestCase):
@@ -66,3 +68,77 @@ class TestNumbaFuncs(TestCase):
     #     self.assertTrue(np.allclose(gsdx[:,1], self.sidx1))
     #     self.assertTrue(np.allclose(gsdx[:,2], np.zeros(len(gsdx))))
     #     self.assertTrue(np.allclose(gss, self.svals))
+
+
+class TestMatrixCache(TestCase):
+    """Test the memoized square and packed forms of matrix tables."""
+    def setUp(self):
+        sq = np.random.RandomState(0).rand(5, 5)
+        self.sq = sq + sq.T
+
+    def test_overlap(self):
+        ovl = Overlap.from_square(self.sq)
+        self.assertEqual(len(ovl), 15)
+        sq = ovl.square()
+        self.assertTrue(np.allclose(sq.values, self.sq))
+        self.assertTrue(sq.values.flags.writeable)
+        sq.values[0, 0] = 100.
+        self.assertTrue(np.allclose(ovl.square().values, self.sq))
+        tri = ovl.packed()
+        self.assertTrue(np.allclose(tri, self.sq[np.tril_indices(5)]))
+        self.assertFalse(tri.flags.writeable)
+        ovl['coef'] = 2 * ovl['coef']
+        self.assertTrue(np.allclose(ovl.square().values, 2 * self.sq))
+
+    def test_inplace_edits(self):
+        ovl = Overlap.from_square(self.sq)
+        tri = ovl.packed()
+        self.assertTrue(ovl.packed() is tri)
+        ovl.loc[ovl.index[0], 'coef'] = 10.
+        self.assertTrue(np.isclose(ovl.square().values[0, 0], 10.))
+        ovl.iloc[1, ovl.columns.get_loc('coef')] = 20.
+        self.assertTrue(np.isclose(ovl.square().values[1, 0], 20.))
+        ovl.sort_values('coef', inplace=True)
+        self.assertFalse(ovl.packed() is tri)
+        self.assertTrue(np.isclose(ovl.packed()[1], 20.))
+        ovl['label'] = 'a'
+        tri = ovl.packed()
+        ovl.loc[:, 'label'] = 'b'
+        self.assertFalse(ovl.packed() is tri)
+        # Edits to the underlying arrays need an explicit clear_cache
+        ovl['coef'].values[:] = 1.
+        ovl.clear_cache()
+        self.assertTrue(np.allclose(ovl.square().values, 1.))
+        self.assertTrue(np.allclose(ovl.packed(), 1.))
+
+    def test_triangle(self):
+        tri = Triangle.from_square(self.sq)
+        sq = tri.square(column='coef')
+        self.assertTrue(np.allclose(sq.values, self.sq))
+        self.assertTrue(np.allclose(tri.packed(column='coef'),
+                                    self.sq[np.tril_indices(5)]))
+        self.assertTrue(tri.packed(column='coef') is tri.packed(column='coef'))
+        tri.loc[tri.index[-1], 'coef'] = -1.
+        self.assertTrue(np.isclose(tri.square(column='coef').values[-1, -1], -1.))
+        tri.clear_cache()
+        self.assertTrue(np.allclose(tri.square(column='coef').values[:-1, :-1],
+                                    self.sq[:-1, :-1]))
+
+    def test_square_column(self):
+        tri = Triangle.from_square(self.sq)
+        tri['kinetic'] = 3 * tri['coef']
+        self.assertTrue(np.allclose(tri.square(column='kinetic').values,
+                                    3 * self.sq))
+        self.assertTrue(np.allclose(tri.square(column='coef').values, self.sq))
+        ovl = Overlap.from_square(self.sq)
+        self.assertTrue(np.allclose(ovl.square(column='coef').values, self.sq))
+
+    def test__block_square(self):
+        idx0 = np.array([0, 1, 0, 0, 1, 1])
+        idx1 = np.array([0, 0, 0, 1, 0, 1])
+        vals = np.array([0., 1., 2., 3., 3., 5.])
+        sq = _block_square(idx0, idx1, vals, blocks=[0, 0, 1, 1, 1, 1],
+                           symmetric=True)
+        chk = np.array([[0., 1., 0., 0.], [1., 0., 0., 0.],
+                        [0., 0., 2., 3.], [0., 0., 3., 5.]])
+        self.assertTrue(np.allclose(sq, chk))
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2015-2018, Exa Analytics Development Team
+# Distributed under the terms of the Apache License 2.0
+import numpy as np
+import pandas as pd
+from unittest import TestCase
+from exatomic.core.orbital import (MOMatrix, DenseMOMatrix, DensityMatrix,
+                                   _dense_coefficients)
+
+
+class TestDenseMOMatrix(TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.cmats = [rng.rand(4, 3), rng.rand(4, 3)]
+        dfs = []
+        for frame, cmat in enumerate(self.cmats):
+            dfs.append(pd.DataFrame({'chi': np.tile(range(4), 3),
+                                     'orbital': np.repeat(range(3), 4),
+                                     'coef': cmat.ravel(order='F'),
+                                     'frame': frame}))
+        self.momat = MOMatrix(pd.concat(dfs, ignore_index=True))
+        sym = self.momat[self.momat['frame'] == 0].copy()
+        sym['irrep'] = (sym['chi'] > 1).astype(np.int64)
+        sym = sym[(sym['orbital'] > 0) == (sym['irrep'] > 0)].copy()
+        sym.loc[sym['irrep'] > 0, 'chi'] -= 2
+        sym.loc[sym['irrep'] > 0, 'orbital'] -= 1
+        self.symmat = MOMatrix(sym)
+
+    def test_square(self):
+        dense = DenseMOMatrix.from_momatrix(self.momat)
+        self.assertEqual(dense.frames, [0, 1])
+        self.assertEqual(dense.coefs, ['coef'])
+        for frame, cmat in enumerate(self.cmats):
+            sq = dense.square(frame=frame)
+            self.assertTrue(np.allclose(sq.values, cmat))
+            self.assertTrue(np.allclose(sq.values,
+                            self.momat.square(frame=frame).values))
+        self.assertTrue(np.shares_memory(dense.square().values,
+                                         dense.matrix()))
+
+    def test_irrep(self):
+        dense = DenseMOMatrix.from_momatrix(self.symmat)
+        self.assertEqual(dense.irreps, [0, 1])
+        self.assertTrue(np.allclose(dense.square().values,
+                                    self.symmat.square().values))
+        self.assertTrue(np.allclose(dense.square(irrep=1).values,
+                                    self.symmat.square(irrep=1).values))
+
+    def test_to_momatrix(self):
+        dense = DenseMOMatrix.from_momatrix(self.momat)
+        long = dense.to_momatrix()
+        self.assertTrue(isinstance(long, MOMatrix))
+        self.assertEqual(long.shape[0], self.momat.shape[0])
+        for frame in (0, 1):
+            self.assertTrue(np.allclose(long.square(frame=frame).values,
+                                        self.momat.square(frame=frame).values))
+        self.assertTrue(dense.to_momatrix() is long)
+        long.loc[long.index[0], 'coef'] = 5.
+        self.assertFalse(dense.is_current())
+        self.assertFalse(dense.to_momatrix() is long)
+
+    def test_is_current(self):
+        dense = DenseMOMatrix.from_momatrix(self.momat)
+        uni = _Uni(momatrix=self.momat, _dense_momatrix=dense)
+        self.assertTrue(dense.is_current())
+        self.assertTrue(_dense_coefficients(uni) is dense)
+        self.momat.loc[self.momat.index[0], 'coef'] = 5.
+        self.assertFalse(dense.is_current())
+        self.assertTrue(_dense_coefficients(uni) is None)
+        self.assertFalse(hasattr(uni, '_dense_momatrix'))
+
+    def test_contributions(self):
+        dense = DenseMOMatrix.from_momatrix(self.momat)
+        for tol in (0.1, 0.5):
+            ref = self.momat.contributions(1, tol=tol)
+            con = dense.contributions(1, tol=tol)
+            self.assertTrue(np.array_equal(con['chi'].values, ref['chi'].values))
+            self.assertTrue(np.allclose(con['coef'].values, ref['coef'].values))
+
+    def test_cached_square(self):
+        sq = self.momat.square(frame=1)
+        self.assertTrue(np.allclose(sq.values, self.cmats[1]))
+        self.assertTrue(sq.values.flags.writeable)
+        sq.values[:] = 0.
+        self.assertTrue(np.allclose(self.momat.square(frame=1).values,
+                                    self.cmats[1]))
+        self.momat['coef'] = 2 * self.momat['coef']
+        self.assertTrue(np.allclose(self.momat.square(frame=1).values,
+                                    2 * self.cmats[1]))
+        self.momat['coef'].values[:] *= 0.5
+        self.momat.clear_cache()
+        self.assertTrue(np.allclose(self.momat.square(frame=1).values,
+                                    self.cmats[1]))
+        self.momat.loc[self.momat.index[-1], 'coef'] = 7.
+        self.assertTrue(np.isclose(self.momat.square(frame=1).values[-1, -1], 7.))
+        self.momat.iat[len(self.momat) - 1, 2] = 3.
+        self.assertTrue(np.isclose(self.momat.square(frame=1).values[-1, -1], 3.))
+
+
+class _Uni(object):
+    """Minimal stand-in for a universe with MO tables."""
+    def __init__(self, **tables):
+        for name, tbl in tables.items():
+            setattr(self, name, tbl)
+
+
+class TestDensityMatrix(TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(1)
+        self.cmats = [rng.rand(2, 5, 5) for frame in range(2)]
+        self.occs = [rng.rand(2, 5) for frame in range(2)]
+        mos, orbs = [], []
+        for frame, (cmat, occ) in enumerate(zip(self.cmats, self.occs)):
+            mos.append(pd.DataFrame({'chi': np.tile(range(5), 5),
+                                     'orbital': np.repeat(range(5), 5),
+                                     'coef': cmat[0].ravel(order='F'),
+                                     'coef1': cmat[1].ravel(order='F'),
+                                     'frame': frame}))
+            orbs.append(pd.DataFrame({'occupation': occ[0],
+                                      'occupation1': occ[1], 'frame': frame}))
+        self.uni = _Uni(momatrix=MOMatrix(pd.concat(mos, ignore_index=True)),
+                        orbital=pd.concat(orbs, ignore_index=True))
+
+    def test_from_universe(self):
+        dens = DensityMatrix.from_universe(self.uni, ['coef', 'coef1'],
+                                           ['occupation', 'occupation1'])
+        self.assertEqual(len(dens), 2 * 15)
+        for frame, (cmat, occ) in enumerate(zip(self.cmats, self.occs)):
+            for i, col in enumerate(['coef', 'coef1']):
+                ref = (cmat[i] * occ[i]).dot(cmat[i].T)
+                self.assertTrue(np.allclose(
+                    dens.square(frame=frame, column=col).values, ref))
+        one = DensityMatrix.from_universe(self.uni, frame=1)
+        self.assertEqual(len(one), 15)
+        self.assertTrue(np.allclose(one['coef'].values,
+                                    dens[dens['frame'] == 1]['coef'].values))
+        with self.assertRaises(ValueError):
+            DensityMatrix.from_universe(self.uni, orbocc=np.ones(4))
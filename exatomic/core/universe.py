@@ -22,10 +22,13 @@ from .two import (AtomTwo, MoleculeTwo, compute_atom_two,
 from .molecule import (Molecule, compute_molecule, compute_molecule_com,
                        compute_molecule_count)
 from .field import AtomicField
-from .orbital import Orbital, Excitation, MOMatrix, DensityMatrix
+from .orbital import (Orbital, Excitation, MOMatrix, DenseMOMatrix,
+                      DensityMatrix, _dense_coefficients)
 from .basis import Overlap, BasisSet, BasisSetOrder
 from exatomic.algorithms.orbital import add_molecular_orbitals
 from exatomic.algorithms.basis import BasisFunctions, compute_uncontracted_basis_set_order
+from exatomic.algorithms.alignment import align_frames, rmsd
+from exatomic.algorithms.car2sph import car2sph_matrices
 from .tensor import Tensor
 
 class Meta(TypedMeta):
@@ -43,6 +46,7 @@ class Meta(TypedMeta):
     momatrix = MOMatrix
     cart_momatrix = MOMatrix
     sphr_momatrix = MOMatrix
+    dense_momatrix = DenseMOMatrix
     excitation = Excitation
     overlap = Overlap
     density = DensityMatrix
@@ -72,6 +76,7 @@ class Universe(six.with_metaclass(Meta, Container)):
         molecule (:class:`~exatomic.core.molecule.Molecule`): Molecule information
         orbital (:class:`~exatomic.core.orbital.Orbital`): Molecular orbital information
         momatrix (:class:`~exatomic.core.orbital.MOMatrix`): Molecular orbital coefficient matrix
+        dense_momatrix (:class:`~exatomic.core.orbital.DenseMOMatrix`): Dense coefficient matrices
         frequency (:class:`~exatomic.core.atom.Frequency`): Vibrational modes and atom displacements
         excitation (:class:`~exatomic.core.orbital.Excitation`): Electronic excitation information
         basis_set (:class:`~exatomic.core.basis.BasisSet`): Basis set specification
@@ -86,9 +91,13 @@ class Universe(six.with_metaclass(Meta, Container)):
     def current_momatrix(self):
         if self.meta['spherical']:
             try: return self.sphr_momatrix
-            except AttributeError: return self.momatrix
-        try: return self.cart_momatrix
-        except AttributeError: return self.momatrix
+            except AttributeError: pass
+        else:
+            try: return self.cart_momatrix
+            except AttributeError: pass
+        dense = _dense_coefficients(self)
+        if dense is not None: return dense
+        return self.momatrix
 
     @property
     def current_basis_set_order(self):
@@ -188,10 +197,46 @@ class Universe(six.with_metaclass(Meta, Container)):
         else:
             self.basis_functions = BasisFunctions(self)
 
+    def compute_dense_momatrix(self):
+        """Compute dense coefficient matrices from the momatrix table."""
+        self.dense_momatrix = DenseMOMatrix.from_momatrix(self.momatrix)
+
+    def compute_momatrix(self):
+        """Derive the columnar momatrix table from dense coefficient matrices."""
+        if hasattr(self, '_dense_momatrix'):
+            self.momatrix = self._dense_momatrix.to_momatrix()
+
     def compute_uncontracted_basis_set_order(self):
         """Compute an uncontracted basis set order."""
         self.uncontracted_basis_set_order = compute_uncontracted_basis_set_order(self)
 
+    def spherical_matrices(self, frame=None, inplace=False):
+        """Transform the cartesian MO coefficients, overlap and density
+        matrices to the spherical basis (see
+        :func:`~exatomic.algorithms.car2sph.car2sph_matrices`). The
+        transform is cached per pair of basis set orders.
+
+        .. code-block:: python
+
+            sph = uni.spherical_matrices()
+            sph['overlap'].square()
+            uni.spherical_matrices(inplace=True)   # sets sphr_momatrix
+
+        Args:
+            frame (int): only transform this frame (default all)
+            inplace (bool): store the spherical basis set order and
+                momatrix as sphr_basis_set_order and sphr_momatrix
+
+        Returns:
+            tables (OrderedDict): spherical basis_set_order, momatrix,
+                overlap and density (those present)
+        """
+        tables = car2sph_matrices(self, frame=frame)
+        if inplace:
+            self.sphr_basis_set_order = tables['basis_set_order']
+            if 'momatrix' in tables: self.sphr_momatrix = tables['momatrix']
+        return tables
+
     def enumerate_shells(self, frame=0):
         """Extract minimal information from the universe to be used in
         numba-compiled numerical procedures.
@@ -210,10 +255,21 @@ class Universe(six.with_metaclass(Meta, Container)):
         shls = self.basis_set.shells(self.meta['program'],
                                      self.meta['spherical'],
                                      self.meta['gaussian'])
-        grps = shls.groupby('set')
-        # Pointers into (xyzs, shls) arrays
-        ptrs = np.array([(c, idx) for c, seht in enumerate(atom.set)
-                                  for idx in grps.get_group(seht).index])
+        # Pointers into (xyzs, shls) arrays; shells are sorted by set
+        sets = atom['set'].astype(np.int64).values
+        usets, start, cnt = np.unique(shls['set'].astype(np.int64).values,
+                                      return_index=True, return_counts=True)
+        pos = np.searchsorted(usets, sets)
+        miss = pos == len(usets)
+        miss[~miss] = usets[pos[~miss]] != sets[~miss]
+        if miss.any():
+            raise ValueError('basis_set has no shells for set(s) {} of the '
+                             'atom table'.format(np.unique(sets[miss]).tolist()))
+        ncnt = cnt[pos]
+        offs = np.cumsum(np.append(0, ncnt))[:-1]
+        ptrs = np.empty((ncnt.sum(), 2), dtype=np.int64)
+        ptrs[:, 0] = np.repeat(np.arange(len(sets)), ncnt)
+        ptrs[:, 1] = np.repeat(start[pos] - offs, ncnt) + np.arange(ncnt.sum())
         return ptrs, atom[['x', 'y', 'z']].values, shls[0].values
 
     def add_field(self, field):
@@ -260,7 +316,9 @@ class Universe(six.with_metaclass(Meta, Container)):
 
     def add_molecular_orbitals(self, field_params=None, mocoefs=None,
                                vector=None, frame=0, replace=False,
-                               inplace=True, verbose=True, irrep=None):
+                               inplace=True, verbose=True, irrep=None, tol=None,
+                               max_memory=2048, dtype=np.float64, octree=None,
+                               workers=1):
         """Add molecular orbitals to universe.
 
         .. code-block:: python
@@ -273,26 +331,34 @@ class Universe(six.with_metaclass(Meta, Container)):
                               'nr': 100})                 # number of points between rmin and rmax
             uni.field                                     # The field parameters
             uni.field.field_values                        # The generated scalar fields
+            uni.add_molecular_orbitals(vector=[8, 9],     # Along an optimization
+                                       frame=range(10), workers=4)
 
         Args:
             field_params (dict, pd.Series): see :func:`exatomic.algorithms.orbital_util.make_fps`
             mocoefs (str): column in :class:`~exatomic.core.orbital.MOMatrix`
             vector (iter): indices of orbitals to evaluate (0-based)
-            frame (int): frame of atomic positions for the orbitals
+            frame (int, iter): frame(s) of atomic positions for the orbitals
             replace (bool): remove previous fields (default False)
             inplace (bool): add directly to uni or return :class:`~exatomic.core.field.AtomicField` (default True)
             verbose (bool): print timing statistics (default True)
             irrep (int): irreducible representation
+            tol (float): screen out basis function values below tol (default None)
+            max_memory (float): memory budget in MB for basis function values (default 2048)
+            dtype (type): np.float32 for visualization quality fields (default np.float64)
+            octree (bool, dict): evaluate fewer points on an adaptive octree and resample onto the full grid (default None)
+            workers (int): number of threads over which frames are distributed (default 1)
 
         Warning:
             Default behavior just continually adds fields to the universe.  This can
             affect performance if adding many fields. `replace` modifies this behavior.
 
-        Warning:
-            Specifying very high resolution field parameters, e.g. 'nr' > 100
-            may slow things down and/or crash the kernel.  Use with caution.
+        Note:
+            The grid is evaluated in blocks of points sized to max_memory, so
+            high resolution field parameters (e.g. 'nr' > 100) are limited by
+            the size of the resulting fields rather than the basis set size.
         """
-        if not hasattr(self, 'momatrix'):
+        if not (hasattr(self, '_dense_momatrix') or hasattr(self, 'momatrix')):
             raise AttributeError('uni must have momatrix attribute.')
         if not hasattr(self, 'basis_set'):
             raise AttributeError('uni must have basis_set attribute.')
@@ -300,11 +366,64 @@ class Universe(six.with_metaclass(Meta, Container)):
                                       mocoefs=mocoefs, vector=vector,
                                       frame=frame, replace=replace,
                                       inplace=inplace, verbose=verbose,
-                                      irrep=irrep)
+                                      irrep=irrep, tol=tol,
+                                      max_memory=max_memory, dtype=dtype,
+                                      octree=octree, workers=workers)
+
+    def align(self, ref_frame=0, labels=None, inplace=False):
+        """Kabsch alignment of all frames onto a reference frame.
+
+        .. code-block:: python
+
+            atom = uni.align()                        # Aligned copy of the atom table
+            uni.align(labels=[0, 1, 2], inplace=True) # Align on a subset of atoms
+
+        Args:
+            ref_frame (int): frame to align onto (default 0)
+            labels (list): atom labels determining the alignment (default all)
+            inplace (bool): replace the atom table instead of returning a new one
+
+        Returns:
+            atom (:class:`~exatomic.core.atom.Atom`): aligned atom table (if not inplace)
+
+        See Also:
+            :func:`~exatomic.algorithms.alignment.align_frames`
+        """
+        atom, _ = align_frames(self, ref_frame=ref_frame, labels=labels)
+        if not inplace: return atom
+        self.atom = atom
+
+    def rmsd(self, ref_frame=0, labels=None, pairwise=False, block=16):
+        """Root mean square deviation between frames after optimal superposition.
+
+        .. code-block:: python
+
+            uni.rmsd()                 # Series of RMSD to the first frame
+            uni.rmsd(pairwise=True)    # Frame by frame RMSD matrix
+
+        Args:
+            ref_frame (int): reference frame (default 0)
+            labels (list): atom labels to include (default all)
+            pairwise (bool): return the full frame by frame matrix (default False)
+            block (int): rows per parallel task for the pairwise matrix
+
+        See Also:
+            :func:`~exatomic.algorithms.alignment.rmsd`
+        """
+        return rmsd(self, ref_frame=ref_frame, labels=labels,
+                    pairwise=pairwise, block=block)
 
     def __len__(self):
         return len(self.frame)
 
+    def __setattr__(self, name, value):
+        # Dense coefficients pivoted from a replaced momatrix are stale
+        if name == 'momatrix' and hasattr(self, '_dense_momatrix'):
+            source = self._dense_momatrix._source
+            if source is None or source[0] is not value:
+                del self._dense_momatrix
+        super(Universe, self).__setattr__(name, value)
+
     def __init__(self, **kwargs):
         super(Universe, self).__init__(**kwargs)
 
@@ -322,7 +441,9 @@ def basis_function_contributions(universe, mo, mocoefs='coef',
     """
     Provided a universe with momatrix and basis_set_order attributes,
     return the major basis function contributions of a particular
-    molecular orbital.
+    molecular orbital. See
+    :func:`~exatomic.algorithms.population.orbital_contributions` for
+    all orbitals at once.
 
     .. code-block:: python
 
@@ -339,11 +460,13 @@ def basis_function_contributions(universe, mo, mocoefs='coef',
     Returns:
         joined (pd.DataFrame): a join of momatrix and basis_set_order
     """
-    small = universe.momatrix.contributions(mo, tol=tol, mocoefs=mocoefs, frame=frame)
+    momatrix = _dense_coefficients(universe)
+    if momatrix is None: momatrix = universe.momatrix
+    small = momatrix.contributions(mo, tol=tol, mocoefs=mocoefs, frame=frame)
     chis = small['chi'].values
     coefs = small[mocoefs]
     coefs.index = chis
-    joined = pd.concat([universe.basis_set_order.ix[chis], coefs], axis=1)
+    joined = pd.concat([universe.basis_set_order.loc[chis], coefs], axis=1)
     if ao is None:
         return joined
     else: